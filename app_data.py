@@ -0,0 +1,34 @@
+# The user data folder and the games files, shared by every module. Nothing is read or created on
+# import: the folder is created the first time a file is written to it, and the games files are
+# read the first time they are needed, so the windows open without touching the disk.
+import json
+from pathlib import Path
+
+# ...
+
+# User data folder path
+DATA_DIR = Path.home() / ".current_prices_data"
+
+PC_GAMES_PATH = DATA_DIR / "games_to_check.json"
+CONSOLE_GAMES_PATH = DATA_DIR / "console_games_to_check.json"
+
+_data_dir_ready = False
+
+
+def get_data_dir() -> Path:
+    """Return the user data folder, creating it on first use."""
+    global _data_dir_ready
+    if not _data_dir_ready:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        _data_dir_ready = True
+    return DATA_DIR
+
+
+def load_games_to_check(path: Path) -> dict:
+    """Read a games to check JSON file, an empty dict if it doesn't exist yet."""
+    try:
+        with open(path, "r") as json_file:
+            return json.load(json_file)
+    except FileNotFoundError:
+        print(f"Error: The file {path} does not exist. Set the games to check using the ui")
+        return {}
@@ -0,0 +1,534 @@
+# Local HTTP server that serves recorded Steam, GOG, PSN, Xbox, Nintendo and IsThereAnyDeal pages
+# (and the Steam, GOG and IsThereAnyDeal JSON APIs) for a catalogue of fixture games, so the price
+# backends can be benchmarked without touching the real stores.
+#
+#   python benchmarks/fixture_server.py --port 8766 --latency 0.05
+#
+# Every store lives under its own path prefix of the server, e.g. /steam/app/<appid>/ or
+# /gog-api/products/prices. The games of the catalogue cycle through discounted and undiscounted
+# prices, age gates, coming soon pages and demo purchase areas, like the real store pages.
+#
+# The /http/ routes send the chunked, gzip, redirect and error responses the stores can send, for
+# the tests of the asyncio HTTP client (fetch_engine.py).
+import argparse
+import gzip
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from string import Template
+from urllib.parse import parse_qs, urlsplit
+
+# ...
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+# Seconds added to every response, to simulate the round trip to a real store
+DEFAULT_LATENCY = 0.05
+
+STEAM_APPID_OFFSET = 100000
+GOG_PRODUCT_ID_OFFSET = 2000000000
+ITAD_GAME_ID_PREFIX = "018f0000-0000-7000-8000-"
+ITAD_SHOP_IDS = {"Steam": 61, "GOG": 35}
+
+
+def format_brl(cents: int) -> str:
+    """Format a price in cents as shown by the Brazilian stores, e.g. "R$ 19,99"."""
+    return f"R$ {cents // 100},{cents % 100:02d}"
+
+
+def format_gog(cents: int) -> str:
+    """Format a price in cents as shown by GOG, e.g. "19.99"."""
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+class FixtureGame:
+    """A game of the fixture catalogue, with the prices each store shows for it."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.name = f"Fixture Game {index:04d}"
+        self.slug = f"fixture_game_{index:04d}"
+        self.appid = str(STEAM_APPID_OFFSET + index)
+        self.product_id = str(GOG_PRODUCT_ID_OFFSET + index)
+        self.itad_id = f"{ITAD_GAME_ID_PREFIX}{index:012d}"
+
+        self.discounted = index % 2 == 0
+        self.age_gate = index % 5 == 0
+        self.coming_soon = index % 7 == 3
+        self.has_demo = index % 3 == 0
+
+        self.base_cents = 1999 + (index % 10) * 1000
+        self.current_cents = self.base_cents // 2 if self.discounted else self.base_cents
+        self.console_base_cents = 24950 + (index % 6) * 5000
+        self.console_current_cents = (self.console_base_cents * 3 // 4 if self.discounted
+                                      else self.console_base_cents)
+
+    @classmethod
+    def from_appid(cls, appid: str) -> "FixtureGame":
+        return cls(int(appid) - STEAM_APPID_OFFSET)
+
+    @classmethod
+    def from_product_id(cls, product_id: str) -> "FixtureGame":
+        return cls(int(product_id) - GOG_PRODUCT_ID_OFFSET)
+
+    @classmethod
+    def from_itad_id(cls, itad_id: str) -> "FixtureGame":
+        return cls(int(itad_id[len(ITAD_GAME_ID_PREFIX):]))
+
+    def get_links(self, base_url: str) -> dict:
+        """Return the store links of the game on a fixture server."""
+        console_slug = self.slug.replace("_", "-")
+        return {
+            "steam_link": f"{base_url}/steam/app/{self.appid}/{self.slug}/",
+            "gog_link": f"{base_url}/gog/en/game/{self.slug}",
+            "isthereanydeal_link": f"{base_url}/itad/game/{self.slug}/info/",
+            "psn_site": f"{base_url}/psn/pt-br/product/FIXTURE-{self.index:04d}",
+            "xbox_site": f"{base_url}/xbox/pt-br/games/store/{console_slug}/9FIX{self.index:04d}",
+            "nintendo_site": f"{base_url}/nintendo/pt-br/store/products/{console_slug}-switch",
+        }
+
+    def get_pc_prices(self) -> tuple[float, float]:
+        """The (current, base) price shown by Steam and GOG, 0.0 for coming soon games."""
+        if self.coming_soon:
+            return 0.0, 0.0
+        return self.current_cents / 100, self.base_cents / 100
+
+    def get_console_prices(self) -> tuple[float, float]:
+        """The (current, base) price shown by PSN, Xbox and Nintendo."""
+        return self.console_current_cents / 100, self.console_base_cents / 100
+
+
+def build_catalogue(size: int) -> list:
+    """Return the first `size` games of the fixture catalogue."""
+    return [FixtureGame(index) for index in range(size)]
+
+
+def get_pc_games_to_check(catalogue: list, base_url: str) -> dict:
+    """Return a games_to_check dict, in the new format with direct store links."""
+    games_to_check = {}
+    for game in catalogue:
+        links = game.get_links(base_url)
+        games_to_check[game.name] = {key: links[key] for key in ["steam_link", "gog_link", "isthereanydeal_link"]}
+    return games_to_check
+
+
+def get_itad_games_to_check(catalogue: list, base_url: str) -> dict:
+    """Return a games_to_check dict in the old format, with IsThereAnyDeal links."""
+    return {game.name: game.get_links(base_url)["isthereanydeal_link"] for game in catalogue}
+
+
+def get_console_games_to_check(catalogue: list, base_url: str) -> dict:
+    """Return a console_games_to_check dict."""
+    games_to_check = {}
+    for game in catalogue:
+        links = game.get_links(base_url)
+        games_to_check[game.name] = {key: links[key] for key in ["psn_site", "xbox_site", "nintendo_site"]}
+    return games_to_check
+
+
+_templates = {}
+
+
+def render_fixture(name: str, **values) -> str:
+    """Fill the $placeholders of a recorded page in the fixtures folder."""
+    if name not in _templates:
+        _templates[name] = Template((FIXTURES_DIR / name).read_text(encoding="utf-8"))
+    return _templates[name].safe_substitute(**values)
+
+
+def render_steam_purchase_area(game: FixtureGame) -> str:
+    if game.coming_soon:
+        return ('<div class="game_area_comingsoon game_area_bubble">'
+                '<div class="content"><h1>Em breve</h1><span>Data de lançamento: a ser anunciada</span>'
+                '</div></div>')
+
+    demo_area = ""
+    if game.has_demo:
+        demo_area = ('<div class="game_area_purchase_game_wrapper"><div class="game_area_purchase_game demo_above_purchase">'
+                     f'<h1>Baixar demo de {game.name}</h1><div class="game_purchase_action">'
+                     '<div class="game_purchase_action_bg"><div class="btn_addtocart">'
+                     '<a class="btn_green_steamui btn_medium"><span>Baixar</span></a></div></div></div></div></div>')
+
+    if game.discounted:
+        price = ('<div class="discount_block game_purchase_discount" data-price-final="{0}">'
+                 '<div class="discount_pct">-50%</div><div class="discount_prices">'
+                 '<div class="discount_original_price">{1}</div><div class="discount_final_price">{2}</div>'
+                 '</div></div>').format(game.current_cents, format_brl(game.base_cents),
+                                        format_brl(game.current_cents))
+    else:
+        price = (f'<div class="game_purchase_price price" data-price-final="{game.current_cents}">'
+                 f'{format_brl(game.current_cents)}</div>')
+
+    # a DLC below the game, its price must not be picked up
+    dlc_area = ('<div class="game_area_purchase_game_wrapper dynamic_bundle_description"><div class="game_area_purchase_game">'
+                f'<h1>Comprar {game.name} - Soundtrack</h1><div class="game_purchase_action">'
+                '<div class="game_purchase_action_bg"><div class="game_purchase_price price">R$ 9,99</div>'
+                '</div></div></div></div>')
+
+    return (f'{demo_area}<div class="game_area_purchase_game_wrapper"><div class="game_area_purchase_game">'
+            f'<h1>Comprar {game.name}</h1><div class="game_purchase_action"><div class="game_purchase_action_bg">'
+            f'{price}<div class="btn_addtocart"><a class="btn_green_steamui btn_medium"><span>Adicionar ao carrinho</span>'
+            f'</a></div></div></div></div></div>{dlc_area}')
+
+
+def render_gog_price_area(game: FixtureGame) -> str:
+    if game.coming_soon:
+        # GOG keeps the price elements, empty, on pages of games that are not for sale yet
+        return '<span class="product-actions-price__final-amount _price" selenium-id="ProductFinalPrice"></span>'
+
+    price = (f'<span class="product-actions-price__final-amount _price" selenium-id="ProductFinalPrice">'
+             f'{format_gog(game.current_cents)}</span>')
+    if game.discounted:
+        price = (f'<span class="product-actions-price__discount">-50%</span>'
+                 f'<span class="product-actions-price__base-amount _price">{format_gog(game.base_cents)}</span>'
+                 f'{price}')
+    return price
+
+
+def render_gog_age_gate(game: FixtureGame) -> str:
+    if not game.age_gate:
+        return ""
+    return ('<div class="age-gate" id="age-gate"><div class="age-gate__content">'
+            '<p>This game contains mature content. Are you at least 18 years old?</p>'
+            '<button class="button age-gate__button" onclick="document.getElementById(\'age-gate\').style.display = \'none\';">'
+            'Yes, continue</button></div></div>')
+
+
+def render_psn_price_area(game: FixtureGame) -> str:
+    price = (f'<span class="psw-t-title-m" data-qa="mfeCtaMain#offer0#finalPrice">'
+             f'{format_brl(game.console_current_cents)}</span>')
+    if game.discounted:
+        price += (f'<span class="psw-t-title-s psw-c-t-2 psw-t-strike" data-qa="mfeCtaMain#offer0#originalPrice">'
+                  f'{format_brl(game.console_base_cents)}</span>'
+                  '<span class="psw-body-2 psw-badge__text" data-qa="mfeCtaMain#offer0#discountInfo">Economize 25%</span>')
+    return price
+
+
+def render_xbox_price_area(game: FixtureGame) -> str:
+    price = f'<span class="Price-module__boldText___1i2Li">{format_brl(game.console_current_cents)}</span>'
+    if game.discounted:
+        price = (f'<span class="Price-module__brandOriginalPrice___ayJAn">{format_brl(game.console_base_cents)}</span>'
+                 f'{price}')
+    return price
+
+
+def render_nintendo_price_area(game: FixtureGame) -> str:
+    # the regular price is always shown, the sale price is added next to it during a sale
+    price = f'<span class="W990N SH2al">{format_brl(game.console_base_cents)}</span>'
+    if game.discounted:
+        price += f'<span class="o2BsP">{format_brl(game.console_current_cents)}</span>'
+    return price
+
+
+def render_itad_rows(game: FixtureGame, base_url: str) -> str:
+    if game.coming_soon:
+        return ""
+
+    links = game.get_links(base_url)
+    rows = ""
+    for shop, shop_link in [("Steam", links["steam_link"]), ("GOG", links["gog_link"])]:
+        cut = "-50%" if game.discounted else "0%"
+        rows += (f'<a class="row" href="{shop_link}">'
+                 f'<div class="cell shop">{shop}</div><div class="cell cut">{cut}</div>'
+                 f'<div class="cell low">{format_brl(game.current_cents * 4 // 5)}</div>'
+                 f'<div class="cell price">{format_brl(game.current_cents)}</div>'
+                 f'<div class="cell regular">{format_brl(game.base_cents)}</div></a>')
+    return rows
+
+
+def get_steam_app_details(appids: list) -> dict:
+    """Return the Steam app-details response (filtered by price_overview) of the fixture games."""
+    app_details = {}
+    for appid in appids:
+        if not appid.isdigit() or int(appid) < STEAM_APPID_OFFSET:
+            app_details[appid] = {"success": False}
+            continue
+
+        game = FixtureGame.from_appid(appid)
+        if game.coming_soon:
+            app_details[appid] = {"success": True, "data": []}
+            continue
+
+        discount_percent = 100 - game.current_cents * 100 // game.base_cents
+        app_details[appid] = {"success": True, "data": {"price_overview": {
+            "currency": "BRL",
+            "initial": game.base_cents,
+            "final": game.current_cents,
+            "discount_percent": discount_percent,
+            "initial_formatted": format_brl(game.base_cents) if discount_percent else "",
+            "final_formatted": format_brl(game.current_cents),
+        }}}
+    return app_details
+
+
+def get_gog_prices(product_ids: list) -> dict:
+    """Return the GOG products/prices response of the fixture games."""
+    items = []
+    for product_id in product_ids:
+        if not product_id.isdigit() or int(product_id) < GOG_PRODUCT_ID_OFFSET:
+            continue
+
+        game = FixtureGame.from_product_id(product_id)
+        prices = [] if game.coming_soon else [{
+            "currency": {"code": "BRL"},
+            "basePrice": f"{game.base_cents} BRL",
+            "finalPrice": f"{game.current_cents} BRL",
+            "bonusWalletFunds": "0 BRL",
+        }]
+        items.append({"_embedded": {"product": {"id": int(product_id)}, "prices": prices}})
+    return {"_embedded": {"items": items}}
+
+
+def get_itad_lookup(title: str) -> dict:
+    """Return the IsThereAnyDeal games/lookup response of a fixture game title, e.g. "fixture game 0003"."""
+    match = re.fullmatch(r"fixture game (\d+)", title.strip().lower())
+    if not match:
+        return {"found": False}
+    game = FixtureGame(int(match.group(1)))
+    return {"found": True, "game": {"id": game.itad_id, "slug": game.slug, "title": game.name, "type": "game"}}
+
+
+def get_itad_prices(itad_ids: list, base_url: str) -> list:
+    """Return the IsThereAnyDeal games/prices response of the fixture games, with their Steam and GOG deals."""
+    prices = []
+    for itad_id in itad_ids:
+        if not str(itad_id).startswith(ITAD_GAME_ID_PREFIX):
+            continue
+
+        game = FixtureGame.from_itad_id(itad_id)
+        links = game.get_links(base_url)
+        deals = []
+        if not game.coming_soon:
+            for shop, shop_link in [("Steam", links["steam_link"]), ("GOG", links["gog_link"])]:
+                deals.append({
+                    "shop": {"id": ITAD_SHOP_IDS[shop], "name": shop},
+                    "price": {"amount": game.current_cents / 100, "amountInt": game.current_cents, "currency": "BRL"},
+                    "regular": {"amount": game.base_cents / 100, "amountInt": game.base_cents, "currency": "BRL"},
+                    "cut": 100 - game.current_cents * 100 // game.base_cents,
+                    "url": shop_link,
+                })
+        prices.append({"id": itad_id, "deals": deals})
+    return prices
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """Routes the requests to the recorded pages of the fixture games."""
+    protocol_version = "HTTP/1.1"
+
+    ROUTES = [
+        (r"/steam/app/(\d+)", "send_steam_app"),
+        (r"/steam/agecheck/app/(\d+)", "send_steam_agecheck"),
+        (r"/steam/api/appdetails/?", "send_steam_app_details"),
+        (r"/gog/(?:\w+/)?game/fixture_game_(\d+)", "send_gog_game"),
+        (r"/gog-api/products/prices/?", "send_gog_prices"),
+        (r"/psn/[\w-]+/product/FIXTURE-(\d+)", "send_psn_product"),
+        (r"/xbox/[\w-]+/games/store/fixture-game-(\d+)/\w+", "send_xbox_game"),
+        (r"/nintendo/[\w-]+/store/products/fixture-game-(\d+)-switch", "send_nintendo_product"),
+        (r"/itad/game/fixture_game_(\d+)/info/?", "send_itad_game"),
+        (r"/itad-api/games/lookup/v1/?", "send_itad_lookup"),
+        (r"/http/chunked/?", "send_chunked"),
+        (r"/http/gzip/?", "send_gzip"),
+        (r"/http/redirect/(\d+)/?", "send_redirect"),
+        (r"/http/status/(\d+)/?", "send_status"),
+        (r"/http/connection/?", "send_connection"),
+    ]
+
+    POST_ROUTES = [
+        (r"/itad-api/games/prices/v3/?", "send_itad_prices"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def base_url(self) -> str:
+        return self.server.url
+
+    def do_GET(self):
+        self.route(self.ROUTES)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.route(self.POST_ROUTES, json.loads(body or b"null"))
+
+    def route(self, routes: list, *args):
+        self.server.count_request()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        url = urlsplit(self.path)
+        for pattern, handler_name in routes:
+            match = re.match(pattern, url.path)
+            if match:
+                getattr(self, handler_name)(match, parse_qs(url.query), *args)
+                return
+
+        self.send_body(b"Not found", "text/plain", 404)
+
+    def send_body(self, body: bytes, content_type: str, status: int = 200, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_page(self, name: str, **values):
+        page = render_fixture(name, base_url=self.base_url, **values)
+        self.send_body(page.encode("utf-8"), "text/html; charset=utf-8")
+
+    def send_json(self, data):
+        self.send_body(json.dumps(data).encode("utf-8"), "application/json")
+
+    def has_steam_birthtime(self) -> bool:
+        return "birthtime=" in self.headers.get("Cookie", "")
+
+    def send_steam_app(self, match, query):
+        game = FixtureGame.from_appid(match.group(1))
+        if game.age_gate and not self.has_steam_birthtime():
+            location = f"{self.base_url}/steam/agecheck/app/{game.appid}/"
+            self.send_body(b"", "text/html", 302, {"Location": location})
+            return
+
+        self.send_page("steam_app.html", title=game.name, appid=game.appid, slug=game.slug,
+                       purchase_area=render_steam_purchase_area(game))
+
+    def send_steam_agecheck(self, match, query):
+        game = FixtureGame.from_appid(match.group(1))
+        self.send_page("steam_agecheck.html", appid=game.appid, slug=game.slug)
+
+    def send_steam_app_details(self, match, query):
+        appids = query.get("appids", [""])[0].split(",")
+        self.send_json(get_steam_app_details(appids))
+
+    def send_gog_game(self, match, query):
+        game = FixtureGame(int(match.group(1)))
+        self.send_page("gog_game.html", title=game.name, slug=game.slug, product_id=game.product_id,
+                       age_gate=render_gog_age_gate(game), price_area=render_gog_price_area(game))
+
+    def send_gog_prices(self, match, query):
+        product_ids = query.get("ids", [""])[0].split(",")
+        self.send_json(get_gog_prices(product_ids))
+
+    def send_psn_product(self, match, query):
+        game = FixtureGame(int(match.group(1)))
+        self.send_page("psn_product.html", title=game.name, price_area=render_psn_price_area(game))
+
+    def send_xbox_game(self, match, query):
+        game = FixtureGame(int(match.group(1)))
+        self.send_page("xbox_game.html", title=game.name, aria_label=f"Comprar {game.name}",
+                       price_area=render_xbox_price_area(game))
+
+    def send_nintendo_product(self, match, query):
+        game = FixtureGame(int(match.group(1)))
+        self.send_page("nintendo_product.html", title=game.name, price_area=render_nintendo_price_area(game))
+
+    def send_itad_game(self, match, query):
+        game = FixtureGame(int(match.group(1)))
+        self.send_page("itad_game.html", title=game.name, rows=render_itad_rows(game, self.base_url))
+
+    def send_itad_lookup(self, match, query):
+        self.send_json(get_itad_lookup(query.get("title", [""])[0]))
+
+    def send_itad_prices(self, match, query, itad_ids):
+        self.send_json(get_itad_prices(itad_ids or [], self.base_url))
+
+    def send_chunked(self, match, query):
+        """Send the "chunks" query parameter, comma separated, as the chunks of the body."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in query.get("chunks", [""])[0].split(","):
+            if chunk:
+                self.wfile.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk.encode("latin-1") + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_gzip(self, match, query):
+        self.send_body(gzip.compress(json.dumps({"ok": True}).encode("utf-8")), "application/json",
+                       headers={"Content-Encoding": "gzip"})
+
+    def send_redirect(self, match, query):
+        """Redirect /http/redirect/<n>/ to /http/redirect/<n - 1>/ with a relative link, until 0."""
+        hops = int(match.group(1))
+        if hops:
+            self.send_body(b"", "text/plain", 302, {"Location": f"../{hops - 1}/"})
+        else:
+            self.send_json({"ok": True})
+
+    def send_status(self, match, query):
+        self.send_body(b"Error", "text/plain", int(match.group(1)))
+
+    def send_connection(self, match, query):
+        """
+        Send the client port, which is the same for the requests sent on one connection. The
+        connection is closed after the response with ?close=1.
+        """
+        headers = {"Connection": "close"} if query.get("close") else None
+        self.send_body(json.dumps({"port": self.client_address[1]}).encode("utf-8"), "application/json",
+                       headers=headers)
+
+
+class FixtureStoreServer(ThreadingHTTPServer):
+    """
+    Fixture store server running in a background thread. Use it as a context manager, or call
+    start and stop. Port 0 picks a free port.
+    """
+    daemon_threads = True
+    # the default backlog of 5 makes concurrent clients wait for SYN retransmits
+    request_queue_size = 128
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = DEFAULT_LATENCY):
+        super().__init__((host, port), FixtureRequestHandler)
+        self.host = host
+        self.latency = latency
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.server_address[1]}"
+
+    def count_request(self):
+        with self._lock:
+            self.request_count += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded store pages for the benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY,
+                        help="seconds added to every response (default: %(default)s)")
+    args = parser.parse_args()
+
+    server = FixtureStoreServer(args.host, args.port, args.latency)
+    print(f"Fixture store server listening on {server.url}")
+    for key, link in FixtureGame(0).get_links(server.url).items():
+        print(f"  {key}: {link}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
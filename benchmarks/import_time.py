@@ -0,0 +1,81 @@
+# Import time check of the app start-up. Each module is imported in a fresh interpreter with
+# python -X importtime, and the check fails if the import takes longer than the budget or loads one
+# of the forbidden modules (the scraping stack, which the main menu must not wait for):
+#
+#   python benchmarks/import_time.py --modules main_ui --budget 1.5
+#
+# The slowest imports are printed, so a regression can be traced to the module that caused it.
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+# ...
+
+REPO_FOLDER = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = ["main_ui"]
+
+# Seconds an import can take, the cumulative time reported by -X importtime
+DEFAULT_BUDGET = 1.5
+
+# Modules that must not be loaded by the imports being checked
+DEFAULT_FORBIDDEN = ["selenium", "current_prices", "current_prices_consoles"]
+
+SLOWEST_IMPORTS = 10
+
+
+def measure_import(module: str) -> dict:
+    """Import module in a new interpreter, returning {imported module: cumulative seconds}."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_FOLDER, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip()}")
+
+    # lines look like "import time:       412 |       1024 |   json", nested imports are indented
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        timings[name.strip()] = int(cumulative) / 1_000_000
+    return timings
+
+
+def find_loaded(timings: dict, modules: list) -> list:
+    """The modules, or their submodules, that were imported in the timings."""
+    return [name for name in modules
+            if any(imported == name or imported.startswith(f"{name}.") for imported in timings)]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Check the import time of the app start-up modules.")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES,
+                        help="modules to import (default: %(default)s)")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help="seconds each import can take (default: %(default)s)")
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN,
+                        help="modules the imports must not load (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        timings = measure_import(module)
+        elapsed = timings.get(module, 0.0)
+        print(f"import {module}: {elapsed:.3f}s (budget {args.budget:.3f}s)")
+        for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_IMPORTS]:
+            print(f"    {seconds:.3f}s  {name}")
+
+        if elapsed > args.budget:
+            print(f"import {module} is over its budget", file=sys.stderr)
+            failed = True
+        loaded = find_loaded(timings, args.forbid)
+        if loaded:
+            print(f"import {module} loads {', '.join(loaded)}", file=sys.stderr)
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,339 @@
+# Benchmarks of the price backends against the local fixture store server (fixture_server.py).
+# Each backend refreshes fixture libraries of several sizes at several concurrency levels, and the
+# results are written as a JSON report:
+#
+#   python benchmarks/run_benchmarks.py --backends pc-http pc-async --sizes 10 100 --concurrency 1 8
+#
+# Backends:
+#   pc-http          get_game_prices with the store_api HTTP backend, a thread per game
+#   pc-async         the asyncio fetch engine, batched requests (concurrency = requests per host)
+#   pc-browser       get_steam_prices_direct and get_gog_prices_direct in a Chrome driver pool
+#   itad-http        old format entries read from the batched IsThereAnyDeal API, a thread per game
+#   itad-async       old format entries read from the batched IsThereAnyDeal API by the fetch engine
+#   itad-browser     old format entries scraped from the IsThereAnyDeal page
+#   console-browser  get_psn_prices, get_xbox_prices and get_nintendo_prices in a Chrome driver pool
+#
+# For every run the report has the games per second, the p50/p95/p99 per-game latency, the peak
+# memory allocated by Python (tracemalloc, Chrome is not included), the number of requests the
+# fixture server answered and the number of prices that don't match the fixture catalogue. With
+# --timings, every run also has the time spent in each fetch stage (see fetch_timing.py), and
+# --page-parser script reads the prices of the browser backends with execute_script instead of the
+# parse workers of page_parsers.py.
+# --full-profile runs the browser backends without the lean Chrome profile (see chrome_profile.py),
+# and --tabs loads the store pages of a game side by side in tabs of each driver (see browser_tabs.py).
+import argparse
+import contextlib
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import browser_tabs
+import chrome_profile
+import current_prices
+import current_prices_consoles
+import fetch_engine
+import fetch_timing
+import itad_api
+import page_parsers
+import refresh_scheduler
+import store_api
+
+import fixture_server
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+# ...
+
+DEFAULT_SIZES = [10, 50, 200]
+DEFAULT_CONCURRENCY = [1, 4, 8]
+
+BROWSER_BACKENDS = ["pc-browser", "itad-browser", "console-browser"]
+
+
+def run_in_threads(game_names: list, fetch_game, concurrency: int) -> tuple[dict, list]:
+    """Run fetch_game(game_name) for every game in a thread pool. Returns (results, latencies)."""
+    results = {}
+    latencies = []
+
+    def timed_fetch(game_name):
+        start = time.perf_counter()
+        game_data = fetch_game(game_name)
+        return game_data, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(timed_fetch, game_name): game_name for game_name in game_names}
+        for future in as_completed(futures):
+            game_data, latency = future.result()
+            results[futures[future]] = game_data
+            latencies.append(latency)
+
+    return results, latencies
+
+
+def start_driver_pool(concurrency: int) -> current_prices.ChromeDriverPool:
+    """Start every driver of a pool up front, so Chrome start-up is not counted as game latency."""
+    driver_pool = current_prices.ChromeDriverPool(concurrency)
+    drivers = [driver_pool.acquire() for _ in range(concurrency)]
+    for driver in drivers:
+        driver_pool.release(driver)
+    return driver_pool
+
+
+def run_with_drivers(driver_pool, game_names: list, fetch_game, finish_game, concurrency: int) -> tuple[dict, list]:
+    """
+    Run fetch_game(game_name, driver) for every game with the refresh scheduler and the drivers of
+    the pool, and finish_game on its result once the driver is back in the pool.
+    """
+    results = {}
+    latencies = []
+    scheduler = refresh_scheduler.RefreshScheduler(driver_pool)
+
+    for game_name in game_names:
+        def timed_fetch(driver, game_name=game_name):
+            start = time.perf_counter()
+            return fetch_game(game_name, driver), start
+
+        def timed_finish(result):
+            game_data, start = result
+            return finish_game(game_data), time.perf_counter() - start
+
+        scheduler.add_job("benchmark", game_name, timed_fetch, timed_finish)
+
+    def on_game_data(kind, game_name, result):
+        results[game_name], latency = result
+        latencies.append(latency)
+
+    def on_error(kind, game_name, error):
+        raise RuntimeError(f"{game_name}: {error}")
+
+    scheduler.run(on_game_data, on_error)
+    return results, latencies
+
+
+def run_pc_http(games_to_check: dict, concurrency: int, driver_pool=None) -> tuple[dict, list]:
+    def fetch_game(game_name):
+        prices = current_prices.get_game_prices(game_name, backend="http", game_data=games_to_check[game_name])
+        return current_prices.build_game_data(prices)
+
+    return run_in_threads(list(games_to_check), fetch_game, concurrency)
+
+
+def run_pc_async(games_to_check: dict, concurrency: int, driver_pool=None) -> tuple[dict, list]:
+    """Requests are batched across games, so a game's latency is the time until all its stores are done."""
+    results = {}
+    latencies = []
+    start = time.perf_counter()
+
+    def on_game_prices(game_name, prices):
+        latencies.append(time.perf_counter() - start)
+        results[game_name] = current_prices.build_game_data(prices)
+
+    fixture_host = urlsplit(store_api.STEAM_STORE_URL).hostname
+    fetch_engine.run_fetch_games_prices(games_to_check, on_game_prices, {fixture_host: concurrency})
+    return results, latencies
+
+
+def run_pc_browser(games_to_check: dict, concurrency: int, driver_pool=None) -> tuple[dict, list]:
+    def fetch_game(game_name, driver):
+        return current_prices.get_game_prices(game_name, driver, backend="browser",
+                                              game_data=games_to_check[game_name], wait_parse=False)
+
+    def finish_game(prices):
+        return current_prices.build_game_data(current_prices.finish_game_prices(prices))
+
+    return run_with_drivers(driver_pool, list(games_to_check), fetch_game, finish_game, concurrency)
+
+
+def run_console_browser(games_to_check: dict, concurrency: int, driver_pool=None) -> tuple[dict, list]:
+    def fetch_game(game_name, driver):
+        return current_prices_consoles.get_game_prices(game_name, driver, games_to_check[game_name],
+                                                       wait_parse=False)
+
+    return run_with_drivers(driver_pool, list(games_to_check), fetch_game,
+                            current_prices_consoles.finish_game_prices, concurrency)
+
+
+BACKENDS = {
+    "pc-http": (run_pc_http, fixture_server.get_pc_games_to_check),
+    "pc-async": (run_pc_async, fixture_server.get_pc_games_to_check),
+    "pc-browser": (run_pc_browser, fixture_server.get_pc_games_to_check),
+    "itad-http": (run_pc_http, fixture_server.get_itad_games_to_check),
+    "itad-async": (run_pc_async, fixture_server.get_itad_games_to_check),
+    "itad-browser": (run_pc_browser, fixture_server.get_itad_games_to_check),
+    "console-browser": (run_console_browser, fixture_server.get_console_games_to_check),
+}
+
+
+def get_expected_prices(backend: str, catalogue: list) -> dict:
+    """Return the {game_name: {store: (current, base)}} prices the fixture server shows."""
+    if backend == "console-browser":
+        return {game.name: {store: game.get_console_prices() for store in ["psn", "xbox", "nintendo"]}
+                for game in catalogue}
+    return {game.name: {store: game.get_pc_prices() for store in ["steam", "gog"]} for game in catalogue}
+
+
+def count_mismatches(results: dict, expected_prices: dict) -> int:
+    """Count the store prices of the results that differ from the fixture catalogue."""
+    mismatches = 0
+    for game_name, store_prices in expected_prices.items():
+        game_data = results.get(game_name) or {}
+        for store, (current, base) in store_prices.items():
+            store_data = game_data.get(store) or {}
+            if (round(store_data.get("current") or 0.0, 2) != round(current, 2)
+                    or round(store_data.get("base") or 0.0, 2) != round(base, 2)):
+                mismatches += 1
+    return mismatches
+
+
+def run_benchmark(server: fixture_server.FixtureStoreServer, backend: str, size: int,
+                  concurrency: int, work_dir: Path, timings: bool = False) -> dict:
+    """Refresh a fixture library of `size` games with a backend and return the measurements."""
+    run_backend, get_games_to_check = BACKENDS[backend]
+    catalogue = fixture_server.build_catalogue(size)
+    games_to_check = get_games_to_check(catalogue, server.url)
+
+    current_prices.GAMES_TO_CHECK = games_to_check
+    current_prices_consoles.GAMES_TO_CHECK = games_to_check
+    store_api.STEAM_STORE_URL = f"{server.url}/steam"
+    store_api.GOG_API_URL = f"{server.url}/gog-api"
+    # start every run with an empty GOG product id cache, as on a first refresh
+    store_api.GOG_PRODUCT_IDS_PATH = work_dir / "gog_product_ids.json"
+    store_api.GOG_PRODUCT_IDS_PATH.unlink(missing_ok=True)
+    store_api._gog_product_ids = None
+    itad_api.ITAD_API_URL = f"{server.url}/itad-api"
+    itad_api.ITAD_API_KEY = "fixture"
+    itad_api.ITAD_GAME_IDS_PATH = work_dir / "itad_game_ids.json"
+    itad_api.ITAD_GAME_IDS_PATH.unlink(missing_ok=True)
+    itad_api._itad_game_ids = None
+
+    report = {"backend": backend, "games": size, "concurrency": concurrency}
+    driver_pool = None
+    timing_sink = fetch_timing.RingBufferSink() if timings else None
+    if timing_sink:
+        fetch_timing.add_sink(timing_sink)
+    try:
+        setup_start = time.perf_counter()
+        if backend in BROWSER_BACKENDS:
+            driver_pool = start_driver_pool(concurrency)
+        report["setup_seconds"] = time.perf_counter() - setup_start
+
+        requests_before = server.request_count
+        tracemalloc.start()
+        start = time.perf_counter()
+        results, latencies = run_backend(games_to_check, concurrency, driver_pool)
+        elapsed = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+    except Exception as e:
+        report["error"] = str(e)
+        return report
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if driver_pool:
+            driver_pool.close()
+        if timing_sink:
+            fetch_timing.remove_sink(timing_sink)
+
+    report.update({
+        "elapsed_seconds": elapsed,
+        "games_per_second": size / elapsed if elapsed else None,
+        "latency_seconds": {
+            "p50": fetch_timing.percentile(latencies, 50),
+            "p95": fetch_timing.percentile(latencies, 95),
+            "p99": fetch_timing.percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        },
+        "peak_python_memory_bytes": peak_memory,
+        "requests": server.request_count - requests_before,
+        "mismatches": count_mismatches(results, get_expected_prices(backend, catalogue)),
+    })
+    if timing_sink:
+        report["stages"] = fetch_timing.summarize(timing_sink.get_spans())
+    return report
+
+
+def get_max_rss() -> dict:
+    """Peak resident memory of this process and its finished children (chromedriver), in bytes."""
+    if not resource:
+        return {}
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+        "children_max_rss_bytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the price backends against recorded store pages.")
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=["pc-http", "pc-async"],
+                        help="backends to run (default: %(default)s)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES,
+                        help="library sizes, in games (default: %(default)s)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=DEFAULT_CONCURRENCY,
+                        help="drivers, threads or requests per host (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=fixture_server.DEFAULT_LATENCY,
+                        help="seconds the fixture server adds to every response (default: %(default)s)")
+    parser.add_argument("--timings", action="store_true",
+                        help="add the time spent in each fetch stage to the report")
+    parser.add_argument("--page-parser", choices=["script", "page_source"], default=page_parsers.PAGE_PARSER,
+                        help="how the browser backends read the prices of a page (default: %(default)s)")
+    parser.add_argument("--full-profile", action="store_true",
+                        help="load every resource of the pages in the browser backends")
+    parser.add_argument("--tabs", type=int, default=browser_tabs.TABS_PER_DRIVER,
+                        help="pages each driver of the browser backends loads at once (default: %(default)s)")
+    parser.add_argument("--output", "-o", default="-", help="report file, - for stdout (default)")
+    args = parser.parse_args(argv)
+    page_parsers.PAGE_PARSER = args.page_parser
+    chrome_profile.LEAN_PROFILE = not args.full_profile
+    browser_tabs.TABS_PER_DRIVER = args.tabs
+
+    runs = []
+    with fixture_server.FixtureStoreServer(latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as work_dir:
+        for backend in args.backends:
+            for size in args.sizes:
+                for concurrency in args.concurrency:
+                    print(f"Running {backend} with {size} games and concurrency {concurrency}...",
+                          file=sys.stderr)
+                    # keep the prints of the fetch functions out of the report
+                    with contextlib.redirect_stdout(sys.stderr):
+                        runs.append(run_benchmark(server, backend, size, concurrency, Path(work_dir),
+                                                  args.timings))
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "server_latency_seconds": args.latency,
+        "page_parser": args.page_parser,
+        "lean_chrome_profile": chrome_profile.LEAN_PROFILE,
+        "tabs_per_driver": browser_tabs.TABS_PER_DRIVER,
+        "runs": runs,
+    }
+    report.update(get_max_rss())
+
+    report_json = json.dumps(report, indent=4)
+    if args.output == "-":
+        print(report_json)
+    else:
+        Path(args.output).write_text(report_json + "\n")
+
+    failed_runs = [run for run in runs if run.get("error") or run.get("mismatches")]
+    return 1 if failed_runs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
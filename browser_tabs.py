@@ -0,0 +1,128 @@
+# Loads the store pages of a game side by side in the tabs of one Chrome driver, instead of one
+# page after the other. Every page is started without waiting for it, and each tab is read as soon
+# as its ready selector is on the page, so Steam and GOG, or PSN, Xbox and Nintendo, load at the
+# same time without starting more Chrome processes:
+#
+#   results = browser_tabs.fetch_in_tabs(driver, [
+#       browser_tabs.TabJob(steam_link, ".breadcrumbs", read_steam),
+#       browser_tabs.TabJob(gog_link, ".product-actions-price__final-amount", read_gog),
+#   ])
+#
+# read(driver) is called with the driver switched to the tab of the job. It reads the page as it's
+# loaded, e.g. get_steam_prices_direct(driver, steam_link, load_page=False). Tabs are reused for the
+# next pages and closed at the end, so the driver is left with its first tab, as it was.
+import time
+from typing import Callable
+
+import fetch_budget
+import fetch_timing
+
+# ...
+
+# Pages a driver loads at once, 1 loads one page at a time without opening tabs
+TABS_PER_DRIVER = 1
+
+# Seconds a tab is given for its ready selector to show up, it's read anyway after that
+READY_TIMEOUT = 20
+
+# Seconds between two checks of the loading tabs
+POLL_INTERVAL = 0.1
+
+# Navigates the tab without waiting for the page. The old page is flagged, so it's not taken for
+# the new one while the navigation starts
+START_PAGE_SCRIPT = """
+window.__priceTabStale = true;
+window.location.href = arguments[0];
+"""
+
+READY_SCRIPT = """
+return !window.__priceTabStale && document.readyState !== "loading"
+    && document.querySelector(arguments[0]) !== null;
+"""
+
+
+class TabJob:
+    """
+    A page to load in a tab, read(driver) reads it once ready_selector is on the page. tags are
+    added to the timing span of the page load, e.g. the store.
+    """
+
+    def __init__(self, link: str, ready_selector: str, read: Callable, tags: dict = None):
+        self.link = link
+        self.ready_selector = ready_selector
+        self.read = read
+        self.tags = tags or {}
+
+
+def is_enabled() -> bool:
+    return TABS_PER_DRIVER > 1
+
+
+def fetch_in_tabs(driver, jobs: list, max_tabs: int = None) -> list:
+    """
+    Load the page of every job in up to max_tabs tabs of driver (TABS_PER_DRIVER by default) and
+    read each one as soon as it's ready. Returns the results of the reads in the order of the
+    jobs, with the exception as the result of a read that failed.
+    """
+    max_tabs = max(1, min(max_tabs or TABS_PER_DRIVER, len(jobs)))
+    results = [None] * len(jobs)
+    pending = list(enumerate(jobs))
+    first_handle = driver.current_window_handle
+    opened_handles = []
+    free_handles = [first_handle]
+    loading = {}  # handle: (job index, time the tab is read anyway)
+
+    try:
+        while pending or loading:
+            # start the next pages in the free tabs, opening tabs up to max_tabs
+            while pending and (free_handles or len(opened_handles) + 1 < max_tabs):
+                if free_handles:
+                    handle = free_handles.pop()
+                    driver.switch_to.window(handle)
+                else:
+                    driver.switch_to.new_window("tab")
+                    handle = driver.current_window_handle
+                    opened_handles.append(handle)
+
+                index, job = pending.pop(0)
+                with fetch_timing.span("driver_get", **job.tags):
+                    driver.execute_script(START_PAGE_SCRIPT, job.link)
+                loading[handle] = (index, time.monotonic() + fetch_budget.get_timeout(READY_TIMEOUT))
+
+            with fetch_timing.span("wait_page"):
+                ready_handle = wait_for_ready_tab(driver, jobs, loading)
+
+            index, _ = loading.pop(ready_handle)
+            try:
+                results[index] = jobs[index].read(driver)
+            except Exception as e:
+                results[index] = e
+            free_handles.append(ready_handle)
+    finally:
+        for handle in opened_handles:
+            try:
+                driver.switch_to.window(handle)
+                driver.close()
+            except Exception as e:
+                print(f"Error closing a Chrome tab: {e}")
+        driver.switch_to.window(first_handle)
+
+    return results
+
+
+def wait_for_ready_tab(driver, jobs: list, loading: dict):
+    """Return the handle of the first loading tab that is ready or out of time, switched to it."""
+    while True:
+        for handle, (index, ready_at) in loading.items():
+            driver.switch_to.window(handle)
+            if time.monotonic() >= ready_at or is_tab_ready(driver, jobs[index].ready_selector):
+                return handle
+        time.sleep(POLL_INTERVAL)
+
+
+def is_tab_ready(driver, ready_selector: str) -> bool:
+    try:
+        return bool(driver.execute_script(READY_SCRIPT, ready_selector))
+    except Exception:
+        # the page is between two documents
+        return False
@@ -0,0 +1,299 @@
+# The Chrome profile of the scraping drivers. The lean profile only loads what the prices need:
+# images are turned off in the preferences, fonts, videos and the analytics and ad hosts are
+# blocked through DevTools, the background services Chrome starts with are turned off, and
+# driver.get returns as soon as the HTML is parsed (the "eager" page load strategy) instead of
+# waiting for every resource. The fetchers wait for the price elements themselves.
+#
+#   driver = chrome_profile.start_driver(headless=True)
+#   ...
+#   chrome_profile.quit_driver(driver)
+#
+# Set LEAN_PROFILE to False, or the LEAN_CHROME_PROFILE environment variable to 0, to load the
+# pages as a normal Chrome would when debugging a fetcher.
+#
+# With PERSISTENT_PROFILE on (PERSISTENT_CHROME_PROFILE=1), every driver gets a user data folder in
+# the user data folder that outlives the run, so the HTTP cache is warm on the next run, and the
+# Steam age check and GOG cookie consent cookies are set before the first page is loaded. A Chrome
+# profile can only be used by one Chrome at a time, so each driver claims one of the profile
+# slots, across processes too, and a new slot is made when all of them are taken.
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+
+import app_data
+import fetch_timing
+import network_capture
+
+# ...
+
+# Environment variable that turns the lean profile off when set to 0
+LEAN_PROFILE_ENV = "LEAN_CHROME_PROFILE"
+
+LEAN_PROFILE = os.environ.get(LEAN_PROFILE_ENV, "1") != "0"
+
+# Environment variable that turns the persistent profile on when set to 1
+PERSISTENT_PROFILE_ENV = "PERSISTENT_CHROME_PROFILE"
+
+PERSISTENT_PROFILE = os.environ.get(PERSISTENT_PROFILE_ENV, "0") == "1"
+
+# Folder of the profile slots, in the user data folder
+PROFILES_FOLDER_NAME = "chrome_profiles"
+
+# File that marks a profile slot as taken, with the id of the process using it
+SLOT_LOCK_NAME = "slot.lock"
+
+# Seconds after which a slot lock without a process id is stale, the process id is written right
+# after the lock is created, so an empty lock this old was left by a process that crashed in between
+EMPTY_LOCK_SECONDS = 5
+
+# Windows API values of the slot lock process check
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+ERROR_ACCESS_DENIED = 5
+
+# Size of the HTTP cache of a persistent profile, in bytes
+DISK_CACHE_SIZE = 200 * 1024 * 1024
+
+# Days the seeded cookies last
+SEEDED_COOKIE_DAYS = 365
+
+# Cookies set in a persistent profile before the first page: a 1990 birth date for the Steam age
+# check, and a necessary-only consent for the GOG Cookiebot dialog
+SEEDED_COOKIES = [
+    {"name": "birthtime", "value": "631152001", "domain": "store.steampowered.com", "path": "/"},
+    {"name": "lastagecheckage", "value": "1-0-1990", "domain": "store.steampowered.com", "path": "/"},
+    {"name": "wants_mature_content", "value": "1", "domain": "store.steampowered.com", "path": "/"},
+    {"name": "CookieConsent", "domain": ".gog.com", "path": "/",
+     "value": "{stamp:%27-1%27%2Cnecessary:true%2Cpreferences:false%2Cstatistics:false"
+              "%2Cmarketing:false%2Cmethod:%27explicit%27%2Cver:1}"},
+]
+
+# Resources blocked with Network.setBlockedURLs, none of them has a price in it
+BLOCKED_URL_PATTERNS = [
+    # fonts
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    # videos and trailers
+    "*.mp4", "*.webm", "*.m3u8", "*.mpd", "*.m4s",
+    # images not covered by the images setting (CSS backgrounds, favicons)
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    # analytics and ads
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*googlesyndication.com*",
+    "*facebook.net*", "*hotjar.com*", "*newrelic.com*", "*nr-data.net*", "*clarity.ms*",
+    "*demdex.net*", "*omtrdc.net*", "*scorecardresearch.com*",
+]
+
+# Background services and features a scraping session doesn't use
+LEAN_ARGUMENTS = [
+    "--blink-settings=imagesEnabled=false",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-extensions",
+    "--disable-sync",
+    "--disable-features=Translate,MediaRouter,OptimizationHints",
+    "--metrics-recording-only",
+    "--mute-audio",
+    "--no-default-browser-check",
+    "--no-first-run",
+    "--autoplay-policy=user-gesture-required",
+]
+
+# Chrome preferences, 2 blocks a content type
+LEAN_PREFERENCES = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.default_content_setting_values.notifications": 2,
+    "profile.default_content_setting_values.geolocation": 2,
+    "profile.default_content_setting_values.media_stream": 2,
+}
+
+
+_profile_dirs = {}  # driver: profile slot folder
+_profile_dirs_lock = threading.Lock()
+
+
+def start_driver(headless: bool = True) -> webdriver.Chrome:
+    """Start a scraping driver, with the lean and the persistent profiles when they are on."""
+    profile_dir = claim_profile_dir() if PERSISTENT_PROFILE else None
+    options = build_options(headless, user_data_dir=profile_dir)
+
+    try:
+        with fetch_timing.span("driver_start"):
+            driver = webdriver.Chrome(service=Service(), options=options)
+    except Exception:
+        release_profile_dir(profile_dir)
+        raise
+
+    apply_network_blocking(driver)
+    if profile_dir:
+        with _profile_dirs_lock:
+            _profile_dirs[driver] = profile_dir
+        seed_cookies(driver)
+    return driver
+
+
+def quit_driver(driver: webdriver.Chrome):
+    """Quit a driver started by start_driver, freeing its profile slot."""
+    with _profile_dirs_lock:
+        profile_dir = _profile_dirs.pop(driver, None)
+    try:
+        with fetch_timing.span("driver_quit"):
+            driver.quit()
+    finally:
+        release_profile_dir(profile_dir)
+
+
+def build_options(headless: bool = True, lean: bool = None, user_data_dir: Path = None) -> webdriver.ChromeOptions:
+    """
+    Return the options of a scraping driver, with the lean profile unless lean is False, and the
+    profile in user_data_dir when it's given (a new empty profile otherwise).
+    """
+    lean = LEAN_PROFILE if lean is None else lean
+    options = webdriver.ChromeOptions()
+
+    if headless:
+        options.add_argument("--headless=new")
+
+    if user_data_dir:
+        options.add_argument(f"--user-data-dir={user_data_dir}")
+        options.add_argument(f"--disk-cache-size={DISK_CACHE_SIZE}")
+
+    if network_capture.is_enabled():
+        # the network events the store API responses are read from
+        options.set_capability("goog:loggingPrefs", network_capture.LOGGING_PREFS)
+
+    if lean:
+        for argument in LEAN_ARGUMENTS:
+            options.add_argument(argument)
+        options.add_experimental_option("prefs", LEAN_PREFERENCES)
+        # driver.get returns at DOMContentLoaded, the fetchers wait for the price elements
+        options.page_load_strategy = "eager"
+
+    return options
+
+
+def apply_network_blocking(driver: webdriver.Chrome, lean: bool = None):
+    """Block the BLOCKED_URL_PATTERNS requests of a started driver, if the lean profile is on."""
+    lean = LEAN_PROFILE if lean is None else lean
+    if not lean:
+        return
+
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    except Exception as e:
+        # the pages still load, only slower
+        print(f"Could not block the scraping resources: {e}")
+
+
+def get_profiles_dir() -> Path:
+    return app_data.get_data_dir() / PROFILES_FOLDER_NAME
+
+
+def claim_profile_dir() -> Path:
+    """Claim the first free profile slot, making a new one if every slot is taken."""
+    profiles_dir = get_profiles_dir()
+    profiles_dir.mkdir(exist_ok=True)
+
+    index = 0
+    while True:
+        profile_dir = profiles_dir / f"profile_{index}"
+        profile_dir.mkdir(exist_ok=True)
+        if claim_slot(profile_dir / SLOT_LOCK_NAME):
+            return profile_dir
+        index += 1
+
+
+def claim_slot(lock_path: Path) -> bool:
+    """Create the lock file of a slot. A lock left by a process that is gone is taken over."""
+    for _ in range(2):
+        try:
+            lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if is_lock_held(lock_path):
+                return False
+            # stale lock of a process that crashed
+            lock_path.unlink(missing_ok=True)
+            continue
+        with os.fdopen(lock_fd, "w") as lock_file:
+            lock_file.write(str(os.getpid()))
+        return True
+    return False
+
+
+def release_profile_dir(profile_dir: Optional[Path]):
+    if profile_dir:
+        (profile_dir / SLOT_LOCK_NAME).unlink(missing_ok=True)
+
+
+def read_lock_pid(lock_path: Path) -> Optional[int]:
+    try:
+        return int(lock_path.read_text().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def is_lock_held(lock_path: Path) -> bool:
+    pid = read_lock_pid(lock_path)
+    if pid is not None:
+        return is_process_running(pid)
+    try:
+        lock_age = time.time() - lock_path.stat().st_mtime
+    except OSError:
+        # removed since, the slot can be claimed again
+        return False
+    # a lock being written right now, or an empty one left by a crash
+    return lock_age < EMPTY_LOCK_SECONDS
+
+
+def is_process_running(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill(pid, 0) sends a Ctrl+C on Windows instead of checking the process
+        return is_windows_process_running(pid)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # the process exists but belongs to another user
+        return True
+    return True
+
+
+def is_windows_process_running(pid: int) -> bool:
+    """Check a process with OpenProcess and GetExitCodeProcess."""
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    kernel32.OpenProcess.restype = wintypes.HANDLE
+    kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    kernel32.GetExitCodeProcess.argtypes = [wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD)]
+    kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        # a process we may not query still exists, any other error means it's gone
+        return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+    try:
+        exit_code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return True
+        return exit_code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def seed_cookies(driver: webdriver.Chrome):
+    """Set the SEEDED_COOKIES in the profile of a driver, before its first page is loaded."""
+    expires = time.time() + SEEDED_COOKIE_DAYS * 24 * 60 * 60
+    cookies = [dict(cookie, expires=expires, secure=True) for cookie in SEEDED_COOKIES]
+    try:
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+    except Exception as e:
+        # the age gates are still handled on the pages
+        print(f"Could not set the age gate cookies: {e}")
@@ -1,10 +1,19 @@
 import os
-from pathlib import Path
 import platform
 import subprocess
+import time
 from PyQt5 import QtWidgets, QtGui, QtCore
 
+import app_data
+import current_prices
 import current_prices_consoles
+import fetch_budget
+import price_cache
+import price_client
+import price_history
+import price_metrics
+import refresh_scheduler
+from server_price_worker import ServerPriceWorker
 
 THIS_FOLDER = os.path.dirname(os.path.abspath(__file__))
 ICON_PATH = os.path.join(THIS_FOLDER, "icons", "window_icon.png")
@@ -12,6 +21,9 @@ ICON_PATH = os.path.join(THIS_FOLDER, "icons", "window_icon.png")
 # Global variable for price padding
 PRICE_PADDING = " " * 3
 
+# Key of each store link in console_games_to_check.json, by store key of the UI game data
+STORE_LINK_KEYS = {"psn": "psn_site", "xbox": "xbox_site", "nintendo": "nintendo_site"}
+
 class ConsolePriceWorker(QtCore.QThread):
     """Worker thread for fetching console game prices without blocking the UI."""
     price_updated = QtCore.pyqtSignal(str, dict)  # game_name, price_data
@@ -19,9 +31,12 @@ class ConsolePriceWorker(QtCore.QThread):
     finished_all = QtCore.pyqtSignal()  # all prices fetched
     error_occurred = QtCore.pyqtSignal(str)  # error message
 
-    def __init__(self):
+    def __init__(self, max_drivers=current_prices.MAX_DRIVERS, time_budget=None):
         super().__init__()
         self.games_to_check = {}
+        self.max_drivers = max_drivers
+        # seconds the whole run can take, the games not started by then keep their cached prices
+        self.time_budget = time_budget
     
     def set_games(self, games_dict):
         """Set the games dictionary to check."""
@@ -29,61 +44,56 @@ class ConsolePriceWorker(QtCore.QThread):
     
     def run(self):
         """Main worker thread function."""
+        with fetch_budget.deadline(self.time_budget):
+            self.fetch_all_prices()
+
+    def fetch_all_prices(self):
+        """Fetch the prices of every game, in order, until the time budget runs out."""
+        self.price_history = self.open_price_history()
         try:
-            self.progress_updated.emit("Starting Chrome driver...")
-            driver = current_prices_consoles.start_chrome_driver()
-            total_games = len(self.games_to_check)
-            for i, (game_name, sites) in enumerate(self.games_to_check.items(), 1):
-                self.progress_updated.emit(f"Fetching prices for {game_name} ({i}/{total_games})...")
-                try:
-                    price_data = {}
-                    # PSN
-                    if sites.get("psn_site"):
-                        try:
-                            base, current = current_prices_consoles.get_psn_prices(game_name, driver)
-                            price_data["psn"] = {
-                                "current": self.convert_to_float(current[0]) if current else 0.0,
-                                "base": self.convert_to_float(base[0]) if base else 0.0,
-                                "link": sites.get("psn_site")
-                            }
-                        except Exception as e:
-                            price_data["psn"] = {"current": 0.0, "base": 0.0, "link": sites.get("psn_site"), "error": str(e)}
-                    # Xbox
-                    if sites.get("xbox_site"):
-                        try:
-                            base, current = current_prices_consoles.get_xbox_prices(game_name, driver)
-                            price_data["xbox"] = {
-                                "current": self.convert_to_float(current) if current else 0.0,
-                                "base": self.convert_to_float(base) if base else 0.0,
-                                "link": sites.get("xbox_site")
-                            }
-                        except Exception as e:
-                            price_data["xbox"] = {"current": 0.0, "base": 0.0, "link": sites.get("xbox_site"), "error": str(e)}
-                    # Nintendo
-                    if sites.get("nintendo_site"):
-                        try:
-                            base, current = current_prices_consoles.get_nintendo_prices(game_name, driver)
-                            price_data["nintendo"] = {
-                                "current": self.convert_to_float(current) if current else 0.0,
-                                "base": self.convert_to_float(base) if base else 0.0,
-                                "link": sites.get("nintendo_site")
-                            }
-                        except Exception as e:
-                            price_data["nintendo"] = {"current": 0.0, "base": 0.0, "link": sites.get("nintendo_site"), "error": str(e)}
-                    self.price_updated.emit(game_name, price_data)
-                except Exception as e:
-                    self.error_occurred.emit(f"Error fetching prices for {game_name}: {str(e)}")
-            self.progress_updated.emit("Closing Chrome driver...")
-            current_prices_consoles.exit_chrome_driver(driver)
+            run_start = time.perf_counter()
+            self.total_games = len(self.games_to_check)
+            self.fetched_games = 0
+            self.skipped_games = 0
+
+            scheduler = refresh_scheduler.RefreshScheduler(max_drivers=self.max_drivers)
+            scheduler.add_console_games(self.games_to_check)
+            self.progress_updated.emit(f"Starting {scheduler.get_driver_count()} Chrome driver(s)...")
+            scheduler.run(self.on_game_data, self.on_game_error, self.on_game_skipped)
+
+            price_metrics.RUN_DURATION.observe(time.perf_counter() - run_start, kind="console", worker="ui")
+            if self.skipped_games:
+                self.progress_updated.emit(f"Out of time, {self.skipped_games} game(s) keep their cached prices")
             self.progress_updated.emit("All prices updated!")
             self.finished_all.emit()
         except Exception as e:
             self.error_occurred.emit(f"Critical error: {str(e)}")
-    def convert_to_float(self, price_str):
+        finally:
+            # the quotes fetched before an error are written too
+            if self.price_history:
+                self.price_history.close()
+
+    def on_game_data(self, kind, game_name, price_data):
+        """Emit the prices of a game as soon as they are fetched."""
+        self.fetched_games += 1
+        self.progress_updated.emit(f"Fetched prices for {game_name} ({self.fetched_games}/{self.total_games})...")
+        if self.price_history:
+            self.price_history.record_game_data(game_name, price_data)
+        self.price_updated.emit(game_name, price_data)
+
+    def on_game_error(self, kind, game_name, error):
+        self.error_occurred.emit(f"Error fetching prices for {game_name}: {error}")
+
+    def on_game_skipped(self, kind, game_name):
+        self.skipped_games += 1
+
+    def open_price_history(self):
+        """Open the price history database, the run goes on without it if it fails."""
         try:
-            return float(price_str.replace(',', '.')) if price_str else 0.0
-        except Exception:
-            return 0.0
+            return price_history.PriceHistory()
+        except Exception as e:
+            print(f"Error opening the price history: {e}")
+            return None
 
 class CurrentConsolePricesUI(QtWidgets.QWidget):
     def __init__(self):
@@ -92,8 +102,14 @@ class CurrentConsolePricesUI(QtWidgets.QWidget):
         self.showing_only_discounted = False
         self.games_data = {}  # Store game data: {game_name: {psn_data, xbox_data, nintendo_data, links}}
         self.games_order = []  # Store original order of game names
+        self.stale_games = set()  # Games shown from the cache that are being fetched again or failed
+        self.refreshing_stores = {}  # Stores being fetched again, for games refreshed incrementally
+        self.failed_stores = {}  # {game_name: {store: error}} of the stores shown from the cache after failing
+        self.price_cache = price_cache.PriceCache(price_cache.CONSOLE_CACHE_PATH)
+        self.use_server = False  # True while the price server refreshes the prices and writes the cache
         self.init_ui()
-        self.update_prices()
+        self.load_cached_prices()
+        self.update_prices(only_expired=True)
 
     def init_ui(self):
         self.setWindowTitle("Current Console Prices")
@@ -107,8 +123,19 @@ class CurrentConsolePricesUI(QtWidgets.QWidget):
         layout.addWidget(self.status_label)
         button_layout = QtWidgets.QHBoxLayout()
         self.refresh_button = QtWidgets.QPushButton("Refresh Prices")
-        self.refresh_button.clicked.connect(self.update_prices)
+        self.refresh_button.clicked.connect(lambda: self.update_prices())
         button_layout.addWidget(self.refresh_button)
+
+        self.refresh_expired_button = QtWidgets.QPushButton("Refresh Expired")
+        self.refresh_expired_button.setToolTip("Fetch only the prices whose cache expired, most changing first")
+        self.refresh_expired_button.clicked.connect(lambda: self.update_prices(only_expired=True))
+        button_layout.addWidget(self.refresh_expired_button)
+
+        self.quick_refresh_button = QtWidgets.QPushButton("Quick Refresh")
+        self.quick_refresh_button.setToolTip(f"Fetch the most outdated prices for {fetch_budget.QUICK_REFRESH_SECONDS} "
+                                             "seconds, the rest stay cached")
+        self.quick_refresh_button.clicked.connect(lambda: self.update_prices(quick=True))
+        button_layout.addWidget(self.quick_refresh_button)
         
         self.show_discounted_button = QtWidgets.QPushButton("Show Only Discounted")
         self.show_discounted_button.setEnabled(False)
@@ -176,27 +203,108 @@ class CurrentConsolePricesUI(QtWidgets.QWidget):
         self.prices_tree_widget.setColumnWidth(5, 2)   # Separator after PSN
         self.prices_tree_widget.setColumnWidth(9, 2)   # Separator after Xbox
 
-    def update_prices(self):
+    def connect_price_server(self):
+        """
+        Read the cached prices through the price server when it is running. The server is then the
+        only writer of the cache file, and the window keeps its updates in memory.
+        """
+        self.use_server = price_client.is_server_running()
+        if not self.use_server:
+            return
+        try:
+            self.price_cache.replace_games(price_client.get_prices("console"))
+        except Exception as e:
+            print(f"Error reading the prices of the price server: {e}")
+            self.use_server = False
+
+    def save_price_cache(self):
+        if not self.use_server:
+            self.price_cache.save()
+
+    def load_cached_prices(self):
+        """Fill the tree with the cached prices, update_prices marks the expired ones as stale."""
+        self.connect_price_server()
+        games_to_check = current_prices_consoles.update_games_to_check()
+        for game_name in games_to_check:
+            price_info = self.price_cache.get_game_data(game_name)
+            if not price_info:
+                continue
+            self.games_data[game_name] = price_info
+            self.games_order.append(game_name)
+            self.create_and_add_item(game_name, price_info)
+        if self.games_data:
+            self.status_label.setText("Showing cached prices")
+
+    def update_prices(self, only_expired=False, quick=False):
+        """
+        Start the price update process in a worker thread. With only_expired, the cached prices
+        stay in the tree and only the games whose cache expired are fetched again. A quick refresh
+        also keeps the cached prices, and fetches the games that most need it first until
+        QUICK_REFRESH_SECONDS run out.
+        """
         if self.worker and self.worker.isRunning():
             return
-        self.prices_tree_widget.clear()
+        self.connect_price_server()
+        games_to_check = current_prices_consoles.update_games_to_check()
+        self.price_cache.remove_missing_games(list(games_to_check))
+        self.refreshing_stores.clear()
+        if quick:
+            games_to_fetch = {}
+            for game_name in self.price_cache.get_games_by_priority(list(games_to_check)):
+                games_to_fetch[game_name] = games_to_check[game_name]
+                self.stale_games.add(game_name)
+                self.refresh_item(game_name)
+        elif only_expired:
+            games_to_fetch = {}
+            for game_name in self.price_cache.get_expired_games(list(games_to_check), by_priority=True):
+                games_to_fetch[game_name] = self.get_expired_game_data(game_name, games_to_check[game_name])
+                self.stale_games.add(game_name)
+                self.refresh_item(game_name)
+        else:
+            self.prices_tree_widget.clear()
+            self.games_data.clear()
+            self.stale_games.clear()
+            self.failed_stores.clear()
+            games_to_fetch = games_to_check
         self.refresh_button.setEnabled(False)
+        self.refresh_expired_button.setEnabled(False)
+        self.quick_refresh_button.setEnabled(False)
         self.show_discounted_button.setEnabled(False)
         self.sort_combo.setEnabled(False)
-        self.games_data.clear()
         self.games_order.clear()
+        self.games_order.extend(games_to_check)
+        if not games_to_fetch:
+            self.on_finished_all()
+            return
         self.status_label.setText("Initializing...")
-        self.worker = ConsolePriceWorker()
-        self.worker.set_games(current_prices_consoles.update_games_to_check())
+        time_budget = fetch_budget.QUICK_REFRESH_SECONDS if quick else None
+        if self.use_server:
+            # the server refreshes whole games, so every store of the game is fetched again
+            self.refreshing_stores.clear()
+            self.worker = ServerPriceWorker("console", only_expired, time_budget)
+        else:
+            self.worker = ConsolePriceWorker(time_budget=time_budget)
+        self.worker.set_games(games_to_fetch)
         self.worker.price_updated.connect(self.on_price_updated)
         self.worker.progress_updated.connect(self.on_progress_updated)
         self.worker.finished_all.connect(self.on_finished_all)
         self.worker.error_occurred.connect(self.on_error_occurred)
         self.worker.start()
 
+    def get_expired_game_data(self, game_name, sites):
+        """
+        Return the entry of a game in console_games_to_check.json without the sites whose cached
+        prices are still fresh, so only the expired stores are fetched.
+        """
+        expired_stores = self.price_cache.get_expired_stores(game_name)
+        if expired_stores is None:
+            return sites
+        self.refreshing_stores[game_name] = set(expired_stores)
+        fresh_site_keys = [STORE_LINK_KEYS[store] for store in STORE_LINK_KEYS if store not in expired_stores]
+        return {key: value for key, value in sites.items() if key not in fresh_site_keys}
+
     def open_data_folder(self):
-        folder = Path.home() / ".current_prices_data"
-        folder.mkdir(parents=True, exist_ok=True)
+        folder = app_data.get_data_dir()
         system = platform.system()
         if system == "Darwin":
             subprocess.run(["open", folder])
@@ -207,14 +315,59 @@ class CurrentConsolePricesUI(QtWidgets.QWidget):
 
     def on_price_updated(self, game_name, price_info):
         # Store game data in dictionary
+        # Keep the cached prices of the stores that were not fetched again
+        refreshed_stores = self.refreshing_stores.pop(game_name, None)
+        if refreshed_stores is not None:
+            price_info = dict(price_info)
+            for store, store_data in self.games_data.get(game_name, {}).items():
+                if store in STORE_LINK_KEYS and store not in refreshed_stores:
+                    price_info[store] = store_data
+
+        # the cache keeps the previous price of the failed stores
+        self.price_cache.update_game_data(game_name, price_info, stores=refreshed_stores)
+        price_info = self.keep_cached_failed_stores(game_name, price_info)
+
         self.games_data[game_name] = price_info
-        self.games_order.append(game_name)
-        
-        # Create and add item to tree
-        self.create_and_add_item(game_name, price_info)
+        if game_name not in self.games_order:
+            self.games_order.append(game_name)
+        self.refresh_item(game_name)
+
+    def keep_cached_failed_stores(self, game_name, price_info):
+        """
+        Replace the stores that failed, or were skipped by their circuit breaker, with their last
+        cached price, and mark the game as stale until it is fetched successfully.
+        """
+        failed_stores = {store: store_data["error"] for store, store_data in price_info.items()
+                         if isinstance(store_data, dict) and "error" in store_data}
+        if not failed_stores:
+            self.failed_stores.pop(game_name, None)
+            self.stale_games.discard(game_name)
+            return price_info
+
+        cached_data = self.price_cache.get_game_data(game_name) or {}
+        price_info = dict(price_info)
+        for store in failed_stores:
+            if store in cached_data:
+                price_info[store] = cached_data[store]
+        self.failed_stores[game_name] = failed_stores
+        self.stale_games.add(game_name)
+        return price_info
 
-    def create_and_add_item(self, game_name, price_info):
-        """Create a tree widget item from game data and add it to the tree."""
+    def refresh_item(self, game_name):
+        """Replace the row of a game with its current data, or add a new one."""
+        price_info = self.games_data.get(game_name)
+        if price_info is None:
+            return
+        existing_items = self.prices_tree_widget.findItems(game_name, QtCore.Qt.MatchExactly, 0)
+        if existing_items:
+            index = self.prices_tree_widget.indexOfTopLevelItem(existing_items[0])
+            self.prices_tree_widget.takeTopLevelItem(index)
+            self.create_and_add_item(game_name, price_info, index)
+        else:
+            self.create_and_add_item(game_name, price_info)
+
+    def create_and_add_item(self, game_name, price_info, index=None):
+        """Create a tree widget item from game data and add it to the tree (at index, if given)."""
         item = QtWidgets.QTreeWidgetItem([
             game_name, "|",
             self.convert_to_str(price_info.get("psn", {}).get("current", 0.0)),
@@ -256,7 +409,31 @@ class CurrentConsolePricesUI(QtWidgets.QWidget):
             "xbox_link": price_info.get("xbox", {}).get("link"),
             "nintendo_link": price_info.get("nintendo", {}).get("link")
         })
-        self.prices_tree_widget.addTopLevelItem(item)
+
+        # Mark cached prices that are being fetched again
+        if game_name in self.stale_games:
+            self.mark_item_as_stale(item, game_name)
+
+        if index is None:
+            self.prices_tree_widget.addTopLevelItem(item)
+        else:
+            self.prices_tree_widget.insertTopLevelItem(index, item)
+
+    def mark_item_as_stale(self, item, game_name):
+        """
+        Show the game name in gray italic with a tooltip, for expired cached prices and for the
+        stores that failed.
+        """
+        font = item.font(0)
+        font.setItalic(True)
+        item.setFont(0, font)
+        item.setForeground(0, QtGui.QBrush(QtGui.QColor("#8a8a8a")))
+        failed_stores = self.failed_stores.get(game_name)
+        if failed_stores:
+            item.setToolTip(0, "Stale price, showing the last cached price of:\n" + "\n".join(
+                f"{store}: {error}" for store, error in failed_stores.items()))
+        else:
+            item.setToolTip(0, "Cached price, not refreshed yet")
 
     def open_context_menu(self, point):
         item = self.prices_tree_widget.itemAt(point)
@@ -299,20 +476,31 @@ class CurrentConsolePricesUI(QtWidgets.QWidget):
 
     def on_finished_all(self):
         self.refresh_button.setEnabled(True)
+        self.refresh_expired_button.setEnabled(True)
+        self.quick_refresh_button.setEnabled(True)
         self.show_discounted_button.setEnabled(True)
         self.sort_combo.setEnabled(True)
         self.sort_combo.setCurrentIndex(0)  # Reset to "Saved Order"
-        self.status_label.setText("All prices updated successfully!")
+        self.sort_by_saved_order()
+        self.save_price_cache()
+        if self.failed_stores:
+            self.status_label.setText(f"Prices updated, {len(self.failed_stores)} game(s) show stale prices "
+                                      "of stores that failed or were skipped")
+        else:
+            self.status_label.setText("All prices updated successfully!")
 
     def on_error_occurred(self, error_message):
         self.status_label.setText(f"Error: {error_message}")
         self.refresh_button.setEnabled(True)
+        self.refresh_expired_button.setEnabled(True)
+        self.quick_refresh_button.setEnabled(True)
         QtWidgets.QMessageBox.warning(self, "Error", error_message)
 
     def closeEvent(self, event):
         if self.worker and self.worker.isRunning():
             self.worker.terminate()
             self.worker.wait()
+        self.save_price_cache()
         event.accept()
 
     def apply_discount_filter(self):
@@ -458,6 +646,7 @@ class CurrentConsolePricesUI(QtWidgets.QWidget):
 
 if __name__ == "__main__":
     import sys
+    price_metrics.start_metrics_server_from_env()
     app = QtWidgets.QApplication(sys.argv)
     window = CurrentConsolePricesUI()
     window.showMaximized()
@@ -1,305 +1,384 @@
 # import necessary tools from the selenium library
-import time
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
 # from selenium.webdriver.
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-import json
-from pathlib import Path
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
 from typing import Optional
 
+import app_data
+import browser_tabs
+import chrome_profile
+import fetch_budget
+import fetch_timing
+import itad_api
+import page_parsers
+import store_adapters
+import store_api
+import store_breaker
+
 # ...
 
 
 DEBUG = False
 
+# Number of headless Chrome drivers the price workers run in parallel
+MAX_DRIVERS = 4
+
+# How the store prices are fetched: "http" reads the store JSON data directly with the asyncio
+# engine (see store_api.py and fetch_engine.py), "browser" scrapes the store pages with Chrome
+PRICE_BACKEND = "http"
+
+# Seconds to wait for the GOG price to be filled in, it stays empty for games not for sale yet
+GOG_PRICE_TIMEOUT = 3
+
 
 def start_chrome_driver():
     """Initialize and return a Chrome WebDriver instance."""
-    service = Service()
-    options = webdriver.ChromeOptions()
-
-    if not DEBUG:
-        options.add_argument("--headless=new")
-    
-    return webdriver.Chrome(service=service, options=options)
+    # the lean profile of chrome_profile.py, set chrome_profile.LEAN_PROFILE to False to debug a page
+    return chrome_profile.start_driver(headless=not DEBUG)
 
 def exit_chrome_driver(driver: webdriver.Chrome):
     """Close the Chrome WebDriver instance."""
     if driver:
-        driver.quit()
+        chrome_profile.quit_driver(driver)
+
+
+class ChromeDriverPool:
+    """
+    Bounded pool of Chrome WebDriver instances that can be shared between threads. Drivers are 
+    started lazily, up to `size` of them, and handed out one thread at a time.
+    """
+
+    def __init__(self, size: int = MAX_DRIVERS, driver_factory=None):
+        self.size = max(1, size)
+        self.driver_factory = driver_factory or start_chrome_driver
+        self._idle_drivers = queue.Queue()
+        self._drivers = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self) -> webdriver.Chrome:
+        """Return an idle driver, starting a new one if the pool is not full yet."""
+        try:
+            return self._idle_drivers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The Chrome driver pool is closed")
+            start_new_driver = len(self._drivers) < self.size
+            if start_new_driver:
+                # reserve the slot before starting Chrome, which is slow
+                self._drivers.append(None)
+
+        if not start_new_driver:
+            return self._idle_drivers.get()
+
+        try:
+            driver = self.driver_factory()
+        except Exception:
+            with self._lock:
+                self._drivers.remove(None)
+            raise
+
+        with self._lock:
+            self._drivers[self._drivers.index(None)] = driver
+        return driver
+
+    def release(self, driver: webdriver.Chrome):
+        """Give a driver back to the pool. Drivers of a closed pool were already quit."""
+        if not self._closed:
+            self._idle_drivers.put(driver)
+
+    @contextmanager
+    def driver(self):
+        """Context manager that borrows a driver from the pool."""
+        driver = self.acquire()
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def close(self):
+        """Quit every driver started by the pool."""
+        with self._lock:
+            self._closed = True
+            drivers = [driver for driver in self._drivers if driver is not None]
+            self._drivers = []
+
+        for driver in drivers:
+            try:
+                exit_chrome_driver(driver)
+            except Exception as e:
+                print(f"Error closing Chrome driver: {e}")
 
-# User data folder path
-DATA_DIR = Path.home() / ".current_prices_data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+    def __enter__(self):
+        return self
 
-# Get the actual directory of the Python executable or script
-json_path = DATA_DIR / "games_to_check.json"
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
-try:
-    with open(json_path, "r") as json_file:
-        GAMES_TO_CHECK = json.load(json_file)
-except FileNotFoundError:
-    print(f"Error: The file {json_path} does not exist. Set the games to check using the ui")
-    GAMES_TO_CHECK = {}
+# Read from the JSON file on first use, see get_games_to_check
+GAMES_TO_CHECK = None
 
 def update_games_to_check():
     """Update the games to check from the JSON file."""
     global GAMES_TO_CHECK
-    try:
-        with open(json_path, "r") as json_file:
-            GAMES_TO_CHECK = json.load(json_file)
-    except FileNotFoundError:
-        print(f"Error: The file {json_path} does not exist. Set the games to check using the ui")
-        GAMES_TO_CHECK = {}
+    GAMES_TO_CHECK = app_data.load_games_to_check(app_data.PC_GAMES_PATH)
+    return GAMES_TO_CHECK
 
+def get_games_to_check() -> dict:
+    """Return the games to check, reading the JSON file the first time."""
+    if GAMES_TO_CHECK is None:
+        return update_games_to_check()
     return GAMES_TO_CHECK
 
 
-def check_steam_comming_soon(store_driver: webdriver.Chrome) -> bool:
+# The prices of a store page are read with a single execute_script call each, instead of a
+# find_element, .text or get_attribute round trip to chromedriver per element. page_parsers.py has
+# the same extraction for the page source, used when page_parsers.PAGE_PARSER is "page_source"
+
+# Returns the prices of the first purchase area of a Steam page with a price, to skip DLCs and
+# bundles, and whether the game is marked as coming soon (it has no prices then)
+STEAM_PRICES_SCRIPT = """
+const getText = (element) => element ? element.innerText.trim() : "";
+const prices = {coming_soon: document.querySelector(".game_area_comingsoon") !== null,
+                found: false, current: "", base: ""};
+for (const area of document.querySelectorAll(".game_purchase_action_bg")) {
+    const finalPrice = area.querySelector(".discount_final_price");
+    const price = finalPrice || area.querySelector(".game_purchase_price");
+    if (!price) {
+        continue;
+    }
+    prices.found = true;
+    prices.current = getText(price);
+    // only discounted games have an original price
+    prices.base = finalPrice ? getText(area.querySelector(".discount_original_price") || finalPrice) : prices.current;
+    break;
+}
+return prices;
+"""
+
+# Returns the final and base prices of a GOG page, the base price is the final price when the game
+# is not discounted
+GOG_PRICES_SCRIPT = """
+const getText = (selector) => {
+    const element = document.querySelector(selector);
+    return element ? element.innerText.trim() : null;
+};
+const current = getText(".product-actions-price__final-amount");
+const base = getText(".product-actions-price__base-amount");
+return {found: current !== null, current: current || "", base: base === null ? (current || "") : base};
+"""
+
+# Returns the text and link of the Steam and GOG rows of an IsThereAnyDeal game page
+ITAD_ROWS_SCRIPT = """
+return Array.from(document.querySelectorAll(".row"))
+    .map((row) => ({text: row.innerText, link: row.href || row.getAttribute("href")}))
+    .filter((row) => row.text.startsWith("Steam\\n") || row.text.startsWith("GOG\\n"));
+"""
+
+
+def get_steam_page_prices(page_prices: dict, parse_span=None) -> tuple[Optional[str], Optional[str]]:
     """
-    Checks if the Steam store page indicates a "Coming Soon" status.
+    Return the (current, base) prices of the page prices of STEAM_PRICES_SCRIPT or
+    page_parsers.parse_steam_page, None when the page has no price (see build_game_data).
     """
-    try:
-        coming_soon_element = store_driver.find_element(By.CSS_SELECTOR, ".game_area_comingsoon")
-        if coming_soon_element:
-            return True
-    except:
-        return False
-    return False
+    import re
 
+    # this is here in case a game is marked as coming soon(does not have prices)
+    if page_prices["coming_soon"]:
+        fetch_timing.set_outcome(parse_span, "coming_soon")
+        return None, None
 
-def get_valid_purchase_action_bg(store_driver: webdriver.Chrome) -> Optional[webdriver.remote.webelement.WebElement]:
-    """
-    Returns the first valid purchase action background element that contains price information.
-    """
-    purchase_area_elements = store_driver.find_elements(By.CSS_SELECTOR, ".game_purchase_action_bg")
-    
-    for element in purchase_area_elements:
-        try:
-            # Check if the element contains price information
-            element.find_element(By.CSS_SELECTOR, ".discount_final_price")
-            return element
-        except:
-            try:
-                element.find_element(By.CSS_SELECTOR, ".game_purchase_price")
-                return element
-            except:
-                continue
-    return None
+    if not page_prices["found"]:
+        fetch_timing.set_outcome(parse_span, "no_price")
+        return None, None
 
+    current_price_value = re.findall(r'\d+,\d+', page_prices["current"])
+    base_price_value = re.findall(r'\d+,\d+', page_prices["base"])
 
-def get_steam_original_price(purchase_area_element: webdriver.remote.webelement.WebElement) -> webdriver.remote.webelement.WebElement:
+    return (
+        current_price_value[0] if current_price_value else "0,0",
+        base_price_value[0] if base_price_value else "0,0"
+    )
+
+
+def get_gog_page_prices(page_prices: dict, parse_span=None) -> tuple[Optional[str], Optional[str]]:
     """
-    Returns the original price from a Steam store page. In some cases it only has the final price 
-    element and it throws an error, this function handles that.
+    Return the (current, base) prices of the page prices of GOG_PRICES_SCRIPT or
+    page_parsers.parse_gog_page, None when the page has no price (see build_game_data).
     """
-    try:
-        base_price_element = purchase_area_element.find_element(By.CSS_SELECTOR, ".discount_original_price")
-    except:
-        base_price_element = purchase_area_element.find_element(By.CSS_SELECTOR, ".discount_final_price")
+    if not page_prices["found"]:
+        # the page loaded without a price, e.g. a game not for sale yet
+        fetch_timing.set_outcome(parse_span, "no_price")
+        return None, None
 
-    return base_price_element
+    current_price = page_prices["current"]
+    base_price = page_prices["base"]
 
+    # GOG uses . as decimal separator, convert to ,
+    current_price_value = current_price.replace('.', ',') if current_price else "0,0"
+    base_price_value = base_price.replace('.', ',') if base_price else "0,0"
 
-def get_steam_prices_direct(driver: webdriver.Chrome, steam_link: str) -> tuple[str, str]:
-    """Get Steam prices directly from Steam store page."""
-    import re
-    import time
-    try:
-        driver.get(steam_link)
-        
-        # Check if we hit an age verification page
-        if "agecheck" in driver.current_url:
-            try:
-                # Wait for age gate elements to load
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.CLASS_NAME, "main_content_ctn"))
-                )
-                
-                # Check if year input exists
-                try:
-                    year_select = driver.find_element(By.ID, "ageYear")
-                    # Year input exists, select 1990
-                    year_select.click()
-                    year_option = driver.find_element(By.CSS_SELECTOR, "option[value='1990']")
-                    year_option.click()
-                    time.sleep(0.5)  # Wait for button to update
-                    
-                    # Click the "View Page" button
-                    view_page_button = driver.find_element(By.ID, "view_product_page_btn")
-                    view_page_button.click()
-                except:
-                    # Year input not present, remove agecheck from URL and navigate
-                    current_url = driver.current_url
-                    # Remove agecheck part from URL
-                    clean_url = current_url.replace("/agecheck", "").split("?")[0]
-                    driver.get(clean_url)
-                
-                # Wait a bit for the page to load
-                time.sleep(2)
-            except Exception as e:
-                print(f"Error fetching Steam link: {steam_link}")
-                print(f"Age verification handling error: {str(e)}")
-                return "0,0", "0,0"
-        
-        # wait for the steam game page to load(.breadcrumbs element loaded)
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".breadcrumbs"))
-        )
+    if not current_price:
+        fetch_timing.set_outcome(parse_span, "no_price")
+        return None, base_price_value
+    return current_price_value, base_price_value
 
-        # this is here in case a game is marked as coming soon(does not have prices)
-        if check_steam_comming_soon(driver):
-            return "0,0", "0,0"
 
-        # we get the prices from the first purchase area of the page to avoid DLCs or bundles
-        purchase_area_element = get_valid_purchase_action_bg(driver)
-        if not purchase_area_element:
-            return "0,0", "0,0"
-        
+def get_steam_prices_direct(driver: webdriver.Chrome, steam_link: str, load_page: bool = True) -> tuple[str, str]:
+    """
+    Get Steam prices directly from Steam store page. Raises if the page can't be read. The prices
+    are a Future when the page is parsed by a parse worker (see page_parsers.read_page_prices).
+    """
+    with fetch_timing.tagged(store="Steam"), fetch_timing.span("fetch") as fetch_span:
         try:
-            current_price_element = purchase_area_element.find_element(By.CSS_SELECTOR, ".discount_final_price")
-            base_price_element = get_steam_original_price(purchase_area_element)
-        except:
-            current_price_element = purchase_area_element.find_element(By.CSS_SELECTOR, ".game_purchase_price")
-            base_price_element = current_price_element
-        
-        current_price = current_price_element.text
-        base_price = base_price_element.text
-        
-        current_price_value = re.findall(r'\d+,\d+', current_price)
-        base_price_value = re.findall(r'\d+,\d+', base_price)
-        
-        return (
-            current_price_value[0] if current_price_value else "0,0",
-            base_price_value[0] if base_price_value else "0,0"
-        )
-    except Exception as e:
-        print(f"Error fetching Steam prices: {e}")
-        return "0,0", "0,0"
-
+            # the page is already loaded in the driver when load_page is False, see browser_tabs.py
+            if load_page:
+                with fetch_timing.span("driver_get"):
+                    driver.get(steam_link)
+            
+            # Check if we hit an age verification page
+            if "agecheck" in driver.current_url:
+                try:
+                    with fetch_timing.span("age_gate"):
+                        # Wait for age gate elements to load
+                        WebDriverWait(driver, fetch_budget.get_timeout(10)).until(
+                            EC.presence_of_element_located((By.CLASS_NAME, "main_content_ctn"))
+                        )
+                        
+                        # Check if year input exists
+                        try:
+                            year_select = driver.find_element(By.ID, "ageYear")
+                            # Year input exists, select 1990
+                            year_select.click()
+                            year_option = driver.find_element(By.CSS_SELECTOR, "option[value='1990']")
+                            year_option.click()
+                            fetch_budget.sleep(0.5, "age_gate_button")  # Wait for button to update
+                            
+                            # Click the "View Page" button
+                            view_page_button = driver.find_element(By.ID, "view_product_page_btn")
+                            view_page_button.click()
+                        except:
+                            # Year input not present, remove agecheck from URL and navigate
+                            current_url = driver.current_url
+                            # Remove agecheck part from URL
+                            clean_url = current_url.replace("/agecheck", "").split("?")[0]
+                            driver.get(clean_url)
+                        
+                        # Wait a bit for the page to load
+                        fetch_budget.sleep(2, "age_gate_reload")
+                except Exception as e:
+                    print(f"Error fetching Steam link: {steam_link}")
+                    print(f"Age verification handling error: {str(e)}")
+                    fetch_timing.set_outcome(fetch_span, "age_gate_error")
+                    raise
+            
+            # wait for the steam game page to load(.breadcrumbs element loaded), the purchase areas are
+            # in the HTML so they are there too with the eager page load strategy
+            with fetch_timing.span("wait_page"):
+                WebDriverWait(driver, fetch_budget.get_timeout(10)).until(
+                    EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".breadcrumbs"))
+                )
 
-def get_gog_prices_direct(driver: webdriver.Chrome, gog_link: str) -> tuple[str, str]:
-    """Get GOG prices directly from GOG store page."""
-    import time
+            return page_parsers.read_page_prices(driver, STEAM_PRICES_SCRIPT, page_parsers.parse_steam_page,
+                                                 get_steam_page_prices)
+        except Exception as e:
+            print(f"Error fetching Steam prices: {e}")
+            raise
 
-    try:
-        driver.get(gog_link)
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, ".product-actions-price__final-amount"))
-        )
 
-        # check if the game is 18+. If so, click the button to confirm age
-        try:
-            age_confirm_button = driver.find_element(By.CSS_SELECTOR, ".age-gate__button")
-            whatever = WebDriverWait(driver, 5).until(
-                EC.presence_of_element_located((By.ID, 
-                "CybotCookiebotDialogBodyButtonDecline"))
-            )
-            whatever.click()
-            time.sleep(0.5)  # wait for the page to reload
-            age_confirm_button.click()
-            time.sleep(0.5)  # wait for the page to reload
-        except Exception as e:
-            print(f"Age verification handling error: {str(e)}")
-            pass
-        
+def get_gog_prices_direct(driver: webdriver.Chrome, gog_link: str, load_page: bool = True) -> tuple[str, str]:
+    """
+    Get GOG prices directly from GOG store page. Raises if the page can't be read. The prices are
+    a Future when the page is parsed by a parse worker (see page_parsers.read_page_prices).
+    """
+    with fetch_timing.tagged(store="GOG"), fetch_timing.span("fetch"):
         try:
-            current_price_element = driver.find_element(By.CSS_SELECTOR, ".product-actions-price__final-amount")
-            base_price_element = driver.find_element(By.CSS_SELECTOR, ".product-actions-price__base-amount")
-        except:
-            current_price_element = driver.find_element(By.CSS_SELECTOR, ".product-actions-price__final-amount")
-            base_price_element = current_price_element
-        
-        print(f"GOG Current Price: {current_price_element.text}")
-        print(f"GOG Base Price: {base_price_element.text}")
+            # the page is already loaded in the driver when load_page is False, see browser_tabs.py
+            if load_page:
+                with fetch_timing.span("driver_get"):
+                    driver.get(gog_link)
+            with fetch_timing.span("wait_page"):
+                WebDriverWait(driver, fetch_budget.get_timeout(10)).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, ".product-actions-price__final-amount"))
+                )
 
-        if not current_price_element.text:
-            time.sleep(3)
+            # check if the game is 18+. If so, click the button to confirm age
+            with fetch_timing.span("age_gate") as age_gate_span:
+                try:
+                    age_confirm_button = driver.find_element(By.CSS_SELECTOR, ".age-gate__button")
+                    # the persistent profile already has the cookie consent, so there is no dialog
+                    if not chrome_profile.PERSISTENT_PROFILE:
+                        whatever = WebDriverWait(driver, fetch_budget.get_timeout(5)).until(
+                            EC.presence_of_element_located((By.ID, 
+                            "CybotCookiebotDialogBodyButtonDecline"))
+                        )
+                        whatever.click()
+                        fetch_budget.sleep(0.5, "age_gate_cookies")  # wait for the page to reload
+                    age_confirm_button.click()
+                    fetch_budget.sleep(0.5, "age_gate_button")  # wait for the page to reload
+                except Exception as e:
+                    print(f"Age verification handling error: {str(e)}")
+                    fetch_timing.set_outcome(age_gate_span, "no_age_gate")
+                    pass
+
+            # the price element can show up before its price is filled in
+            with fetch_timing.span("wait_price") as wait_price_span:
+                try:
+                    WebDriverWait(driver, fetch_budget.get_timeout(GOG_PRICE_TIMEOUT),
+                                  ignored_exceptions=[NoSuchElementException, StaleElementReferenceException]).until(
+                        lambda driver: driver.find_element(
+                            By.CSS_SELECTOR, ".product-actions-price__final-amount").text.strip()
+                    )
+                except TimeoutException:
+                    fetch_timing.set_outcome(wait_price_span, "empty_price")
+
+            return page_parsers.read_page_prices(driver, GOG_PRICES_SCRIPT, page_parsers.parse_gog_page,
+                                                 get_gog_page_prices)
+        except Exception as e:
+            print(f"Error fetching GOG prices: {e}")
+            raise
 
-        current_price = current_price_element.text
-        base_price = base_price_element.text
-
-        # if not base_price:
-        #     base_price = current_price
-        
-        # GOG uses . as decimal separator, convert to ,
-        current_price_value = current_price.replace('.', ',') if current_price else "0,0"
-        base_price_value = base_price.replace('.', ',') if base_price else "0,0"
-        
-        return current_price_value, base_price_value
-    except Exception as e:
-        print(f"Error fetching GOG prices: {e}")
-        return "0,0", "0,0"
 
+def get_itad_prices(driver: webdriver.Chrome, game_site: str) -> dict:
+    """
+    Get the Steam and GOG prices and links from an IsThereAnyDeal game page, for the old format
+    entries of GAMES_TO_CHECK. Returns a dict with the keys of get_game_prices.
+    """
+    import re
 
-def get_game_prices(game_name: str, driver: webdriver.Chrome = None) -> dict:
-    """Check the prices of a game on Steam and GOG."""
-    # set up chrome driver
-    if not driver:
-        driver = start_chrome_driver()
-    
     prices_data_dict = {}
 
-    game_data = GAMES_TO_CHECK.get(game_name)
-    
-    # Check if game_data is a dict with direct store links
-    if isinstance(game_data, dict):
-        steam_link = game_data.get("steam_link")
-        gog_link = game_data.get("gog_link")
-        itad_link = game_data.get("isthereanydeal_link", "")
-        
-        prices_data_dict["is_there_any_deal_link"] = itad_link
-        
-        # Fetch from direct Steam link if available and valid
-        if steam_link and steam_link not in ["non_existent", "link_not_fetched"]:
-            steam_current, steam_base = get_steam_prices_direct(driver, steam_link)
-            prices_data_dict["Steam_current"] = steam_current
-            prices_data_dict["Steam_base"] = steam_base
-            prices_data_dict["Steam_link"] = steam_link
-        
-        # Fetch from direct GOG link if available and valid
-        if gog_link and gog_link not in ["non_existent", "link_not_fetched"]:
-            gog_current, gog_base = get_gog_prices_direct(driver, gog_link)
-            prices_data_dict["GOG_current"] = gog_current
-            prices_data_dict["GOG_base"] = gog_base
-            prices_data_dict["GOG_link"] = gog_link
-    else:
-        # Old format - use IsThereAnyDeal (string URL)
-        game_site = game_data if game_data else ""
-        
-        if not game_site:
-            return prices_data_dict
-        
-        # navigate to the target webpage
+    # navigate to the target webpage
+    with fetch_timing.span("driver_get", store="IsThereAnyDeal"):
         driver.get(game_site)
 
-        # wait for the product grid to load
-        WebDriverWait(driver, 60).until(
+    # wait for the product grid to load
+    with fetch_timing.span("wait_page", store="IsThereAnyDeal"):
+        WebDriverWait(driver, fetch_budget.get_timeout(60)).until(
             EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".cell"))
         )
 
-        elements = driver.find_elements(By.CSS_SELECTOR, ".row")
-
-        import re
-
-        for element in elements:
-            element_text = element.text
-
-            if not (element_text.startswith("Steam\n") or element_text.startswith("GOG\n")):
-                continue
+    with fetch_timing.span("parse", store="IsThereAnyDeal"):
+        for row in page_parsers.read_page(driver, ITAD_ROWS_SCRIPT, page_parsers.parse_itad_rows):
+            element_text = row["text"]
 
             prices = re.findall(r'\d+,\d+', element_text)
 
-            current_price = prices[1] if prices else "No price found"
-            base_price = prices[2] if prices else "No price found"
+            current_price = prices[1] if prices else None
+            base_price = prices[2] if prices else None
 
-            element_link = element.get_attribute("href")
-
-            prices_data_dict["is_there_any_deal_link"] = game_site
+            element_link = row["link"]
 
             if "Steam" in element_text:
                 prices_data_dict["Steam_current"] = current_price
@@ -313,6 +392,288 @@ def get_game_prices(game_name: str, driver: webdriver.Chrome = None) -> dict:
     return prices_data_dict
 
 
+class SteamAdapter(store_adapters.StoreAdapter):
+    store = "steam"
+    name = "Steam"
+    kind = "pc"
+    link_key = "steam_link"
+    http = True
+
+    # the age check page is read too, get_steam_prices_direct goes through it
+    ready_selector = ".breadcrumbs, #ageYear, #view_product_page_btn"
+
+    def get_canonical_id(self, link: str) -> Optional[str]:
+        return store_api.get_steam_appid(link)
+
+    def fetch(self, link: str, driver: webdriver.Chrome = None) -> tuple[str, str]:
+        if driver:
+            return get_steam_prices_direct(driver, link)
+        return store_api.get_steam_prices_http(link)
+
+    def read(self, link: str, driver: webdriver.Chrome) -> tuple[str, str]:
+        return get_steam_prices_direct(driver, link, load_page=False)
+
+    def fetch_batch(self, links: list, driver: webdriver.Chrome = None) -> dict:
+        if driver:
+            return super().fetch_batch(links, driver)
+        return store_api.get_steam_prices_batch(links)
+
+
+class GogAdapter(store_adapters.StoreAdapter):
+    store = "gog"
+    name = "GOG"
+    kind = "pc"
+    link_key = "gog_link"
+    http = True
+    ready_selector = ".product-actions-price__final-amount"
+
+    def fetch(self, link: str, driver: webdriver.Chrome = None) -> tuple[str, str]:
+        if driver:
+            return get_gog_prices_direct(driver, link)
+        return store_api.get_gog_prices_http(link)
+
+    def read(self, link: str, driver: webdriver.Chrome) -> tuple[str, str]:
+        return get_gog_prices_direct(driver, link, load_page=False)
+
+    def fetch_batch(self, links: list, driver: webdriver.Chrome = None) -> dict:
+        if driver:
+            return super().fetch_batch(links, driver)
+        return store_api.get_gog_prices_batch(links)
+
+
+store_adapters.register(SteamAdapter())
+store_adapters.register(GogAdapter())
+
+
+def fetch_store_prices(prices_data_dict: dict, store: str, fetch, *args) -> tuple[str, str]:
+    """
+    Call fetch(*args) for the prices of a store through its circuit breaker (see store_breaker.py),
+    within the store time budget. A failed or skipped store returns "0,0" prices and gets a
+    "<store>_error" in prices_data_dict. Prices still being parsed by a parse worker are left in
+    prices_data_dict as a "<store>_pending" Future, see finish_game_prices.
+    """
+    try:
+        with fetch_budget.deadline(fetch_budget.STORE_BUDGET):
+            prices = store_breaker.call(store, fetch, *args)
+    except Exception as e:
+        prices_data_dict[f"{store}_error"] = str(e)
+        return "0,0", "0,0"
+
+    if isinstance(prices, Future):
+        prices_data_dict[f"{store}_pending"] = prices
+        return "0,0", "0,0"
+    return prices
+
+
+def finish_game_prices(prices_data_dict: dict) -> dict:
+    """
+    Wait for the "<store>_pending" prices of a game to be parsed and fill in their store keys, or a
+    "<store>_error" when the parse failed. Returns prices_data_dict.
+    """
+    for key in [key for key in prices_data_dict if key.endswith("_pending")]:
+        store = key[:-len("_pending")]
+        try:
+            current_price, base_price = page_parsers.wait_prices(prices_data_dict.pop(key))
+        except Exception as e:
+            prices_data_dict[f"{store}_error"] = str(e)
+            continue
+        prices_data_dict[f"{store}_current"] = current_price
+        prices_data_dict[f"{store}_base"] = base_price
+    return prices_data_dict
+
+
+def fetch_stores_in_tabs(prices_data_dict: dict, stores: list, driver: webdriver.Chrome) -> dict:
+    """
+    Load the pages of the (adapter, link) stores of a game side by side in tabs of driver (see
+    browser_tabs.py), reading each one with fetch_store_prices. Returns {store name: (current, base)}
+    for the stores read in tabs, the adapters without a ready selector are left out.
+    """
+    tab_stores = [(adapter, link) for adapter, link in stores if adapter.ready_selector]
+    jobs = [browser_tabs.TabJob(link, adapter.ready_selector,
+                                lambda driver, adapter=adapter, link=link: fetch_store_prices(
+                                    prices_data_dict, adapter.name, adapter.read, link, driver),
+                                tags={"store": adapter.name})
+            for adapter, link in tab_stores]
+
+    results = browser_tabs.fetch_in_tabs(driver, jobs)
+    return {adapter.name: result for (adapter, _), result in zip(tab_stores, results)}
+
+
+def get_store_prices_batch(game_names: list, store: str) -> dict:
+    """
+    Check the prices of many games on one store ("Steam" or "GOG") with batched HTTP requests.
+    Returns a dict of {game_name: prices_data_dict} with the same store keys filled by
+    get_game_prices, including "<store>_error" for the games whose prices failed.
+    """
+    adapter = store_adapters.get_adapter(store.lower())
+
+    store_links = {}
+    for game_name in game_names:
+        game_data = get_games_to_check().get(game_name)
+        if isinstance(game_data, dict) and store_api.is_valid_store_link(game_data.get(adapter.link_key)):
+            store_links[game_name] = game_data[adapter.link_key]
+
+    store_prices = adapter.fetch_batch(list(store_links.values())) if store_links else {}
+
+    games_prices = {}
+    for game_name, store_link in store_links.items():
+        link_prices = store_prices.get(store_link, ("0,0", "0,0"))
+        error = link_prices if isinstance(link_prices, Exception) else None
+        current_price, base_price = ("0,0", "0,0") if error else link_prices
+        games_prices[game_name] = {
+            f"{store}_current": current_price,
+            f"{store}_base": base_price,
+            f"{store}_link": store_link
+        }
+        if error:
+            games_prices[game_name][f"{store}_error"] = str(error)
+
+    return games_prices
+
+
+def get_steam_prices_batch(game_names: list) -> dict:
+    """Check the Steam prices of many games with batched HTTP requests."""
+    return get_store_prices_batch(game_names, "Steam")
+
+
+def get_gog_prices_batch(game_names: list) -> dict:
+    """Check the GOG prices of many games with batched HTTP requests."""
+    return get_store_prices_batch(game_names, "GOG")
+
+
+def get_prices_batch(game_names: list) -> dict:
+    """Check the Steam and GOG prices of many games with batched HTTP requests."""
+    games_prices = get_steam_prices_batch(game_names)
+    for game_name, gog_prices in get_gog_prices_batch(game_names).items():
+        games_prices.setdefault(game_name, {}).update(gog_prices)
+    return games_prices
+
+
+def build_game_data(prices_data_dict: dict) -> dict:
+    """
+    Convert the dict returned by get_game_prices to the game data shown in the UI. Stores that
+    failed or were skipped get an "error" key, like the console stores, and stores whose page had
+    no price (a None current price) get "no_price", so a 0.0 price is only a free game.
+    """
+    game_data = {
+        "steam": {
+            "current": store_adapters.convert_to_float(prices_data_dict.get("Steam_current", "0,0")),
+            "base": store_adapters.convert_to_float(prices_data_dict.get("Steam_base", "0,0")),
+            "link": prices_data_dict.get("Steam_link")
+        },
+        "gog": {
+            "current": store_adapters.convert_to_float(prices_data_dict.get("GOG_current", "0,0")),
+            "base": store_adapters.convert_to_float(prices_data_dict.get("GOG_base", "0,0")),
+            "link": prices_data_dict.get("GOG_link")
+        },
+        "is_there_any_deal_link": prices_data_dict.get("is_there_any_deal_link")
+    }
+
+    for store in ["Steam", "GOG"]:
+        error = prices_data_dict.get(f"{store}_error")
+        # "error" is set when the IsThereAnyDeal page of an old format entry failed
+        if not error and f"{store}_current" not in prices_data_dict:
+            error = prices_data_dict.get("error")
+        if error:
+            game_data[store.lower()]["error"] = error
+        elif f"{store}_current" in prices_data_dict and prices_data_dict[f"{store}_current"] is None:
+            game_data[store.lower()]["no_price"] = True
+
+    return game_data
+
+
+def needs_browser(game_name: str, backend: str = None, game_data=None) -> bool:
+    """
+    Check if fetching the prices of a game needs a Chrome driver with the given backend. `game_data`
+    overrides the entry of the game in GAMES_TO_CHECK.
+    """
+    backend = backend or PRICE_BACKEND
+    if game_data is None:
+        game_data = get_games_to_check().get(game_name)
+
+    if not isinstance(game_data, dict):
+        # old format entries are scraped from the IsThereAnyDeal page, unless the API can be used
+        return bool(game_data) and not (backend == "http" and itad_api.is_available())
+    return backend != "http"
+
+
+def get_game_prices(game_name: str, driver: webdriver.Chrome = None, backend: str = None,
+                    prefetched_prices: dict = None, game_data=None, wait_parse: bool = True) -> dict:
+    """
+    Check the prices of a game on Steam and GOG. Stores already present in `prefetched_prices`
+    (e.g. from get_prices_batch) are not fetched again. `game_data` overrides the entry of the
+    game in GAMES_TO_CHECK, e.g. to fetch only some of its stores. With wait_parse False, the
+    store pages still being parsed are left pending for finish_game_prices, so the driver can be
+    used for the next game first. Raises BudgetExceeded without fetching anything if the run
+    deadline has passed (see fetch_budget.py).
+    """
+    fetch_budget.check()
+    with fetch_budget.deadline(fetch_budget.GAME_BUDGET), \
+            fetch_timing.tagged(game=game_name), fetch_timing.span("game"):
+        backend = backend or PRICE_BACKEND
+
+        # set up chrome driver, the http backend only needs it for the old IsThereAnyDeal format
+        if not driver and needs_browser(game_name, backend, game_data):
+            driver = start_chrome_driver()
+    
+        prices_data_dict = dict(prefetched_prices or {})
+
+        if game_data is None:
+            game_data = get_games_to_check().get(game_name)
+    
+        # Check if game_data is a dict with direct store links
+        if isinstance(game_data, dict):
+            prices_data_dict["is_there_any_deal_link"] = game_data.get("isthereanydeal_link", "")
+
+            # Fetch from the direct link of each store if available and valid
+            stores = [(adapter, game_data.get(adapter.link_key)) for adapter in store_adapters.get_adapters("pc")]
+            stores = [(adapter, store_link) for adapter, store_link in stores
+                      if store_api.is_valid_store_link(store_link) and f"{adapter.name}_current" not in prices_data_dict]
+
+            # the store pages load side by side in tabs of the driver when browser_tabs is on
+            tab_prices = {}
+            if backend != "http" and driver and browser_tabs.is_enabled():
+                tab_prices = fetch_stores_in_tabs(prices_data_dict, stores, driver)
+
+            for adapter, store_link in stores:
+                if adapter.name in tab_prices:
+                    current_price, base_price = tab_prices[adapter.name]
+                elif backend == "http":
+                    with fetch_timing.tagged(store=adapter.name), fetch_timing.span("fetch"):
+                        current_price, base_price = fetch_store_prices(prices_data_dict, adapter.name,
+                                                                       adapter.fetch, store_link)
+                else:
+                    current_price, base_price = fetch_store_prices(prices_data_dict, adapter.name,
+                                                                   adapter.fetch, store_link, driver)
+                prices_data_dict[f"{adapter.name}_current"] = current_price
+                prices_data_dict[f"{adapter.name}_base"] = base_price
+                prices_data_dict[f"{adapter.name}_link"] = store_link
+
+            if wait_parse:
+                finish_game_prices(prices_data_dict)
+        else:
+            # Old format - use IsThereAnyDeal (string URL)
+            game_site = game_data if game_data else ""
+        
+            if not game_site:
+                return prices_data_dict
+
+            prices_data_dict["is_there_any_deal_link"] = game_site
+            try:
+                with fetch_budget.deadline(fetch_budget.STORE_BUDGET):
+                    if backend == "http" and itad_api.is_available():
+                        with fetch_timing.tagged(store="IsThereAnyDeal"), fetch_timing.span("fetch"):
+                            itad_prices = store_breaker.call("IsThereAnyDeal", itad_api.get_itad_prices_http, game_site)
+                    else:
+                        itad_prices = store_breaker.call("IsThereAnyDeal", get_itad_prices, driver, game_site)
+                    prices_data_dict.update(itad_prices)
+            except Exception as e:
+                print(f"Error fetching IsThereAnyDeal prices: {e}")
+                prices_data_dict["error"] = str(e)
+
+        return prices_data_dict
+
+
 if __name__ == "__main__":
     driver = start_chrome_driver()
 
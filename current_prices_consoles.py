@@ -1,43 +1,36 @@
 # import necessary tools from the selenium library
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
 # from selenium.webdriver.
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
-import json
-from pathlib import Path
-
 import re
+from abc import abstractmethod
+from concurrent.futures import Future
+
+import app_data
+import browser_tabs
+import chrome_profile
+import fetch_budget
+import fetch_timing
+import network_capture
+import page_parsers
+import store_adapters
+import store_breaker
 
 # ...
 
 def start_chrome_driver():
-    """Initialize and return a Chrome WebDriver instance."""
-    service = Service()
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless=new")
-    return webdriver.Chrome(service=service, options=options)
+    """Initialize and return a Chrome WebDriver instance, with the profiles of chrome_profile.py."""
+    return chrome_profile.start_driver(headless=True)
 
 def exit_chrome_driver(driver):
     """Close the Chrome WebDriver instance."""
     if driver:
-        driver.quit()
-
-# User data folder path
-DATA_DIR = Path.home() / ".current_prices_data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+        chrome_profile.quit_driver(driver)
 
-# Get the actual directory of the Python executable or script
-json_path = DATA_DIR / "console_games_to_check.json"
-
-try:
-    with open(json_path, "r") as json_file:
-        GAMES_TO_CHECK = json.load(json_file)
-except FileNotFoundError:
-    print(f"Error: The file {json_path} does not exist. Set the games to check using the ui")
-    GAMES_TO_CHECK = {}
+# Read from the JSON file on first use, see get_games_to_check
+GAMES_TO_CHECK = None
 
 # DEBUG
 # GAMES_TO_CHECK = {
@@ -64,109 +57,313 @@ except FileNotFoundError:
 def update_games_to_check():
     """Update the games to check JSON file with a new dictionary."""
     global GAMES_TO_CHECK
-    
-    try:
-        with open(json_path, "r") as json_file:
-            GAMES_TO_CHECK = json.load(json_file)
-    except FileNotFoundError:
-        print(f"Error: The file {json_path} does not exist. Set the games to check using the ui")
-        GAMES_TO_CHECK = {}
+    GAMES_TO_CHECK = app_data.load_games_to_check(app_data.CONSOLE_GAMES_PATH)
+    return GAMES_TO_CHECK
+
 
+def get_games_to_check() -> dict:
+    """Return the games to check, reading the JSON file the first time."""
+    if GAMES_TO_CHECK is None:
+        return update_games_to_check()
     return GAMES_TO_CHECK
 
 
-def get_psn_prices(game_name, driver=None):
+# The prices of a store page are read with a single execute_script call each, instead of a
+# find_element or .text round trip to chromedriver per element. page_parsers.py has the same
+# extraction for the page source, used when page_parsers.PAGE_PARSER is "page_source"
+
+# Returns the texts of the price elements of the PSN price card, null if there is no price card
+PSN_PRICES_SCRIPT = """
+const card = document.querySelector(".psw-c-bg-card-1");
+if (!card) {
+    return null;
+}
+const getTexts = (selector) => Array.from(card.querySelectorAll(selector), (element) => element.innerText);
+return {new_prices: getTexts("span.psw-t-title-m"), base_prices: getTexts("span.psw-t-title-s")};
+"""
+
+# Returns the texts of the new and base price elements of a page, inside the price card when a
+# price card selector is given. The base price is the new price when the game is not discounted,
+# and the result is null when there is no new price element
+SITE_PRICES_SCRIPT = """
+const [newPriceSelector, basePriceSelector, priceCardSelector] = arguments;
+const parent = priceCardSelector ? document.querySelector(priceCardSelector) : document;
+const newPrice = parent && parent.querySelector(newPriceSelector);
+if (!newPrice) {
+    return null;
+}
+const basePrice = parent.querySelector(basePriceSelector) || newPrice;
+return {new_price: newPrice.innerText, base_price: basePrice.innerText};
+"""
+
+
+def get_first_price(matches):
     """
-    Fetches the current and base price of the game that matches the name in the GAMES_TO_CHECK dict
+    Return the first price matched in a price text, "" when it has none (e.g. a free game), None
+    when the page had no price.
     """
-    # set up chrome driver
-    if not driver:
-        driver = start_chrome_driver()
+    if matches is None:
+        return None
+    return matches[0] if matches else ""
 
-    game_site = GAMES_TO_CHECK.get(game_name)["psn_site"]
 
-    # navigate to the website
-    driver.get(game_site)
+def get_psn_page_prices(page_prices, parse_span=None):
+    """
+    Return the (base, new) price matches of the page prices of PSN_PRICES_SCRIPT or
+    page_parsers.parse_psn_page, None when the page loaded without a price.
+    """
+    if not page_prices or not page_prices["new_prices"]:
+        fetch_timing.set_outcome(parse_span, "no_price")
+        return None, None
 
-    # wait for the product grid to load
-    WebDriverWait(driver, 20).until(
-        EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.psw-fill-x"))
-    )
-
-    price_card_element = driver.find_element(By.CSS_SELECTOR, ".psw-c-bg-card-1")
-    new_price_elements = price_card_element.find_elements(By.CSS_SELECTOR, "span.psw-t-title-m")
-    
-    for element in new_price_elements:
-        new_price_element = element
-        if re.findall(r'\d+,\d+', element.text):
+    # the first new price element with a price, or the last one
+    for new_price_text in page_prices["new_prices"]:
+        if re.findall(r'\d+,\d+', new_price_text):
             break
 
-    base_price_elements = price_card_element.find_elements(By.CSS_SELECTOR, "span.psw-t-title-s")
-
-    base_price_element = base_price_elements[0] if base_price_elements else new_price_element
+    base_prices = page_prices["base_prices"]
+    base_price_text = base_prices[0] if base_prices else new_price_text
 
-    new_price = re.findall(r'\d+,\d+', new_price_element.text)
-    base_price = re.findall(r'\d+,\d+', base_price_element.text)
+    new_price = re.findall(r'\d+,\d+', new_price_text)
+    base_price = re.findall(r'\d+,\d+', base_price_text)
 
     return base_price, new_price
 
 
-def get_xbox_prices(game_name, driver=None):
+def get_psn_prices(game_name, driver=None, game_site=None, load_page=True):
+    """
+    Fetches the current and base price of the game that matches the name in the GAMES_TO_CHECK dict,
+    or of the game_site page when it's given. With load_page False the page is read as it's
+    loaded in the driver. The prices are a Future when the page is parsed by a parse worker
+    (see page_parsers.read_page_prices).
+    """
+    # set up chrome driver
+    if not driver:
+        driver = start_chrome_driver()
+
+    game_site = game_site or get_games_to_check().get(game_name)["psn_site"]
+
+    # navigate to the website, unless it's already loaded in the driver (see browser_tabs.py)
+    if load_page:
+        with fetch_timing.span("driver_get"):
+            driver.get(game_site)
+
+    # wait for the price card prices, the page is not fully loaded with the lean profile
+    with fetch_timing.span("wait_page"):
+        WebDriverWait(driver, fetch_budget.get_timeout(20)).until(
+            EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".psw-c-bg-card-1 span.psw-t-title-m"))
+        )
+
+    return page_parsers.read_page_prices(driver, PSN_PRICES_SCRIPT, page_parsers.parse_psn_page, get_psn_page_prices)
+
+
+def get_xbox_prices(game_name, driver=None, game_site=None, load_page=True):
     """
     Fetches the current and base price of the game that matches the name in the GAMES_TO_CHECK dict
     """
-    new_price, base_price = get_site_price(game_name, driver, site_key="xbox_site",
-                                           waiter_selector=".CommonButtonStyles-module__variableLineDesktopButton___cxDyV",
-                                           new_price_selector=".Price-module__boldText___1i2Li",
-                                           base_price_selector=".Price-module__brandOriginalPrice___ayJAn")
-    
-    return base_price[0], new_price[0]
+    prices = get_site_price(game_name, driver, site_key="xbox_site", game_site=game_site, load_page=load_page,
+                            waiter_selector=".Price-module__boldText___1i2Li",
+                            new_price_selector=".Price-module__boldText___1i2Li",
+                            base_price_selector=".Price-module__brandOriginalPrice___ayJAn")
+
+    # (new, base) matches to (base, new) prices
+    return page_parsers.map_prices(prices, lambda prices: (get_first_price(prices[1]), get_first_price(prices[0])))
 
 
-def get_nintendo_prices(game_name, driver=None):
+def get_nintendo_prices(game_name, driver=None, game_site=None, load_page=True):
     """
     Fetches the current and base price of the game that matches the name in the GAMES_TO_CHECK dict
     """
-    base_price, new_price = get_site_price(game_name, driver, site_key="nintendo_site", waiter_selector=".W990N", 
-                                           new_price_selector=".W990N",base_price_selector=".o2BsP")
-    
-    return base_price[0], new_price[0]
+    prices = get_site_price(game_name, driver, site_key="nintendo_site", game_site=game_site, load_page=load_page,
+                            waiter_selector=".W990N", new_price_selector=".W990N", base_price_selector=".o2BsP")
+
+    # the regular price is in the new price element of the Nintendo page
+    return page_parsers.map_prices(prices, lambda prices: (get_first_price(prices[0]), get_first_price(prices[1])))
 
 
 def get_site_price(game_name, driver=None, site_key="psn_site", waiter_selector='', new_price_selector='', 
-                   base_price_selector='', price_card_selector=''):
+                   base_price_selector='', price_card_selector='', game_site=None, load_page=True):
     """
-    Fetches the current and base price of the game that matches the name in the GAMES_TO_CHECK dict
+    Fetches the (new, base) price matches of the game that matches the name in the GAMES_TO_CHECK
+    dict, or of the game_site page when it's given, or a Future of them when the page is parsed by
+    a parse worker. The matches are None when the page has no price.
     """
     # set up chrome driver
     if not driver:
         driver = start_chrome_driver()
 
-    game_site = GAMES_TO_CHECK.get(game_name)[site_key]
+    game_site = game_site or get_games_to_check().get(game_name)[site_key]
 
-    # navigate to the website
-    driver.get(game_site)
+    # navigate to the website, unless it's already loaded in the driver (see browser_tabs.py)
+    if load_page:
+        with fetch_timing.span("driver_get"):
+            driver.get(game_site)
 
     # wait for the product grid to load
-    WebDriverWait(driver, 20).until(
-        EC.presence_of_all_elements_located((By.CSS_SELECTOR, waiter_selector))
-    )
+    with fetch_timing.span("wait_page"):
+        WebDriverWait(driver, fetch_budget.get_timeout(20)).until(
+            EC.presence_of_all_elements_located((By.CSS_SELECTOR, waiter_selector))
+        )
+
+    def get_page_prices(page_prices, parse_span=None):
+        # the page loaded without a price element
+        if not page_prices:
+            fetch_timing.set_outcome(parse_span, "no_price")
+            return None, None
+
+        new_price = re.findall(r'\d+,\d+', page_prices["new_price"])
+        base_price = re.findall(r'\d+,\d+', page_prices["base_price"])
+        return new_price, base_price
+
+    return page_parsers.read_page_prices(driver, SITE_PRICES_SCRIPT, page_parsers.parse_site_page, get_page_prices,
+                                         new_price_selector, base_price_selector, price_card_selector)
+
+
+class ConsoleAdapter(store_adapters.StoreAdapter):
+    """
+    Base of the console store adapters. With network_capture on, the prices are taken from the
+    store API responses of the page, and the page elements are only read when none shows up.
+    """
+    kind = "console"
+
+    def fetch(self, link, driver=None, load_page=True):
+        if driver and load_page and network_capture.is_enabled():
+            prices = network_capture.capture_prices(driver, self.store, link, self.get_canonical_id(link))
+            if prices:
+                return prices
+            # the page is loading already, read it from its elements
+            load_page = False
+        return self.fetch_page(link, driver, load_page)
+
+    @abstractmethod
+    def fetch_page(self, link, driver=None, load_page=True):
+        """Read the (current, base) prices from the elements of the store page."""
+
+    def read(self, link, driver):
+        return self.fetch_page(link, driver, load_page=False)
+
+
+class PsnAdapter(ConsoleAdapter):
+    store = "psn"
+    name = "psn"
+    link_key = "psn_site"
+    ready_selector = ".psw-c-bg-card-1 span.psw-t-title-m"
+
+    def fetch_page(self, link, driver=None, load_page=True):
+        prices = get_psn_prices(None, driver, game_site=link, load_page=load_page)
+        return page_parsers.map_prices(prices, lambda prices: (get_first_price(prices[1]), get_first_price(prices[0])))
 
-    parent_element = driver
 
-    if price_card_selector:
-        price_card_element = driver.find_element(By.CSS_SELECTOR, price_card_selector)
-        parent_element = price_card_element
+class XboxAdapter(ConsoleAdapter):
+    store = "xbox"
+    name = "xbox"
+    link_key = "xbox_site"
+    ready_selector = ".Price-module__boldText___1i2Li"
 
-    new_price_element = parent_element.find_element(By.CSS_SELECTOR, new_price_selector)
-    base_price_elements = parent_element.find_elements(By.CSS_SELECTOR, base_price_selector)
+    def get_canonical_id(self, link):
+        # the product id is the last part of the link, e.g. .../star-wars-jedi-survivor/9pgc82v0dxfs
+        product_id = super().get_canonical_id(link)
+        return product_id.upper() if product_id else None
 
-    base_price_element = base_price_elements[0] if base_price_elements else new_price_element
+    def fetch_page(self, link, driver=None, load_page=True):
+        prices = get_xbox_prices(None, driver, game_site=link, load_page=load_page)
+        return page_parsers.map_prices(prices, lambda prices: (prices[1], prices[0]))
 
-    new_price = re.findall(r'\d+,\d+', new_price_element.text)
-    base_price = re.findall(r'\d+,\d+', base_price_element.text)
 
-    return new_price, base_price
+class NintendoAdapter(ConsoleAdapter):
+    store = "nintendo"
+    name = "nintendo"
+    link_key = "nintendo_site"
+    ready_selector = ".W990N"
+
+    def fetch_page(self, link, driver=None, load_page=True):
+        prices = get_nintendo_prices(None, driver, game_site=link, load_page=load_page)
+        return page_parsers.map_prices(prices, lambda prices: (prices[1], prices[0]))
+
+
+store_adapters.register(PsnAdapter())
+store_adapters.register(XboxAdapter())
+store_adapters.register(NintendoAdapter())
+
+
+def get_game_prices(game_name, driver=None, sites=None, wait_parse=True):
+    """
+    Fetches the PSN, Xbox and Nintendo prices of a game. Returns a dict with a
+    {"current", "base", "link"} entry per store that has a site, plus an "error" key when the
+    store fetch failed or was skipped by the store circuit breaker (see store_breaker.py).
+    `sites` overrides the entry of the game in GAMES_TO_CHECK. With wait_parse False, the store
+    pages still being parsed are left pending for finish_game_prices, so the driver can be used for
+    the next game first. Raises BudgetExceeded without fetching anything if the run deadline has
+    passed (see fetch_budget.py).
+    """
+    fetch_budget.check()
+    if sites is None:
+        sites = get_games_to_check().get(game_name, {})
+
+    stores = [(adapter, sites.get(adapter.link_key)) for adapter in store_adapters.get_adapters("console")]
+    stores = [(adapter, link) for adapter, link in stores if link]
+
+    # the store pages load side by side in tabs of the driver when browser_tabs is on
+    price_data = {}
+    if driver and browser_tabs.is_enabled():
+        tab_stores = [(adapter, link) for adapter, link in stores if adapter.ready_selector]
+        jobs = [browser_tabs.TabJob(link, adapter.ready_selector,
+                                    lambda driver, adapter=adapter, link=link: get_store_price_data(
+                                        game_name, adapter, adapter.read, link, driver),
+                                    tags={"game": game_name, "store": adapter.store})
+                for adapter, link in tab_stores]
+        for (adapter, _), store_data in zip(tab_stores, browser_tabs.fetch_in_tabs(driver, jobs)):
+            price_data[adapter.store] = store_data
+
+    for adapter, link in stores:
+        if adapter.store not in price_data:
+            price_data[adapter.store] = get_store_price_data(game_name, adapter, adapter.fetch, link, driver)
+
+    if wait_parse:
+        finish_game_prices(price_data)
+    return price_data
+
+
+def finish_game_prices(price_data):
+    """
+    Wait for the "pending" prices of the stores of a game to be parsed (see get_store_price_data),
+    setting an "error" on the stores whose parse failed. Returns price_data.
+    """
+    for store_data in price_data.values():
+        pending = store_data.pop("pending", None)
+        if pending is None:
+            continue
+        try:
+            store_data.update(pending.result())
+        except Exception as e:
+            store_data["error"] = str(e)
+    return price_data
+
+
+def get_store_price_data(game_name, adapter, fetch, link, driver=None):
+    """
+    Call fetch(link, driver) for the prices of a store through its circuit breaker, within the
+    store time budget. Returns the {"current", "base", "link"} entry of the store, with an "error"
+    key when the fetch failed and "no_price" when the page had no price. Prices still being parsed
+    by a parse worker are left as a "pending" Future of the entry, see finish_game_prices.
+    """
+    def get_prices_data(prices):
+        current, base = adapter.parse(prices)
+        if prices[0] is None:
+            return {"current": current, "base": base, "no_price": True}
+        return {"current": current, "base": base}
+
+    try:
+        with fetch_budget.deadline(fetch_budget.STORE_BUDGET), \
+                fetch_timing.tagged(game=game_name, store=adapter.store), fetch_timing.span("fetch"):
+            prices = store_breaker.call(adapter.name, fetch, link, driver)
+            if isinstance(prices, Future):
+                return {"current": 0.0, "base": 0.0, "link": link,
+                        "pending": page_parsers.map_prices(prices, get_prices_data)}
+            prices_data = get_prices_data(prices)
+        return dict(prices_data, link=link)
+    except Exception as e:
+        return {"current": 0.0, "base": 0.0, "link": link, "error": str(e)}
 
 
 if __name__ == "__main__":
@@ -1,14 +1,25 @@
 import os
-from pathlib import Path
 import platform
 import subprocess
+import time
 from PyQt5 import QtWidgets, QtGui, QtCore
 
+import app_data
 import current_prices
+import fetch_budget
+import price_cache
+import price_client
+import price_history
+import price_metrics
+import refresh_scheduler
+from server_price_worker import ServerPriceWorker
 
 THIS_FOLDER = os.path.dirname(os.path.abspath(__file__))
 ICON_PATH = os.path.join(THIS_FOLDER, "icons", "window_icon.png")
 
+# Key of each store link in games_to_check.json, by store key of the UI game data
+STORE_LINK_KEYS = {"steam": "steam_link", "gog": "gog_link"}
+
 
 class PriceWorker(QtCore.QThread):
     """Worker thread for fetching game prices without blocking the UI."""
@@ -19,9 +30,14 @@ class PriceWorker(QtCore.QThread):
     finished_all = QtCore.pyqtSignal()  # all prices fetched
     error_occurred = QtCore.pyqtSignal(str)  # error message
 
-    def __init__(self):
+    def __init__(self, max_drivers: int = current_prices.MAX_DRIVERS, backend: str = None,
+                 time_budget: float = None):
         super().__init__()
         self.games_to_check = {}
+        self.max_drivers = max_drivers
+        self.backend = backend or current_prices.PRICE_BACKEND
+        # seconds the whole run can take, the games not started by then keep their cached prices
+        self.time_budget = time_budget
         
     def set_games(self, games_dict: dict):
         """Set the games dictionary to check."""
@@ -29,57 +45,62 @@ class PriceWorker(QtCore.QThread):
         
     def run(self):
         """Main worker thread function."""
+        with fetch_budget.deadline(self.time_budget):
+            self.fetch_all_prices()
+
+    def fetch_all_prices(self):
+        """Fetch the prices of every game, in order, until the time budget runs out."""
+        self.price_history = self.open_price_history()
         try:
-            self.progress_updated.emit("Starting Chrome driver...")
-            driver = current_prices.start_chrome_driver()
-            
-            total_games = len(self.games_to_check)
-            
-            for i, (game_name, game_url) in enumerate(self.games_to_check.items(), 1):
-                self.progress_updated.emit(f"Fetching prices for {game_name} ({i}/{total_games})...")
-                
-                try:
-                    current_prices_dict = current_prices.get_game_prices(game_name, driver)
-                    if game_name == "Evil West":
-                        import pprint
-                        print(pprint.pprint(current_prices_dict))
-                    
-                    game_data = {
-                        "steam": {
-                            "current": self.convert_to_float(current_prices_dict.get("Steam_current", "0,0")),
-                            "base": self.convert_to_float(current_prices_dict.get("Steam_base", "0,0")),
-                            "link": current_prices_dict.get("Steam_link")
-                        },
-                        "gog": {
-                            "current": self.convert_to_float(current_prices_dict.get("GOG_current", "0,0")),
-                            "base": self.convert_to_float(current_prices_dict.get("GOG_base", "0,0")),
-                            "link": current_prices_dict.get("GOG_link")
-                        },
-                        "is_there_any_deal_link": current_prices_dict.get("is_there_any_deal_link")
-                    }
-                    
-                    self.price_updated.emit(game_name, game_data)
-                    
-                except Exception as e:
-                    self.error_occurred.emit(f"Error fetching prices for {game_name}: {str(e)}")
-                    
-            self.progress_updated.emit("Closing Chrome driver...")
-            current_prices.exit_chrome_driver(driver)
-            
+            run_start = time.perf_counter()
+            self.total_games = len(self.games_to_check)
+            self.fetched_games = 0
+            self.skipped_games = 0
+
+            # the games with store links go through the asyncio engine, the others share a pool of drivers
+            scheduler = refresh_scheduler.RefreshScheduler(max_drivers=self.max_drivers)
+            scheduler.add_pc_games(self.games_to_check, self.backend)
+            if scheduler.jobs:
+                self.progress_updated.emit(f"Starting {scheduler.get_driver_count()} Chrome driver(s)...")
+            else:
+                self.progress_updated.emit("Fetching Steam and GOG prices...")
+            scheduler.run(self.on_game_data, self.on_game_error, self.on_game_skipped)
+
+            price_metrics.RUN_DURATION.observe(time.perf_counter() - run_start, kind="pc", worker="ui")
+            if self.skipped_games:
+                self.progress_updated.emit(f"Out of time, {self.skipped_games} game(s) keep their cached prices")
             self.progress_updated.emit("All prices updated!")
             self.finished_all.emit()
             
         except Exception as e:
             self.error_occurred.emit(f"Critical error: {str(e)}")
-    
-    def convert_to_float(self, price_str: str) -> float:
-        """Convert price string to float."""
-        try:
-            float_value = float(price_str.replace(',', '.')) if price_str else 0.0
-        except ValueError:
-            float_value = 0.0
+        finally:
+            # the quotes fetched before an error are written too
+            if self.price_history:
+                self.price_history.close()
+
+    def on_game_data(self, kind: str, game_name: str, game_data: dict):
+        """Emit the prices of a game as soon as they are fetched."""
+        self.fetched_games += 1
+        self.progress_updated.emit(f"Fetched prices for {game_name} ({self.fetched_games}/{self.total_games})...")
+
+        if self.price_history:
+            self.price_history.record_game_data(game_name, game_data)
+        self.price_updated.emit(game_name, game_data)
+
+    def on_game_error(self, kind: str, game_name: str, error: str):
+        self.error_occurred.emit(f"Error fetching prices for {game_name}: {error}")
 
-        return float_value
+    def on_game_skipped(self, kind: str, game_name: str):
+        self.skipped_games += 1
+
+    def open_price_history(self):
+        """Open the price history database, the run goes on without it if it fails."""
+        try:
+            return price_history.PriceHistory()
+        except Exception as e:
+            print(f"Error opening the price history: {e}")
+            return None
 
 class CurrentPricesUI(QtWidgets.QWidget):
     def __init__(self):
@@ -88,8 +109,14 @@ class CurrentPricesUI(QtWidgets.QWidget):
         self.showing_only_discounted = False
         self.games_data = {}  # Store game data: {game_name: {steam_data, gog_data, links}}
         self.games_order = []  # Store original order of game names
+        self.stale_games = set()  # Games shown from the cache that are being fetched again or failed
+        self.refreshing_stores = {}  # Stores being fetched again, for games refreshed incrementally
+        self.failed_stores = {}  # {game_name: {store: error}} of the stores shown from the cache after failing
+        self.price_cache = price_cache.PriceCache(price_cache.PC_CACHE_PATH)
+        self.use_server = False  # True while the price server refreshes the prices and writes the cache
         self.init_ui()
-        self.update_prices()
+        self.load_cached_prices()
+        self.update_prices(only_expired=True)
 
     def init_ui(self):
         self.setWindowTitle("Current Prices")
@@ -109,8 +136,19 @@ class CurrentPricesUI(QtWidgets.QWidget):
         # Add refresh button
         button_layout = QtWidgets.QHBoxLayout()
         self.refresh_button = QtWidgets.QPushButton("Refresh Prices")
-        self.refresh_button.clicked.connect(self.update_prices)
+        self.refresh_button.clicked.connect(lambda: self.update_prices())
         button_layout.addWidget(self.refresh_button)
+
+        self.refresh_expired_button = QtWidgets.QPushButton("Refresh Expired")
+        self.refresh_expired_button.setToolTip("Fetch only the prices whose cache expired, most changing first")
+        self.refresh_expired_button.clicked.connect(lambda: self.update_prices(only_expired=True))
+        button_layout.addWidget(self.refresh_expired_button)
+
+        self.quick_refresh_button = QtWidgets.QPushButton("Quick Refresh")
+        self.quick_refresh_button.setToolTip(f"Fetch the most outdated prices for {fetch_budget.QUICK_REFRESH_SECONDS} "
+                                             "seconds, the rest stay cached")
+        self.quick_refresh_button.clicked.connect(lambda: self.update_prices(quick=True))
+        button_layout.addWidget(self.quick_refresh_button)
         
         self.show_discounted_button = QtWidgets.QPushButton("Show Only Discounted")
         self.show_discounted_button.setEnabled(False)
@@ -177,21 +215,98 @@ class CurrentPricesUI(QtWidgets.QWidget):
 
         layout.addWidget(self.prices_tree_widget)
 
-    def update_prices(self):
-        """Start the price update process in a worker thread."""
+    def connect_price_server(self):
+        """
+        Read the cached prices through the price server when it is running. The server is then the
+        only writer of the cache file, and the window keeps its updates in memory.
+        """
+        self.use_server = price_client.is_server_running()
+        if not self.use_server:
+            return
+        try:
+            self.price_cache.replace_games(price_client.get_prices("pc"))
+        except Exception as e:
+            print(f"Error reading the prices of the price server: {e}")
+            self.use_server = False
+
+    def save_price_cache(self):
+        if not self.use_server:
+            self.price_cache.save()
+
+    def load_cached_prices(self):
+        """Fill the tree with the cached prices, update_prices marks the expired ones as stale."""
+        self.connect_price_server()
+        games_to_check = current_prices.update_games_to_check()
+
+        for game_name in games_to_check:
+            price_info = self.price_cache.get_game_data(game_name)
+            if not price_info:
+                continue
+
+            self.games_data[game_name] = price_info
+            self.games_order.append(game_name)
+            self.create_and_add_item(game_name, price_info)
+
+        if self.games_data:
+            self.status_label.setText("Showing cached prices")
+
+    def update_prices(self, only_expired: bool = False, quick: bool = False):
+        """
+        Start the price update process in a worker thread. With only_expired, the cached prices
+        stay in the tree and only the games whose cache expired are fetched again. A quick refresh
+        also keeps the cached prices, and fetches the games that most need it first until
+        QUICK_REFRESH_SECONDS run out.
+        """
         if self.worker and self.worker.isRunning():
             return
-            
-        self.prices_tree_widget.clear()
+
+        self.connect_price_server()
+        games_to_check = current_prices.update_games_to_check()
+        self.price_cache.remove_missing_games(list(games_to_check))
+
+        self.refreshing_stores.clear()
+        if quick:
+            games_to_fetch = {}
+            for game_name in self.price_cache.get_games_by_priority(list(games_to_check)):
+                games_to_fetch[game_name] = games_to_check[game_name]
+                self.stale_games.add(game_name)
+                self.refresh_item(game_name)
+        elif only_expired:
+            games_to_fetch = {}
+            for game_name in self.price_cache.get_expired_games(list(games_to_check), by_priority=True):
+                games_to_fetch[game_name] = self.get_expired_game_data(game_name, games_to_check[game_name])
+                self.stale_games.add(game_name)
+                self.refresh_item(game_name)
+        else:
+            self.prices_tree_widget.clear()
+            self.games_data.clear()
+            self.stale_games.clear()
+            self.failed_stores.clear()
+            games_to_fetch = games_to_check
+
         self.refresh_button.setEnabled(False)
+        self.refresh_expired_button.setEnabled(False)
+        self.quick_refresh_button.setEnabled(False)
         self.show_discounted_button.setEnabled(False)
         self.sort_combo.setEnabled(False)
-        self.games_data.clear()
         self.games_order.clear()
+        # prices arrive in completion order, so keep the saved order for sorting
+        self.games_order.extend(games_to_check)
+
+        if not games_to_fetch:
+            self.on_finished_all()
+            return
+
         self.status_label.setText("Initializing...")
-        
-        self.worker = PriceWorker()
-        self.worker.set_games(current_prices.update_games_to_check())
+
+        time_budget = fetch_budget.QUICK_REFRESH_SECONDS if quick else None
+        if self.use_server:
+            # the server refreshes whole games, so every store of the game is fetched again
+            self.refreshing_stores.clear()
+            self.worker = ServerPriceWorker("pc", only_expired, time_budget)
+        else:
+            self.worker = PriceWorker(time_budget=time_budget)
+        self.worker.set_games(games_to_fetch)
         
         self.worker.price_updated.connect(self.on_price_updated)
         self.worker.progress_updated.connect(self.on_progress_updated)
@@ -200,9 +315,22 @@ class CurrentPricesUI(QtWidgets.QWidget):
         
         self.worker.start()
 
+    def get_expired_game_data(self, game_name: str, game_data):
+        """
+        Return the entry of a game in games_to_check.json without the links of the stores whose
+        cached prices are still fresh, so only the expired stores are fetched.
+        """
+        expired_stores = self.price_cache.get_expired_stores(game_name)
+        if expired_stores is None or not isinstance(game_data, dict):
+            return game_data
+
+        self.refreshing_stores[game_name] = set(expired_stores)
+        return {key: value for key, value in game_data.items()
+                if key not in [STORE_LINK_KEYS[store] for store in STORE_LINK_KEYS
+                               if store not in expired_stores]}
+
     def open_data_folder(self):
-        folder = Path.home() / ".current_prices_data"
-        folder.mkdir(parents=True, exist_ok=True)
+        folder = app_data.get_data_dir()
 
         system = platform.system()
 
@@ -215,15 +343,61 @@ class CurrentPricesUI(QtWidgets.QWidget):
 
     def on_price_updated(self, game_name: str, price_info: dict):
         """Handle when a single game's price is updated."""
+        # Keep the cached prices of the stores that were not fetched again
+        refreshed_stores = self.refreshing_stores.pop(game_name, None)
+        if refreshed_stores is not None:
+            price_info = dict(price_info)
+            for store, store_data in self.games_data.get(game_name, {}).items():
+                if store in STORE_LINK_KEYS and store not in refreshed_stores:
+                    price_info[store] = store_data
+
+        # the cache keeps the previous price of the failed stores
+        self.price_cache.update_game_data(game_name, price_info, stores=refreshed_stores)
+        price_info = self.keep_cached_failed_stores(game_name, price_info)
+
         # Store game data in dictionary
         self.games_data[game_name] = price_info
-        self.games_order.append(game_name)
-        
-        # Create and add item to tree
-        self.create_and_add_item(game_name, price_info)
+        if game_name not in self.games_order:
+            self.games_order.append(game_name)
+        self.refresh_item(game_name)
+
+    def keep_cached_failed_stores(self, game_name: str, price_info: dict) -> dict:
+        """
+        Replace the stores that failed, or were skipped by their circuit breaker, with their last
+        cached price, and mark the game as stale until it is fetched successfully.
+        """
+        failed_stores = {store: store_data["error"] for store, store_data in price_info.items()
+                         if isinstance(store_data, dict) and "error" in store_data}
+        if not failed_stores:
+            self.failed_stores.pop(game_name, None)
+            self.stale_games.discard(game_name)
+            return price_info
+
+        cached_data = self.price_cache.get_game_data(game_name) or {}
+        price_info = dict(price_info)
+        for store in failed_stores:
+            if store in cached_data:
+                price_info[store] = cached_data[store]
+        self.failed_stores[game_name] = failed_stores
+        self.stale_games.add(game_name)
+        return price_info
+
+    def refresh_item(self, game_name: str):
+        """Replace the row of a game with its current data, or add a new one."""
+        price_info = self.games_data.get(game_name)
+        if price_info is None:
+            return
+
+        existing_items = self.prices_tree_widget.findItems(game_name, QtCore.Qt.MatchExactly, 0)
+        if existing_items:
+            index = self.prices_tree_widget.indexOfTopLevelItem(existing_items[0])
+            self.prices_tree_widget.takeTopLevelItem(index)
+            self.create_and_add_item(game_name, price_info, index)
+        else:
+            self.create_and_add_item(game_name, price_info)
 
-    def create_and_add_item(self, game_name: str, price_info: dict):
-        """Create a tree widget item from game data and add it to the tree."""
+    def create_and_add_item(self, game_name: str, price_info: dict, index: int = None):
+        """Create a tree widget item from game data and add it to the tree (at index, if given)."""
         item = QtWidgets.QTreeWidgetItem([game_name])
 
         number_of_items = len(self.prices_tree_widget.children())
@@ -281,9 +455,32 @@ class CurrentPricesUI(QtWidgets.QWidget):
             "itad_link": price_info.get("is_there_any_deal_link")
         })
 
+        # Mark cached prices that are being fetched again
+        if game_name in self.stale_games:
+            self.mark_item_as_stale(item, game_name)
+
         # Add an empty trailing column cell to keep layout consistent
         item.setText(7, "")
-        self.prices_tree_widget.addTopLevelItem(item)
+        if index is None:
+            self.prices_tree_widget.addTopLevelItem(item)
+        else:
+            self.prices_tree_widget.insertTopLevelItem(index, item)
+
+    def mark_item_as_stale(self, item: QtWidgets.QTreeWidgetItem, game_name: str):
+        """
+        Show the game name in gray italic with a tooltip, for expired cached prices and for the
+        stores that failed.
+        """
+        font = item.font(0)
+        font.setItalic(True)
+        item.setFont(0, font)
+        item.setForeground(0, QtGui.QBrush(QtGui.QColor("#8a8a8a")))
+        failed_stores = self.failed_stores.get(game_name)
+        if failed_stores:
+            item.setToolTip(0, "Stale price, showing the last cached price of:\n" + "\n".join(
+                f"{store}: {error}" for store, error in failed_stores.items()))
+        else:
+            item.setToolTip(0, "Cached price, not refreshed yet")
 
     def open_context_menu(self, point: QtCore.QPoint):
         item = self.prices_tree_widget.itemAt(point)
@@ -338,10 +535,18 @@ class CurrentPricesUI(QtWidgets.QWidget):
     def on_finished_all(self):
         """Handle when all prices have been fetched."""
         self.refresh_button.setEnabled(True)
+        self.refresh_expired_button.setEnabled(True)
+        self.quick_refresh_button.setEnabled(True)
         self.show_discounted_button.setEnabled(True)
         self.sort_combo.setEnabled(True)
         self.sort_combo.setCurrentIndex(0)  # Reset to "Saved Order"
-        self.status_label.setText("All prices updated successfully!")
+        self.sort_by_saved_order()
+        self.save_price_cache()
+        if self.failed_stores:
+            self.status_label.setText(f"Prices updated, {len(self.failed_stores)} game(s) show stale prices "
+                                      "of stores that failed or were skipped")
+        else:
+            self.status_label.setText("All prices updated successfully!")
 
     def apply_discount_filter(self):
         """Apply the discount filter to currently visible items."""
@@ -471,6 +676,8 @@ class CurrentPricesUI(QtWidgets.QWidget):
         """Handle errors from the worker thread."""
         self.status_label.setText(f"Error: {error_message}")
         self.refresh_button.setEnabled(True)
+        self.refresh_expired_button.setEnabled(True)
+        self.quick_refresh_button.setEnabled(True)
         QtWidgets.QMessageBox.warning(self, "Error", error_message)
 
     def closeEvent(self, event: QtGui.QCloseEvent):
@@ -478,12 +685,9 @@ class CurrentPricesUI(QtWidgets.QWidget):
         if self.worker and self.worker.isRunning():
             self.worker.terminate()
             self.worker.wait()
+        self.save_price_cache()
         event.accept()
 
-    def convert_to_float(self, price_str: str) -> float:
-        """Convert price string to float."""
-        return float(price_str.replace(',', '.')) if price_str else 0.0
-    
     def convert_to_str(self, price_float: float) -> str:
         """Convert float to price string with comma as decimal separator."""
         if price_float:
@@ -494,6 +698,7 @@ class CurrentPricesUI(QtWidgets.QWidget):
 
 if __name__ == "__main__":
     import sys
+    price_metrics.start_metrics_server_from_env()
     app = QtWidgets.QApplication(sys.argv)
     window = CurrentPricesUI()
     window.show()
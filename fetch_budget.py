@@ -0,0 +1,103 @@
+# Deadline-based time budgets for the price fetchers. A run gets a total deadline, each game and
+# each store fetch gets a slice of it, and every wait (WebDriverWait, sleeps, HTTP timeouts) is cut
+# to the time left, so a slow store can't hold a run past its deadline.
+#
+#   with fetch_budget.deadline(QUICK_REFRESH_SECONDS):
+#       with fetch_budget.deadline(GAME_BUDGET):
+#           WebDriverWait(driver, fetch_budget.get_timeout(20)).until(...)
+#
+# Nested deadlines never extend the enclosing one. The deadline lives in a context variable, like
+# the fetch_timing tags: threads started from a pool must run in a copy of the submitting context
+# (executor.submit(contextvars.copy_context().run, fetch_game, game_name)) to share it.
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import fetch_timing
+
+# ...
+
+# Seconds a single game can take, all its stores included
+GAME_BUDGET = 120
+
+# Seconds a single store fetch can take, retries included
+STORE_BUDGET = 75
+
+# Seconds a quick refresh runs for, fetching the games that most need it first
+QUICK_REFRESH_SECONDS = 60
+
+_deadline = contextvars.ContextVar("fetch_budget_deadline", default=None)
+
+
+class BudgetExceeded(Exception):
+    """Raised when a fetch starts or waits after its deadline."""
+
+    def __init__(self, message: str = "Out of time budget"):
+        super().__init__(message)
+
+
+def get_deadline() -> Optional[float]:
+    """Return the current deadline, in time.monotonic() seconds, or None if there is none."""
+    return _deadline.get()
+
+
+@contextmanager
+def deadline_at(deadline: Optional[float]):
+    """Set an absolute deadline (time.monotonic() seconds) for the block, None for no deadline."""
+    current_deadline = _deadline.get()
+    if deadline is None:
+        deadline = current_deadline
+    elif current_deadline is not None:
+        deadline = min(deadline, current_deadline)
+
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Give the block `seconds` at most, within the enclosing deadline. None or 0 adds no deadline."""
+    with deadline_at(time.monotonic() + seconds if seconds else None):
+        yield
+
+
+def get_remaining() -> Optional[float]:
+    """Seconds left before the deadline, None if there is no deadline."""
+    current_deadline = _deadline.get()
+    return None if current_deadline is None else current_deadline - time.monotonic()
+
+
+def is_expired() -> bool:
+    remaining = get_remaining()
+    return remaining is not None and remaining <= 0
+
+
+def check():
+    """Raise BudgetExceeded if the deadline has passed."""
+    if is_expired():
+        raise BudgetExceeded()
+
+
+def get_timeout(timeout: float) -> float:
+    """Cut the timeout of a wait to the time left. Raises BudgetExceeded if there is none left."""
+    remaining = get_remaining()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise BudgetExceeded()
+    return min(timeout, remaining)
+
+
+def clip(seconds: float) -> float:
+    """Cut a delay to the time left, 0 once the deadline has passed."""
+    remaining = get_remaining()
+    return seconds if remaining is None else max(0.0, min(seconds, remaining))
+
+
+def sleep(seconds: float, reason: str = ""):
+    """fetch_timing.sleep, cut to the time left."""
+    fetch_timing.sleep(clip(seconds), reason)
@@ -0,0 +1,600 @@
+# Asyncio fetch engine for the HTTP price backends. Every request runs on a single event loop,
+# with a shared keep-alive connection pool and a concurrency limit for each store host.
+#
+# Each batched price request is timed as a "fetch" span of its store, like a single store fetch of
+# current_prices.py, with a "links" tag of the number of store links it covers (see price_metrics.py).
+import asyncio
+import gzip
+import json
+import ssl
+import urllib.parse
+import zlib
+from typing import Callable, Optional
+
+import fetch_budget
+import fetch_timing
+import itad_api
+import price_metrics
+import store_api
+import store_breaker
+
+# ...
+
+# Maximum number of in-flight requests per host
+HOST_LIMITS = {
+    "store.steampowered.com": 8,
+    "www.gog.com": 4,
+    "api.gog.com": 8,
+    "store.playstation.com": 4,
+    "www.xbox.com": 4,
+    "www.nintendo.com": 4,
+    "isthereanydeal.com": 4,
+    "api.isthereanydeal.com": 4,
+}
+DEFAULT_HOST_LIMIT = 4
+
+# Idle connections kept open per host for reuse
+MAX_IDLE_CONNECTIONS = 8
+
+# Redirects followed by a request before it fails, like urllib does for the sync backend
+MAX_REDIRECTS = 5
+
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+REQUEST_TIMEOUT = store_api.REQUEST_TIMEOUT
+
+
+class HttpStatusError(RuntimeError):
+    """Non-2xx HTTP status of a response, kept so store_breaker can retry 429 and 5xx."""
+
+    def __init__(self, status: int, url: str):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+
+class HttpResponse:
+    """Response of an AsyncHttpClient request."""
+
+    def __init__(self, url: str, status: int, headers: dict, body: bytes):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.body.decode("utf-8"))
+
+    def raise_for_status(self):
+        if not 200 <= self.status < 300:
+            raise HttpStatusError(self.status, self.url)
+
+
+class AsyncHttpClient:
+    """
+    Minimal HTTP/1.1 client on top of asyncio streams. Connections are kept alive and pooled per
+    host, each host has a semaphore limiting the number of requests in flight, and redirects are
+    followed up to MAX_REDIRECTS times.
+    """
+
+    def __init__(self, host_limits: Optional[dict] = None, default_limit: int = DEFAULT_HOST_LIMIT,
+                 timeout: float = REQUEST_TIMEOUT):
+        self.host_limits = dict(HOST_LIMITS if host_limits is None else host_limits)
+        self.default_limit = default_limit
+        self.timeout = timeout
+        self._semaphores = {}
+        self._idle_connections = {}
+        self._ssl_context = ssl.create_default_context()
+
+    def get_semaphore(self, host: str) -> asyncio.Semaphore:
+        """Return the semaphore limiting the concurrent requests to a host."""
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.host_limits.get(host, self.default_limit))
+        return self._semaphores[host]
+
+    async def _connect(self, scheme: str, host: str, port: int):
+        """Open a new connection to the host."""
+        return await asyncio.open_connection(
+            host, port, ssl=self._ssl_context if scheme == "https" else None
+        )
+
+    async def _open_connection(self, scheme: str, host: str, port: int):
+        """Return an idle pooled connection to the host, or open a new one."""
+        idle_connections = self._idle_connections.get((scheme, host, port), [])
+        while idle_connections:
+            reader, writer = idle_connections.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+
+        reader, writer = await self._connect(scheme, host, port)
+        return reader, writer, False
+
+    def _release_connection(self, key: tuple, reader, writer):
+        """Put a connection back in the pool, closing it if the pool is full."""
+        idle_connections = self._idle_connections.setdefault(key, [])
+        if len(idle_connections) < MAX_IDLE_CONNECTIONS and not writer.is_closing():
+            idle_connections.append((reader, writer))
+        else:
+            writer.close()
+
+    async def request(self, method: str, url: str, params: Optional[dict] = None,
+                      headers: Optional[dict] = None, body: Optional[bytes] = None,
+                      cookies: Optional[dict] = None) -> HttpResponse:
+        """Send a request, following its redirects, and return the full response of the last one."""
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urllib.parse.urlencode(params)}"
+
+        first_host = urllib.parse.urlsplit(url).hostname
+        for _ in range(MAX_REDIRECTS + 1):
+            # the cookies are only sent to the host they were given for
+            hop_cookies = cookies if urllib.parse.urlsplit(url).hostname == first_host else None
+            response = await self._request_once(method, url, headers, body, hop_cookies)
+            location = response.headers.get("location")
+            if response.status not in REDIRECT_STATUSES or not location:
+                return response
+
+            url = urllib.parse.urljoin(url, location)
+            # a 303, or a 301/302 of a POST, is followed with a GET, like the browsers do
+            if response.status == 303 or (response.status in (301, 302) and method == "POST"):
+                method, body = "GET", None
+
+        raise HttpStatusError(response.status, url)
+
+    async def _request_once(self, method: str, url: str, headers: Optional[dict], body: Optional[bytes],
+                            cookies: Optional[dict]) -> HttpResponse:
+        """Send one request, without following a redirect."""
+        parsed_url = urllib.parse.urlsplit(url)
+        scheme = parsed_url.scheme or "http"
+        host = parsed_url.hostname
+        port = parsed_url.port or (443 if scheme == "https" else 80)
+        path = parsed_url.path or "/"
+        if parsed_url.query:
+            path = f"{path}?{parsed_url.query}"
+
+        request_headers = {
+            "Host": parsed_url.netloc,
+            "User-Agent": store_api.USER_AGENT,
+            "Accept-Encoding": "gzip, deflate",
+            "Connection": "keep-alive",
+        }
+        if cookies:
+            request_headers["Cookie"] = "; ".join(f"{key}={value}" for key, value in cookies.items())
+        if body is not None:
+            request_headers["Content-Length"] = str(len(body))
+        request_headers.update(headers or {})
+
+        request_data = f"{method} {path} HTTP/1.1\r\n"
+        request_data += "".join(f"{key}: {value}\r\n" for key, value in request_headers.items())
+        request_data = request_data.encode("latin-1") + b"\r\n" + (body or b"")
+
+        semaphore = self.get_semaphore(host)
+        with fetch_timing.span("http_wait", host=host):
+            await semaphore.acquire()
+        try:
+            with fetch_timing.span("http_request", host=host):
+                return await asyncio.wait_for(
+                    self._send(method, url, (scheme, host, port), request_data),
+                    fetch_budget.get_timeout(self.timeout)
+                )
+        finally:
+            semaphore.release()
+
+    async def _send(self, method: str, url: str, key: tuple, request_data: bytes) -> HttpResponse:
+        reader, writer, reused = await self._open_connection(*key)
+        try:
+            status, headers, body, keep_alive = await self._exchange(method, reader, writer, request_data)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            writer.close()
+            if not reused:
+                raise
+            # the server closed the pooled connection, try again on a new one
+            reader, writer = await self._connect(*key)
+            try:
+                status, headers, body, keep_alive = await self._exchange(method, reader, writer, request_data)
+            except BaseException:
+                writer.close()
+                raise
+        except BaseException:
+            writer.close()
+            raise
+
+        if keep_alive:
+            self._release_connection(key, reader, writer)
+        else:
+            writer.close()
+
+        return HttpResponse(url, status, headers, body)
+
+    async def _exchange(self, method: str, reader, writer, request_data: bytes) -> tuple:
+        """Write the request on a connection and read its response."""
+        writer.write(request_data)
+        await writer.drain()
+        return await self._read_response(method, reader)
+
+    async def _read_response(self, method: str, reader: asyncio.StreamReader) -> tuple:
+        """Read the status line, headers and body of a response."""
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the server")
+        version, status = status_line.decode("latin-1").split(" ", 2)[:2]
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+        status = int(status)
+
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            body = b""
+        elif "chunked" in headers.get("transfer-encoding", "").lower():
+            body = b""
+            while True:
+                chunk_size = int((await reader.readline()).split(b";")[0].strip(), 16)
+                if chunk_size == 0:
+                    # skip the trailer headers
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                body += await reader.readexactly(chunk_size)
+                await reader.readexactly(2)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep_alive = False
+
+        content_encoding = headers.get("content-encoding", "").lower()
+        if content_encoding == "gzip":
+            body = gzip.decompress(body)
+        elif content_encoding == "deflate":
+            body = zlib.decompress(body)
+
+        return status, headers, body, keep_alive
+
+    async def get_json(self, url: str, params: Optional[dict] = None, cookies: Optional[dict] = None):
+        """Send a GET request and return the decoded JSON body."""
+        response = await self.request("GET", url, params=params, cookies=cookies,
+                                      headers={"Accept": "application/json"})
+        response.raise_for_status()
+        return response.json()
+
+    async def post_json(self, url: str, data, params: Optional[dict] = None):
+        """Send a POST request with a JSON body and return the decoded JSON response."""
+        response = await self.request("POST", url, params=params, body=json.dumps(data).encode("utf-8"),
+                                      headers={"Accept": "application/json", "Content-Type": "application/json"})
+        response.raise_for_status()
+        return response.json()
+
+    async def get_text(self, url: str, params: Optional[dict] = None, cookies: Optional[dict] = None) -> str:
+        """Send a GET request and return the body as text."""
+        response = await self.request("GET", url, params=params, cookies=cookies)
+        response.raise_for_status()
+        return response.text()
+
+    async def close(self):
+        """Close every pooled connection."""
+        for idle_connections in self._idle_connections.values():
+            for _, writer in idle_connections:
+                writer.close()
+        self._idle_connections = {}
+
+
+async def get_steam_prices_batch(client: AsyncHttpClient, steam_links: list,
+                                 store_url: str = None,
+                                 batch_size: int = None,
+                                 on_batch: Optional[Callable] = None) -> dict:
+    """
+    Async version of store_api.get_steam_prices_batch, with all the batches in flight at once and
+    the requests going through the Steam circuit breaker. `on_batch` is called with the
+    {steam_link: (current, base)} of each batch as it completes, and the error of the batch when
+    its request failed.
+    """
+    store_url = store_url or store_api.STEAM_STORE_URL
+    batch_size = batch_size or store_api.STEAM_BATCH_SIZE
+    prices = {}
+    links_by_appid = {}
+
+    for steam_link in steam_links:
+        appid = store_api.get_steam_appid(steam_link)
+        if appid:
+            links_by_appid.setdefault(appid, []).append(steam_link)
+        else:
+            prices[steam_link] = ("0,0", "0,0")
+            if on_batch:
+                on_batch({steam_link: prices[steam_link]},
+                         store_api.PriceFetchError(f"No Steam appid in {steam_link}"))
+
+    async def fetch_batch(chunk):
+        error = None
+        try:
+            with fetch_timing.span("fetch", links=sum(len(links_by_appid[appid]) for appid in chunk)):
+                app_details = await store_breaker.call_async(
+                    "Steam", client.get_json,
+                    f"{store_url}/api/appdetails",
+                    params={"appids": ",".join(chunk), "cc": store_api.STEAM_COUNTRY_CODE,
+                            "l": store_api.STEAM_LANGUAGE, "filters": "price_overview"},
+                    cookies=store_api.STEAM_AGE_COOKIES
+                )
+        except Exception as e:
+            print(f"Error fetching Steam prices: {e}")
+            app_details = {}
+            error = e
+
+        batch_prices = {}
+        for appid in chunk:
+            appid_prices = store_api.parse_steam_price_overview(app_details.get(appid))
+            for steam_link in links_by_appid[appid]:
+                batch_prices[steam_link] = appid_prices
+
+        prices.update(batch_prices)
+        if on_batch:
+            on_batch(batch_prices, error)
+
+    appids = list(links_by_appid)
+    with fetch_timing.tagged(store="Steam"):
+        await asyncio.gather(*(fetch_batch(appids[start:start + batch_size])
+                               for start in range(0, len(appids), batch_size)))
+    return prices
+
+
+async def get_gog_product_id(client: AsyncHttpClient, gog_link: str) -> Optional[str]:
+    """Async version of store_api.get_gog_product_id, sharing its on-disk cache."""
+    product_id = store_api.load_gog_product_ids().get(gog_link)
+    price_metrics.count_cache_lookup("gog_product_ids", hit=bool(product_id))
+    if product_id:
+        return product_id
+
+    page_html = await store_breaker.call_async("GOG", client.get_text, gog_link)
+    product_id = store_api.parse_gog_product_id(page_html)
+    if product_id:
+        store_api.save_gog_product_id(gog_link, product_id)
+    return product_id
+
+
+async def get_gog_prices_batch(client: AsyncHttpClient, gog_links: list,
+                               api_url: str = None,
+                               batch_size: int = None,
+                               on_batch: Optional[Callable] = None) -> dict:
+    """
+    Async version of store_api.get_gog_prices_batch, with all the batches in flight at once and
+    the requests going through the GOG circuit breaker. `on_batch` is called with the
+    {gog_link: (current, base)} of each batch as it completes, and the error of the batch when its
+    request failed.
+    """
+    api_url = api_url or store_api.GOG_API_URL
+    batch_size = batch_size or store_api.GOG_BATCH_SIZE
+    prices = {}
+    links_by_product_id = {}
+
+    with fetch_timing.tagged(store="GOG"):
+        product_ids = await asyncio.gather(*(get_gog_product_id(client, gog_link) for gog_link in gog_links),
+                                           return_exceptions=True)
+    for gog_link, product_id in zip(gog_links, product_ids):
+        if product_id and not isinstance(product_id, Exception):
+            links_by_product_id.setdefault(product_id, []).append(gog_link)
+            continue
+
+        if isinstance(product_id, Exception):
+            print(f"Error resolving GOG product id for {gog_link}: {product_id}")
+            error = product_id
+        else:
+            error = store_api.PriceFetchError(f"No GOG product id found in {gog_link}")
+        prices[gog_link] = ("0,0", "0,0")
+        if on_batch:
+            on_batch({gog_link: prices[gog_link]}, error)
+
+    async def fetch_batch(chunk):
+        error = None
+        try:
+            with fetch_timing.span("fetch", links=sum(len(links_by_product_id[product_id]) for product_id in chunk)):
+                response = await store_breaker.call_async(
+                    "GOG", client.get_json,
+                    f"{api_url}/products/prices",
+                    params={"ids": ",".join(chunk), "countryCode": store_api.GOG_COUNTRY_CODE,
+                            "currency": store_api.GOG_CURRENCY}
+                )
+            chunk_prices = store_api.parse_gog_prices_response(response)
+        except Exception as e:
+            print(f"Error fetching GOG prices: {e}")
+            chunk_prices = {}
+            error = e
+
+        batch_prices = {}
+        for product_id in chunk:
+            for gog_link in links_by_product_id[product_id]:
+                batch_prices[gog_link] = chunk_prices.get(product_id, ("0,0", "0,0"))
+
+        prices.update(batch_prices)
+        if on_batch:
+            on_batch(batch_prices, error)
+
+    ids = list(links_by_product_id)
+    with fetch_timing.tagged(store="GOG"):
+        await asyncio.gather(*(fetch_batch(ids[start:start + batch_size])
+                               for start in range(0, len(ids), batch_size)))
+    return prices
+
+
+async def get_itad_game_id(client: AsyncHttpClient, slug: str, api_url: str = None) -> str:
+    """Async version of itad_api.get_game_id, sharing its on-disk cache."""
+    api_url = api_url or itad_api.ITAD_API_URL
+    game_id = itad_api.get_cached_game_id(slug)
+    if game_id:
+        return game_id
+
+    response = await store_breaker.call_async(
+        "IsThereAnyDeal", client.get_json,
+        f"{api_url}/games/lookup/v1",
+        params={"key": itad_api.ITAD_API_KEY, "title": itad_api.get_slug_title(slug)}
+    )
+    game_id = itad_api.parse_lookup_response(response, slug)
+    itad_api.save_itad_game_ids({slug: game_id})
+    return game_id
+
+
+async def get_itad_prices_batch(client: AsyncHttpClient, itad_links: list,
+                                api_url: str = None,
+                                batch_size: int = None,
+                                on_batch: Optional[Callable] = None) -> dict:
+    """
+    Async version of itad_api.get_itad_prices_batch, with all the batches in flight at once and
+    the requests going through the IsThereAnyDeal circuit breaker. `on_batch` is called with the
+    {itad_link: prices_data_dict} of each batch as it completes, and the error of the batch when
+    its request failed.
+    """
+    api_url = api_url or itad_api.ITAD_API_URL
+    batch_size = batch_size or itad_api.ITAD_BATCH_SIZE
+    prices = {}
+    links_by_game_id = {}
+
+    async def get_link_game_id(itad_link):
+        slug = itad_api.get_itad_slug(itad_link)
+        if not slug:
+            raise itad_api.GameLookupError(f"No IsThereAnyDeal game slug in {itad_link}")
+        return await get_itad_game_id(client, slug, api_url)
+
+    with fetch_timing.tagged(store="IsThereAnyDeal"):
+        game_ids = await asyncio.gather(*(get_link_game_id(itad_link) for itad_link in itad_links),
+                                        return_exceptions=True)
+    for itad_link, game_id in zip(itad_links, game_ids):
+        if isinstance(game_id, Exception):
+            if not isinstance(game_id, itad_api.GameLookupError):
+                print(f"Error looking up the IsThereAnyDeal game of {itad_link}: {game_id}")
+            prices[itad_link] = {"error": str(game_id)}
+        else:
+            links_by_game_id.setdefault(game_id, []).append(itad_link)
+
+    if prices and on_batch:
+        on_batch(dict(prices), None)
+
+    async def fetch_batch(chunk):
+        error = None
+        try:
+            with fetch_timing.span("fetch", links=sum(len(links_by_game_id[game_id]) for game_id in chunk)):
+                response = await store_breaker.call_async(
+                    "IsThereAnyDeal", client.post_json,
+                    f"{api_url}/games/prices/v3", chunk,
+                    params=itad_api.get_prices_params()
+                )
+            chunk_prices = itad_api.parse_prices_response(response)
+        except Exception as e:
+            print(f"Error fetching IsThereAnyDeal prices: {e}")
+            chunk_prices = {}
+            error = e
+
+        batch_prices = {}
+        for game_id in chunk:
+            for itad_link in links_by_game_id[game_id]:
+                batch_prices[itad_link] = dict(chunk_prices.get(game_id, {}))
+
+        prices.update(batch_prices)
+        if on_batch:
+            on_batch(batch_prices, error)
+
+    ids = list(links_by_game_id)
+    with fetch_timing.tagged(store="IsThereAnyDeal"):
+        await asyncio.gather(*(fetch_batch(ids[start:start + batch_size])
+                               for start in range(0, len(ids), batch_size)))
+    return prices
+
+
+async def fetch_games_prices(games_to_check: dict, on_game_prices: Callable,
+                             client: Optional[AsyncHttpClient] = None) -> dict:
+    """
+    Fetch the Steam and GOG prices of every game in `games_to_check` (new format entries with store
+    links, and old format IsThereAnyDeal links when the IsThereAnyDeal API has a key).
+    `on_game_prices(game_name, prices_data_dict)` is called as soon as all the stores of a game are
+    done, with the same keys returned by current_prices.get_game_prices. A store whose request
+    failed, or was skipped by its circuit breaker, gets a "<store>_error" key, and an old format
+    entry that failed gets an "error" key.
+    """
+    own_client = client is None
+    client = client or AsyncHttpClient()
+
+    games_prices = {}
+    pending_stores = {}
+    games_by_link = {"Steam": {}, "GOG": {}}
+    games_by_itad_link = {}
+
+    for game_name, game_data in games_to_check.items():
+        if not isinstance(game_data, dict):
+            if game_data and itad_api.is_available():
+                games_prices[game_name] = {"is_there_any_deal_link": game_data}
+                pending_stores[game_name] = 1
+                games_by_itad_link.setdefault(game_data, []).append(game_name)
+            continue
+
+        games_prices[game_name] = {"is_there_any_deal_link": game_data.get("isthereanydeal_link", "")}
+        pending_stores[game_name] = 0
+
+        for store in games_by_link:
+            store_link = game_data.get(f"{store.lower()}_link")
+            if store_api.is_valid_store_link(store_link):
+                games_by_link[store].setdefault(store_link, []).append(game_name)
+                pending_stores[game_name] += 1
+
+    def store_batch_done(store, batch_prices, error=None):
+        for store_link, (current_price, base_price) in batch_prices.items():
+            for game_name in games_by_link[store].get(store_link, []):
+                games_prices[game_name].update({
+                    f"{store}_current": current_price,
+                    f"{store}_base": base_price,
+                    f"{store}_link": store_link
+                })
+                if error:
+                    games_prices[game_name][f"{store}_error"] = str(error)
+                pending_stores[game_name] -= 1
+                if pending_stores[game_name] == 0:
+                    on_game_prices(game_name, games_prices[game_name])
+
+    def itad_batch_done(batch_prices, error=None):
+        for itad_link, itad_prices in batch_prices.items():
+            for game_name in games_by_itad_link.get(itad_link, []):
+                games_prices[game_name].update(itad_prices)
+                if error:
+                    games_prices[game_name]["error"] = str(error)
+                pending_stores[game_name] -= 1
+                on_game_prices(game_name, games_prices[game_name])
+
+    # games without any valid store link are done already
+    for game_name, pending in pending_stores.items():
+        if pending == 0:
+            on_game_prices(game_name, games_prices[game_name])
+
+    try:
+        await asyncio.gather(
+            get_steam_prices_batch(client, list(games_by_link["Steam"]),
+                                   on_batch=lambda batch, error: store_batch_done("Steam", batch, error)),
+            get_gog_prices_batch(client, list(games_by_link["GOG"]),
+                                 on_batch=lambda batch, error: store_batch_done("GOG", batch, error)),
+            get_itad_prices_batch(client, list(games_by_itad_link), on_batch=itad_batch_done),
+        )
+    finally:
+        if own_client:
+            await client.close()
+
+    return games_prices
+
+
+def run_fetch_games_prices(games_to_check: dict, on_game_prices: Callable,
+                           host_limits: Optional[dict] = None) -> dict:
+    """
+    Blocking entry point that runs fetch_games_prices on a new event loop. `host_limits` overrides
+    HOST_LIMITS for this run.
+    """
+    async def fetch():
+        client = AsyncHttpClient(host_limits)
+        try:
+            return await fetch_games_prices(games_to_check, on_game_prices, client)
+        finally:
+            await client.close()
+
+    return asyncio.run(fetch())
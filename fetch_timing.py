@@ -0,0 +1,222 @@
+# Timing spans for the stages of the price fetchers (driver start, page load, waits, age gates,
+# sleeps, parsing, HTTP requests), sent to pluggable sinks: a log file, an in-memory ring buffer
+# or any exporter callback.
+#
+#   fetch_timing.add_sink(fetch_timing.LogFileSink("timings.ndjson"))
+#   with fetch_timing.tagged(game="Evil West", store="Steam"):
+#       with fetch_timing.span("driver_get"):
+#           driver.get(steam_link)
+#
+# Spans are only measured while at least one sink is registered. Setting the FETCH_TIMING_LOG
+# environment variable to a file path registers a LogFileSink on import.
+import collections
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# ...
+
+# Environment variable with the path of a log file the spans are written to
+TIMING_LOG_ENV = "FETCH_TIMING_LOG"
+
+# Number of spans kept by a RingBufferSink
+RING_BUFFER_SIZE = 10000
+
+# Spans sent at once to the export function of an ExporterSink
+EXPORT_BATCH_SIZE = 100
+
+_current_tags = contextvars.ContextVar("fetch_timing_tags", default={})
+_sinks = []
+_sinks_lock = threading.Lock()
+
+
+class Span:
+    """A timed stage of a fetch, tagged with the game, the store and its outcome."""
+
+    def __init__(self, stage: str, tags: dict):
+        self.stage = stage
+        self.tags = tags
+        self.outcome = "ok"
+        self.started_at = time.time()
+        self.duration = 0.0
+
+    def to_dict(self) -> dict:
+        return dict(self.tags, stage=self.stage, outcome=self.outcome, started_at=self.started_at,
+                    duration=self.duration)
+
+
+class LogFileSink:
+    """Appends every span to a file as a line of JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, span: Span):
+        line = json.dumps(span.to_dict())
+        with self._lock:
+            with open(self.path, "a") as log_file:
+                log_file.write(line + "\n")
+
+    def close(self):
+        pass
+
+
+class RingBufferSink:
+    """Keeps the last `size` spans in memory, e.g. to summarize a refresh."""
+
+    def __init__(self, size: int = RING_BUFFER_SIZE):
+        self.spans = collections.deque(maxlen=size)
+
+    def emit(self, span: Span):
+        self.spans.append(span)
+
+    def get_spans(self) -> list:
+        return list(self.spans)
+
+    def clear(self):
+        self.spans.clear()
+
+    def close(self):
+        pass
+
+
+class ExporterSink:
+    """Sends the spans, as dicts, to an export function in batches of `batch_size`."""
+
+    def __init__(self, export: Callable, batch_size: int = EXPORT_BATCH_SIZE):
+        self.export = export
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def emit(self, span: Span):
+        with self._lock:
+            self._pending.append(span.to_dict())
+            if len(self._pending) < self.batch_size:
+                return
+            batch, self._pending = self._pending, []
+        self.export(batch)
+
+    def close(self):
+        """Export the spans still pending."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self.export(batch)
+
+
+def add_sink(sink):
+    """Register a sink; spans are measured while at least one is registered."""
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink):
+    """Unregister a sink and close it."""
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+    sink.close()
+
+
+def is_enabled() -> bool:
+    return bool(_sinks)
+
+
+def emit(span: Span):
+    for sink in list(_sinks):
+        try:
+            sink.emit(span)
+        except Exception as e:
+            print(f"Error writing timing span: {e}")
+
+
+@contextmanager
+def tagged(**tags):
+    """Add tags (e.g. game and store) to every span started inside the block, in this thread or task."""
+    token = _current_tags.set(dict(_current_tags.get(), **tags))
+    try:
+        yield
+    finally:
+        _current_tags.reset(token)
+
+
+@contextmanager
+def span(stage: str, **tags):
+    """
+    Time the block as a stage. The yielded Span can set its outcome (e.g. "age_gate" or
+    "coming_soon"); it is "error" if the block raises without setting one. Yields None when no
+    sink is registered.
+    """
+    if not _sinks:
+        yield None
+        return
+
+    current_span = Span(stage, dict(_current_tags.get(), **tags))
+    start = time.perf_counter()
+    try:
+        yield current_span
+    except BaseException as e:
+        if current_span.outcome == "ok":
+            current_span.outcome = f"error: {type(e).__name__}"
+        raise
+    finally:
+        current_span.duration = time.perf_counter() - start
+        emit(current_span)
+
+
+def set_outcome(current_span: Optional[Span], outcome: str):
+    """Set the outcome of a span yielded by span(), which is None when timing is disabled."""
+    if current_span:
+        current_span.outcome = outcome
+
+
+def sleep(seconds: float, reason: str = ""):
+    """time.sleep, timed as a "sleep" stage so fixed waits show up in the spans."""
+    with span("sleep", reason=reason):
+        time.sleep(seconds)
+
+
+def percentile(values: list, percent: float):
+    """Nearest-rank percentile of a list of values, None if it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def summarize(spans: list, group_by: tuple = ("store", "stage")) -> dict:
+    """
+    Summarize spans (Span objects or dicts) by the given tags, e.g. {"Steam/sleep": {"count",
+    "total", "p50", "p95", "max", "errors"}}, to see where a refresh spends its time.
+    """
+    durations = collections.defaultdict(list)
+    errors = collections.Counter()
+    for current_span in spans:
+        span_dict = current_span.to_dict() if isinstance(current_span, Span) else current_span
+        key = "/".join(str(span_dict.get(tag, "-")) for tag in group_by)
+        durations[key].append(span_dict["duration"])
+        if span_dict["outcome"].startswith("error"):
+            errors[key] += 1
+
+    return {
+        key: {
+            "count": len(values),
+            "total": sum(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "max": max(values),
+            "errors": errors[key],
+        }
+        for key, values in sorted(durations.items())
+    }
+
+
+if os.environ.get(TIMING_LOG_ENV):
+    add_sink(LogFileSink(os.environ[TIMING_LOG_ENV]))
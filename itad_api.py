@@ -0,0 +1,233 @@
+# IsThereAnyDeal API backend for the old format entries of the games to check, the ones saved as an
+# IsThereAnyDeal game page link. Instead of loading every game page in Chrome, the game ids are
+# looked up once from the slugs of the links and saved, and the Steam and GOG prices of many games
+# are requested in one POST:
+#
+#   itad_api.get_itad_prices_batch(["https://isthereanydeal.com/game/evil-west/info/"])
+#   # {link: {"Steam_current": "39,99", "Steam_base": "79,99", "Steam_link": ..., "GOG_current": ...}}
+#
+# The API needs a key, set in the ITAD_API_KEY environment variable; without it the entries are
+# still scraped from the game pages. ITAD_API_URL can point to a local stand-in server, e.g. the
+# fixture server of the benchmarks.
+import json
+import os
+import re
+import threading
+from typing import Optional
+
+import app_data
+import price_metrics
+import store_api
+
+# ...
+
+# Base URL of the IsThereAnyDeal API, change it to point the backend to a local stand-in server
+ITAD_API_URL = "https://api.isthereanydeal.com"
+
+# Environment variable with the API key, https://isthereanydeal.com/apps/my/
+ITAD_API_KEY_ENV = "ITAD_API_KEY"
+ITAD_API_KEY = os.environ.get(ITAD_API_KEY_ENV, "")
+
+ITAD_COUNTRY_CODE = "BR"
+
+# IsThereAnyDeal shop ids of the stores read from the prices, by their name in the prices dicts
+ITAD_SHOP_IDS = {"Steam": 61, "GOG": 35}
+
+# Number of game ids sent in each prices request
+ITAD_BATCH_SIZE = 200
+
+# Game ids looked up from the slugs are saved here so each slug is only looked up once
+ITAD_GAME_IDS_PATH = app_data.DATA_DIR / "itad_game_ids.json"
+
+
+def is_available() -> bool:
+    """Check if the API can be used, it needs a key."""
+    return bool(ITAD_API_KEY)
+
+
+def get_itad_slug(itad_link: str) -> Optional[str]:
+    """Return the game slug of an IsThereAnyDeal game page link, e.g. "evil-west"."""
+    match = re.search(r"/game/([^/?#]+)", itad_link or "")
+    return match.group(1) if match else None
+
+
+def get_slug_title(slug: str) -> str:
+    """Return the title searched for a slug, "evil-west" -> "evil west"."""
+    return re.sub(r"[-_]+", " ", slug).strip()
+
+
+_itad_game_ids = None
+_itad_game_ids_lock = threading.Lock()
+
+
+def load_itad_game_ids() -> dict:
+    """Load the {slug: game_id} cache from disk."""
+    global _itad_game_ids
+    with _itad_game_ids_lock:
+        if _itad_game_ids is None:
+            try:
+                with open(ITAD_GAME_IDS_PATH, "r") as json_file:
+                    _itad_game_ids = json.load(json_file)
+            except (FileNotFoundError, ValueError):
+                _itad_game_ids = {}
+        return _itad_game_ids
+
+
+def save_itad_game_ids(game_ids: dict):
+    """Add looked up game ids to the cache and write it to disk."""
+    cached_game_ids = load_itad_game_ids()
+    with _itad_game_ids_lock:
+        cached_game_ids.update(game_ids)
+        try:
+            ITAD_GAME_IDS_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with open(ITAD_GAME_IDS_PATH, "w") as json_file:
+                json.dump(cached_game_ids, json_file, indent=4)
+        except OSError as e:
+            print(f"Error saving IsThereAnyDeal game ids: {e}")
+
+
+def get_cached_game_id(slug: str) -> Optional[str]:
+    game_id = load_itad_game_ids().get(slug)
+    price_metrics.count_cache_lookup("itad_game_ids", hit=bool(game_id))
+    return game_id
+
+
+class GameLookupError(Exception):
+    """A slug the lookup can't match to a game, as opposed to a failed request."""
+
+
+def parse_lookup_response(response: dict, slug: str) -> str:
+    """
+    Return the game id of a games/lookup response. The lookup searches by title, so the slug of
+    the game found must be the slug of the link, raises GameLookupError otherwise.
+    """
+    game = response.get("game") or {}
+    if not response.get("found") or not game.get("id"):
+        raise GameLookupError(f"No IsThereAnyDeal game found for {slug}")
+    if str(game.get("slug", "")).lower() != slug.lower():
+        raise GameLookupError(f"The IsThereAnyDeal lookup of {slug} found another game: {game.get('slug')}")
+    return game["id"]
+
+
+def lookup_game_id(slug: str, api_url: str = None) -> str:
+    """Look up the game id of a slug, without the cache."""
+    api_url = api_url or ITAD_API_URL
+    response = store_api.http_get_json(f"{api_url}/games/lookup/v1",
+                                       params={"key": ITAD_API_KEY, "title": get_slug_title(slug)})
+    return parse_lookup_response(response, slug)
+
+
+def get_game_id(slug: str, api_url: str = None) -> str:
+    """
+    Return the game id of a slug, looking it up only the first time. Raises GameLookupError if no
+    game matches the slug, and the error of a failed request.
+    """
+    game_id = get_cached_game_id(slug)
+    if game_id:
+        return game_id
+
+    game_id = lookup_game_id(slug, api_url)
+    save_itad_game_ids({slug: game_id})
+    return game_id
+
+
+def get_prices_params() -> dict:
+    return {"key": ITAD_API_KEY, "country": ITAD_COUNTRY_CODE,
+            "shops": ",".join(str(shop_id) for shop_id in ITAD_SHOP_IDS.values())}
+
+
+def parse_deal_amount(price: Optional[dict]) -> str:
+    """Return the "12,34" price of a deal price, e.g. {"amount": 12.34, "amountInt": 1234}."""
+    price = price or {}
+    if price.get("amountInt") is not None:
+        return store_api.format_price_cents(int(price["amountInt"]))
+    if price.get("amount") is not None:
+        return store_api.format_price_cents(round(float(price["amount"]) * 100))
+    return "0,0"
+
+
+def parse_prices_response(response: list) -> dict:
+    """
+    Return the {game_id: prices_data_dict} of a games/prices response, with the Steam_* and GOG_*
+    keys of current_prices.get_game_prices for the stores with a deal.
+    """
+    store_names = {shop_id: store for store, shop_id in ITAD_SHOP_IDS.items()}
+    prices = {}
+    for game in response or []:
+        game_prices = prices.setdefault(game.get("id"), {})
+        for deal in game.get("deals", []):
+            store = store_names.get((deal.get("shop") or {}).get("id"))
+            # the first deal of a store is its current one
+            if not store or f"{store}_current" in game_prices:
+                continue
+            game_prices[f"{store}_current"] = parse_deal_amount(deal.get("price"))
+            game_prices[f"{store}_base"] = parse_deal_amount(deal.get("regular") or deal.get("price"))
+            game_prices[f"{store}_link"] = deal.get("url")
+    return prices
+
+
+def get_prices_by_game_id(game_ids: list, api_url: str = None) -> dict:
+    """Request the Steam and GOG prices of several games at once. Returns {game_id: prices_data_dict}."""
+    api_url = api_url or ITAD_API_URL
+    response = store_api.http_post_json(f"{api_url}/games/prices/v3", game_ids, params=get_prices_params())
+    return parse_prices_response(response)
+
+
+def get_itad_prices_http(itad_link: str, api_url: str = None) -> dict:
+    """
+    Get the Steam and GOG prices of an IsThereAnyDeal game link from the API. Raises if a request
+    fails, a game that is not found, or doesn't match the slug of the link, gets an "error" key.
+    """
+    prices = get_itad_prices_batch([itad_link], api_url, raise_errors=True)
+    return prices[itad_link]
+
+
+def get_itad_prices_batch(itad_links: list, api_url: str = None, batch_size: int = None,
+                          raise_errors: bool = False) -> dict:
+    """
+    Get the Steam and GOG prices of many IsThereAnyDeal game links, requesting the prices of
+    `batch_size` games at a time. Returns {itad_link: prices_data_dict}, with an "error" key for
+    the links that failed, like the IsThereAnyDeal page scraper. With raise_errors a failed
+    request raises instead.
+    """
+    api_url = api_url or ITAD_API_URL
+    batch_size = batch_size or ITAD_BATCH_SIZE
+    prices = {}
+    links_by_game_id = {}
+
+    for itad_link in itad_links:
+        slug = get_itad_slug(itad_link)
+        if not slug:
+            prices[itad_link] = {"error": f"No IsThereAnyDeal game slug in {itad_link}"}
+            continue
+
+        try:
+            game_id = get_game_id(slug, api_url)
+        except GameLookupError as e:
+            prices[itad_link] = {"error": str(e)}
+            continue
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Error looking up the IsThereAnyDeal game {slug}: {e}")
+            prices[itad_link] = {"error": str(e)}
+            continue
+        links_by_game_id.setdefault(game_id, []).append(itad_link)
+
+    game_ids = list(links_by_game_id)
+    for start in range(0, len(game_ids), batch_size):
+        chunk = game_ids[start:start + batch_size]
+
+        try:
+            chunk_prices = get_prices_by_game_id(chunk, api_url)
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Error fetching IsThereAnyDeal prices: {e}")
+            chunk_prices = {game_id: {"error": str(e)} for game_id in chunk}
+
+        for game_id in chunk:
+            for itad_link in links_by_game_id[game_id]:
+                prices[itad_link] = dict(chunk_prices.get(game_id, {}))
+
+    return prices
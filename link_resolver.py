@@ -0,0 +1,125 @@
+# Resolves the IsThereAnyDeal shop links (redirects to the store pages) into the store links saved
+# in games_to_check.json, over HTTP instead of loading every store page in Chrome. The redirect
+# chain is followed one hop at a time, with HEAD requests and a GET when a hop doesn't answer HEAD
+# with a redirect, and stops at the first URL of the store, before the store page itself is loaded:
+#
+#   link_resolver.resolve_store_link("https://isthereanydeal.com/out/...", "Steam")
+#   # "https://store.steampowered.com/app/1259420/Evil_West/"
+#
+# Each link only takes a few small requests, so the links of a whole library are resolved at once
+# in a pool of RESOLVE_WORKERS threads (see StoreLinkWorker in set_games_to_check_json.py).
+import re
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Optional
+
+import fetch_budget
+import fetch_timing
+import store_api
+
+# ...
+
+# Hosts of the store links, a link is resolved once the chain reaches one of them. Only these exact
+# hosts match, not their subdomains (the chain goes on from gog.com to www.gog.com)
+STORE_HOSTS = {
+    "Steam": ["store.steampowered.com"],
+    "GOG": ["www.gog.com"],
+}
+
+# Redirects followed before giving up on a link
+MAX_REDIRECTS = 10
+
+# Seconds each request of the chain is given
+RESOLVE_TIMEOUT = 10
+
+# Links resolved at the same time
+RESOLVE_WORKERS = 16
+
+# Bytes of a GET body searched for a meta refresh or script redirect
+MAX_BODY_BYTES = 64 * 1024
+
+REDIRECT_CODES = {301, 302, 303, 307, 308}
+
+# <meta http-equiv="refresh" content="0; url=..."> and location.href = "..." / location.replace("...")
+BODY_REDIRECT_PATTERNS = [
+    re.compile(r"""<meta[^>]+http-equiv=["']?refresh["']?[^>]+content=["'][^"']*url=["']?([^"'>\s]+)""", re.I),
+    re.compile(r"""location(?:\.href)?\s*=\s*["']([^"']+)["']"""),
+    re.compile(r"""location\.replace\(\s*["']([^"']+)["']"""),
+]
+
+
+class NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Return the redirects as they are, so each hop is checked before it's followed."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_opener = urllib.request.build_opener(NoRedirectHandler)
+
+
+def is_store_url(url: str, store: str) -> bool:
+    hostname = (urllib.parse.urlsplit(url).hostname or "").lower()
+    return hostname in STORE_HOSTS[store]
+
+
+def find_body_redirect(body: str) -> Optional[str]:
+    """Return the URL of a meta refresh or script redirect of a page, None if it has none."""
+    for pattern in BODY_REDIRECT_PATTERNS:
+        match = pattern.search(body)
+        if match:
+            return match.group(1).replace("&amp;", "&")
+    return None
+
+
+def request_next_url(url: str, method: str, timeout: float) -> Optional[str]:
+    """Send one request without following redirects and return the URL it redirects to, if any."""
+    request = urllib.request.Request(url, headers={"User-Agent": store_api.USER_AGENT}, method=method)
+    with fetch_timing.span("http_request", host=urllib.parse.urlsplit(url).hostname, method=method):
+        try:
+            with _opener.open(request, timeout=fetch_budget.get_timeout(timeout)) as response:
+                if method == "HEAD":
+                    return None
+                body = response.read(MAX_BODY_BYTES).decode("utf-8", errors="replace")
+                location = find_body_redirect(body)
+        except urllib.error.HTTPError as e:
+            e.close()
+            if e.code not in REDIRECT_CODES:
+                # some hosts don't answer HEAD at all, the GET is tried next
+                if method == "HEAD":
+                    return None
+                raise
+            location = e.headers.get("Location")
+
+    return urllib.parse.urljoin(url, location) if location else None
+
+
+def get_next_url(url: str, timeout: float) -> Optional[str]:
+    """Return the next URL of a redirect chain, asking with HEAD first and GET when HEAD has no redirect."""
+    return request_next_url(url, "HEAD", timeout) or request_next_url(url, "GET", timeout)
+
+
+def resolve_store_link(link: str, store: str, timeout: float = RESOLVE_TIMEOUT) -> Optional[str]:
+    """
+    Follow the redirects of a link until the first URL of the store and return it. Returns None
+    when the chain ends, or fails, somewhere else.
+    """
+    with fetch_timing.span("link") as link_span:
+        url = link
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                if is_store_url(url, store):
+                    return url
+                url = get_next_url(url, timeout)
+                if not url:
+                    fetch_timing.set_outcome(link_span, "no_store_redirect")
+                    return None
+        except Exception as e:
+            print(f"{store} link error: {str(e)}")
+            fetch_timing.set_outcome(link_span, f"error: {type(e).__name__}")
+            return None
+
+        fetch_timing.set_outcome(link_span, "too_many_redirects")
+        return None
+
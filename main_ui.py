@@ -1,16 +1,22 @@
 import os
 import sys
+import threading
 from PyQt5 import QtWidgets, QtGui, QtCore
 
-# Import all the UI modules
-import current_prices_ui
-import set_games_to_check_json
-import current_console_prices_ui
-import set_games_to_check_console_ui
+# The window modules are imported when their window is first opened, they load selenium and the
+# price fetchers, which the main menu doesn't need
+import price_client
+import price_metrics
 
 THIS_FOLDER = os.path.dirname(os.path.abspath(__file__))
 ICON_PATH = os.path.join(THIS_FOLDER, "icons", "window_icon.png")
 
+# Environment variable that starts the local price server, shared by the price windows, when the
+# main menu opens, if set to 1. The windows fetch the prices themselves otherwise
+START_PRICE_SERVER_ENV = "START_PRICE_SERVER"
+
+START_PRICE_SERVER = os.environ.get(START_PRICE_SERVER_ENV, "0") == "1"
+
 
 class MainUI(QtWidgets.QWidget):
     def __init__(self):
@@ -18,6 +24,10 @@ class MainUI(QtWidgets.QWidget):
         self.child_windows = {}  # Store references to child windows
         self.init_ui()
 
+        if START_PRICE_SERVER:
+            # in the background, so the menu shows up while the server starts
+            threading.Thread(target=price_client.ensure_server_running, daemon=True).start()
+
     def init_ui(self):
         """Initialize the main UI."""
         self.setWindowTitle("Game Price Tracker - Main Menu")
@@ -132,6 +142,7 @@ class MainUI(QtWidgets.QWidget):
     def open_pc_prices(self):
         """Open the PC prices UI."""
         if 'pc_prices' not in self.child_windows or self.child_windows['pc_prices'] is None:
+            import current_prices_ui
             self.child_windows['pc_prices'] = current_prices_ui.CurrentPricesUI()
             self.child_windows['pc_prices'].closeEvent = lambda event: self.on_child_closed('pc_prices', event)
         
@@ -141,6 +152,7 @@ class MainUI(QtWidgets.QWidget):
     def open_pc_config(self):
         """Open the PC configuration UI."""
         if 'pc_config' not in self.child_windows or self.child_windows['pc_config'] is None:
+            import set_games_to_check_json
             self.child_windows['pc_config'] = set_games_to_check_json.GameManagerUI()
             self.child_windows['pc_config'].closeEvent = lambda event: self.on_child_closed('pc_config', event)
         
@@ -150,6 +162,7 @@ class MainUI(QtWidgets.QWidget):
     def open_console_prices(self):
         """Open the console prices UI."""
         if 'console_prices' not in self.child_windows or self.child_windows['console_prices'] is None:
+            import current_console_prices_ui
             self.child_windows['console_prices'] = current_console_prices_ui.CurrentConsolePricesUI()
             self.child_windows['console_prices'].closeEvent = lambda event: self.on_child_closed('console_prices', event)
         
@@ -159,6 +172,7 @@ class MainUI(QtWidgets.QWidget):
     def open_console_config(self):
         """Open the console configuration UI."""
         if 'console_config' not in self.child_windows or self.child_windows['console_config'] is None:
+            import set_games_to_check_console_ui
             self.child_windows['console_config'] = set_games_to_check_console_ui.ConsoleGameManagerUI()
             self.child_windows['console_config'].closeEvent = lambda event: self.on_child_closed('console_config', event)
         
@@ -193,6 +207,7 @@ class MainUI(QtWidgets.QWidget):
 
 
 if __name__ == "__main__":
+    price_metrics.start_metrics_server_from_env()
     app = QtWidgets.QApplication(sys.argv)
     
     # Set application properties
@@ -0,0 +1,188 @@
+# Reads the console store prices from the JSON responses the store pages fetch in the background,
+# instead of waiting for the price elements to render. The drivers log the DevTools network events
+# (the "performance" log), and capture_prices reads the body of the first store API response with
+# the price of the product of the page (its id is taken from the link) and stops the page load
+# right there:
+#
+#   network_capture.CAPTURE_PRICES = True  # before the drivers are started
+#   prices = network_capture.capture_prices(driver, "psn", psn_link, adapter.get_canonical_id(psn_link))
+#   # ("187,12", "249,50") or None
+#
+# None is returned when no price response shows up within CAPTURE_TIMEOUT, e.g. after a change of
+# the store API, and the page is then read from its elements as usual (see current_prices_consoles.py).
+import base64
+import json
+import re
+import time
+from typing import Optional
+
+import fetch_budget
+import fetch_timing
+
+# ...
+
+# Log the network events of the drivers and read the prices from the store API responses
+CAPTURE_PRICES = False
+
+# Capability of the Chrome logs the network events are read from
+LOGGING_PREFS = {"performance": "ALL"}
+
+# Seconds to wait for a price response before reading the page elements instead
+CAPTURE_TIMEOUT = 10
+
+# Seconds between two reads of the network events
+POLL_INTERVAL = 0.1
+
+# Keys of the id of a product in the store API responses
+PRODUCT_ID_KEYS = ["id", "productId", "ProductId", "urlKey", "sku"]
+
+# Responses read for the prices of each store
+STORE_API_PATTERNS = {
+    "psn": re.compile(r"web\.np\.playstation\.com/api/graphql"),
+    "xbox": re.compile(r"displaycatalog\.mp\.microsoft\.com|emerald\.xboxservices\.com"),
+    "nintendo": re.compile(r"api\.ec\.nintendo\.com/v1/price|graph\.nintendo\.com"),
+}
+
+
+def is_enabled() -> bool:
+    return CAPTURE_PRICES
+
+
+def format_price(value) -> str:
+    """Return a price as a "1234,56" string, from a number or a "R$ 1.234,56" / "US$1,234.56" string."""
+    if isinstance(value, (int, float)):
+        return f"{value:.2f}".replace(".", ",")
+
+    match = re.search(r"\d[\d.,]*", str(value or ""))
+    if not match:
+        return ""
+    number = match.group(0).rstrip(".,")
+    # the last separator is the decimal one, unless 3 digits follow it ("1.234" is a thousand)
+    separator_index = max(number.rfind(","), number.rfind("."))
+    if separator_index == -1 or len(number) - separator_index - 1 == 3:
+        return re.sub(r"[.,]", "", number)
+    whole = re.sub(r"[.,]", "", number[:separator_index])
+    return f"{whole or '0'},{number[separator_index + 1:]}"
+
+
+def find_dicts(data, *keys):
+    """Yield the dicts nested in data that have all the keys."""
+    if isinstance(data, dict):
+        if all(key in data for key in keys):
+            yield data
+        for value in data.values():
+            yield from find_dicts(value, *keys)
+    elif isinstance(data, list):
+        for value in data:
+            yield from find_dicts(value, *keys)
+
+
+def find_product_dicts(data, product_id: Optional[str]):
+    """
+    Yield the dicts nested in data that describe the product of the page: one of their
+    PRODUCT_ID_KEYS is its id. Responses often list related products, add-ons and editions too.
+    """
+    if not product_id:
+        return
+    if isinstance(data, dict):
+        if any(str(data.get(key, "")).lower() == product_id.lower() for key in PRODUCT_ID_KEYS):
+            yield data
+        for value in data.values():
+            yield from find_product_dicts(value, product_id)
+    elif isinstance(data, list):
+        for value in data:
+            yield from find_product_dicts(value, product_id)
+
+
+def extract_psn_prices(data, product_id: str) -> Optional[tuple[str, str]]:
+    # {"id": "EP0006-PPSA01415_00-...", "price": {"basePrice": "R$ 249,50", "discountedPrice": "R$ 187,12"}}
+    for product in find_product_dicts(data, product_id):
+        for price in find_dicts(product, "basePrice", "discountedPrice"):
+            current = format_price(price["discountedPrice"])
+            if current:
+                return current, format_price(price["basePrice"]) or current
+    return None
+
+
+def extract_xbox_prices(data, product_id: str) -> Optional[tuple[str, str]]:
+    # {"ProductId": "9PGC82V0DXFS", ... "Price": {"ListPrice": 187.12, "MSRP": 249.5, "CurrencyCode": "BRL"}}
+    for product in find_product_dicts(data, product_id):
+        for list_key, msrp_key in [("ListPrice", "MSRP"), ("listPrice", "msrp")]:
+            for price in find_dicts(product, list_key, msrp_key):
+                current = format_price(price[list_key])
+                if current:
+                    return current, format_price(price[msrp_key]) or current
+    return None
+
+
+def extract_nintendo_prices(data, product_id: str) -> Optional[tuple[str, str]]:
+    # graph API: {"urlKey": "...-switch", "prices": {"minimum": {"finalPrice": 187.12, "regularPrice": 249.5}}}
+    for product in find_product_dicts(data, product_id):
+        for price in find_dicts(product, "finalPrice", "regularPrice"):
+            current = format_price(price["finalPrice"])
+            if current:
+                return current, format_price(price["regularPrice"]) or current
+    # price API: {"prices": [{"title_id": 70010000012345, "regular_price": {"raw_value": "249.50"}, ...}]}
+    # it's keyed by the numeric title id, not in the link, so only a response with one price is read
+    prices = list(find_dicts(data, "regular_price"))
+    if len(prices) == 1:
+        base = format_price((prices[0]["regular_price"] or {}).get("raw_value"))
+        if base:
+            current = format_price((prices[0].get("discount_price") or {}).get("raw_value"))
+            return current or base, base
+    return None
+
+
+STORE_EXTRACTORS = {
+    "psn": extract_psn_prices,
+    "xbox": extract_xbox_prices,
+    "nintendo": extract_nintendo_prices,
+}
+
+
+def read_response_json(driver, request_id: str):
+    """Return the JSON body of a response, None if it can't be read or is not JSON."""
+    try:
+        response = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+        body = response.get("body", "")
+        if response.get("base64Encoded"):
+            body = base64.b64decode(body).decode("utf-8", "replace")
+        return json.loads(body)
+    except Exception:
+        return None
+
+
+def capture_prices(driver, store: str, link: str, product_id: str,
+                   timeout: float = CAPTURE_TIMEOUT) -> Optional[tuple[str, str]]:
+    """
+    Navigate driver to link and return the (current, base) prices of the product product_id in the
+    first store API response with its price, stopping the page load. Returns None if none arrives
+    within timeout, with the page left loading.
+    """
+    url_pattern = STORE_API_PATTERNS[store]
+    extract = STORE_EXTRACTORS[store]
+
+    with fetch_timing.span("capture") as capture_span:
+        # drop the events of the previous pages
+        driver.get_log("performance")
+        with fetch_timing.span("driver_get"):
+            driver.execute_script("window.location.href = arguments[0];", link)
+
+        capture_deadline = time.monotonic() + fetch_budget.get_timeout(timeout)
+        api_requests = set()
+        while time.monotonic() < capture_deadline:
+            for entry in driver.get_log("performance"):
+                message = json.loads(entry["message"])["message"]
+                params = message.get("params", {})
+                if message.get("method") == "Network.responseReceived":
+                    if url_pattern.search(params.get("response", {}).get("url", "")):
+                        api_requests.add(params.get("requestId"))
+                elif message.get("method") == "Network.loadingFinished" and params.get("requestId") in api_requests:
+                    prices = extract(read_response_json(driver, params["requestId"]), product_id)
+                    if prices:
+                        driver.execute_script("window.stop();")
+                        return prices
+            time.sleep(POLL_INTERVAL)
+
+        fetch_timing.set_outcome(capture_span, "no_price_response")
+        return None
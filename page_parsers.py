@@ -0,0 +1,309 @@
+# Offline parsers of the store pages. They read the prices from the HTML of a page, the
+# driver.page_source of a loaded page or the body of an HTTP response, with no live browser handle,
+# so they can run anywhere and be checked against stored pages:
+#
+#   html = Path("steam_app.html").read_text()
+#   page_parsers.parse_steam_page(html, "https://store.steampowered.com/app/1259420/")
+#
+# Each parser returns the same fields as the execute_script extraction of the store (see
+# current_prices.py and current_prices_consoles.py), and read_page picks one or the other with
+# PAGE_PARSER. Pages are parsed with html.parser and a small CSS selector matcher (tags, classes,
+# ids and descendants), so no extra package is needed.
+#
+# read_page_prices makes a pipeline of the fetch and the parse: the page source is read once and
+# handed to a pool of PARSE_WORKERS threads, and the fetcher gets a Future of the prices back, so
+# the driver can load the next page while the previous one is parsed. The scheduler gives the
+# driver back to the pool before waiting for the prices (see refresh_scheduler.py).
+import contextvars
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from html.parser import HTMLParser
+from typing import Callable, Optional
+from urllib.parse import urljoin
+
+import fetch_timing
+
+# ...
+
+# How the prices are read from a loaded page: "script" runs one execute_script call in the page,
+# "page_source" reads driver.page_source once and parses it in a parse worker, so the parse makes
+# no chromedriver round trips at all and doesn't hold the driver
+PAGE_PARSER = "page_source"
+
+# Threads that parse the page sources
+PARSE_WORKERS = 4
+
+# Elements without a closing tag
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param",
+                 "source", "track", "wbr"}
+
+# Elements whose text is not shown on the page
+HIDDEN_TEXT_ELEMENTS = {"script", "style", "template", "noscript"}
+
+SELECTOR_PART_PATTERN = re.compile(r"^(?P<tag>[a-zA-Z][\w-]*)?(?P<rest>(?:[.#][\w-]+)*)$")
+
+_parse_executor = None
+_parse_executor_lock = threading.Lock()
+
+
+class Element:
+    """An element of a parsed page."""
+
+    def __init__(self, tag: str, attrs: dict, parent: Optional["Element"] = None):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []  # Elements and text strings
+        self.classes = set((attrs.get("class") or "").split())
+
+    def iter(self):
+        """Iterate over the descendant elements, in document order."""
+        for child in self.children:
+            if isinstance(child, Element):
+                yield child
+                yield from child.iter()
+
+    def get_text(self, separator: str = " ") -> str:
+        """Return the visible text of the element, its text pieces joined with separator."""
+        pieces = []
+
+        def add_text(element):
+            if element.tag in HIDDEN_TEXT_ELEMENTS:
+                return
+            for child in element.children:
+                if isinstance(child, Element):
+                    add_text(child)
+                elif child.strip():
+                    pieces.append(" ".join(child.split()))
+
+        add_text(self)
+        return separator.join(pieces)
+
+    def get(self, name: str) -> Optional[str]:
+        return self.attrs.get(name)
+
+    def select(self, selector: str) -> list:
+        """Return the descendants that match a CSS selector like "div.price span#final"."""
+        parts = [parse_selector_part(part) for part in selector.split()]
+        return [element for element in self.iter() if element.matches_path(parts)]
+
+    def select_one(self, selector: str) -> Optional["Element"]:
+        elements = self.select(selector)
+        return elements[0] if elements else None
+
+    def matches(self, part: tuple) -> bool:
+        tag, classes, element_id = part
+        return ((not tag or self.tag == tag) and classes <= self.classes
+                and (not element_id or self.attrs.get("id") == element_id))
+
+    def matches_path(self, parts: list) -> bool:
+        """Check if the element matches the last part and its ancestors match the others, in order."""
+        if not self.matches(parts[-1]):
+            return False
+
+        remaining_parts = parts[:-1]
+        ancestor = self.parent
+        while remaining_parts and ancestor is not None:
+            if ancestor.matches(remaining_parts[-1]):
+                remaining_parts = remaining_parts[:-1]
+            ancestor = ancestor.parent
+        return not remaining_parts
+
+
+def parse_selector_part(part: str) -> tuple:
+    """Split a compound selector like "span.price.final" into (tag, {classes}, id)."""
+    match = SELECTOR_PART_PATTERN.match(part)
+    if not match:
+        raise ValueError(f"Unsupported selector: {part}")
+
+    tag = (match.group("tag") or "").lower()
+    classes = set()
+    element_id = None
+    for prefix, name in re.findall(r"([.#])([\w-]+)", match.group("rest")):
+        if prefix == ".":
+            classes.add(name)
+        else:
+            element_id = name
+    return tag, classes, element_id
+
+
+class TreeBuilder(HTMLParser):
+    """Builds the Element tree of a page, closing the elements left open like a browser would."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Element("#document", {})
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        element = Element(tag, {name: value or "" for name, value in attrs}, self.current)
+        self.current.children.append(element)
+        if tag not in VOID_ELEMENTS:
+            self.current = element
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(Element(tag, {name: value or "" for name, value in attrs}, self.current))
+
+    def handle_endtag(self, tag):
+        # close up to the matching open element, ignore stray end tags
+        element = self.current
+        while element is not self.root and element.tag != tag:
+            element = element.parent
+        if element is not self.root:
+            self.current = element.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse_html(html: str) -> Element:
+    """Parse a page into an Element tree, returning its root."""
+    builder = TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def read_page(driver, script: str, parse_page: Callable, *args):
+    """
+    Read the prices of the page loaded in driver: with execute_script(script, *args), or with
+    parse_page(page_source, url, *args) when PAGE_PARSER is "page_source".
+    """
+    if PAGE_PARSER == "page_source":
+        return parse_page(driver.page_source, driver.current_url, *args)
+    return driver.execute_script(script, *args)
+
+
+def get_parse_executor() -> ThreadPoolExecutor:
+    """Return the pool of parse workers, started on first use."""
+    global _parse_executor
+    with _parse_executor_lock:
+        if _parse_executor is None:
+            _parse_executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix="page_parser")
+        return _parse_executor
+
+
+def is_pipelined() -> bool:
+    """Check if read_page_prices hands the pages to the parse workers."""
+    return PAGE_PARSER == "page_source"
+
+
+def read_page_prices(driver, script: str, parse_page: Callable, get_prices: Callable, *args):
+    """
+    Return get_prices(page_prices, parse_span) for the page loaded in driver, reading it like
+    read_page. When PAGE_PARSER is "page_source" only the page source is read here, and a Future of
+    the prices is returned while a parse worker parses it (see wait_prices).
+    """
+    if not is_pipelined():
+        with fetch_timing.span("parse") as parse_span:
+            return get_prices(driver.execute_script(script, *args), parse_span)
+
+    with fetch_timing.span("page_source"):
+        html = driver.page_source
+        url = driver.current_url
+    # the parse runs in a copy of this context, to keep the timing tags of the fetch
+    return get_parse_executor().submit(contextvars.copy_context().run, parse_prices,
+                                       html, url, parse_page, get_prices, *args)
+
+
+def parse_prices(html: str, url: str, parse_page: Callable, get_prices: Callable, *args):
+    with fetch_timing.span("parse") as parse_span:
+        return get_prices(parse_page(html, url, *args), parse_span)
+
+
+def map_prices(prices, function: Callable):
+    """Return function(prices), or a Future of it when prices is a Future of read_page_prices."""
+    if not isinstance(prices, Future):
+        return function(prices)
+
+    mapped_prices = Future()
+
+    def set_mapped_prices(future: Future):
+        try:
+            mapped_prices.set_result(function(future.result()))
+        except Exception as e:
+            mapped_prices.set_exception(e)
+
+    prices.add_done_callback(set_mapped_prices)
+    return mapped_prices
+
+
+def wait_prices(prices):
+    """Return the prices of read_page_prices, waiting for the parse worker when they are a Future."""
+    return prices.result() if isinstance(prices, Future) else prices
+
+
+def parse_steam_page(html: str, url: str = "") -> dict:
+    """
+    Return the prices of the first purchase area of a Steam page with a price, to skip DLCs and
+    bundles, and whether the game is marked as coming soon (it has no prices then).
+    """
+    page = parse_html(html)
+    prices = {"coming_soon": page.select_one(".game_area_comingsoon") is not None,
+              "found": False, "current": "", "base": ""}
+
+    for area in page.select(".game_purchase_action_bg"):
+        final_price = area.select_one(".discount_final_price")
+        price = final_price or area.select_one(".game_purchase_price")
+        if not price:
+            continue
+        prices["found"] = True
+        prices["current"] = price.get_text()
+        # only discounted games have an original price
+        if final_price:
+            prices["base"] = (area.select_one(".discount_original_price") or final_price).get_text()
+        else:
+            prices["base"] = prices["current"]
+        break
+
+    return prices
+
+
+def parse_gog_page(html: str, url: str = "") -> dict:
+    """Return the final and base prices of a GOG page, the base price is the final price without a discount."""
+    page = parse_html(html)
+    current = page.select_one(".product-actions-price__final-amount")
+    base = page.select_one(".product-actions-price__base-amount")
+
+    current_text = current.get_text() if current else ""
+    return {"found": current is not None, "current": current_text,
+            "base": base.get_text() if base else current_text}
+
+
+def parse_itad_rows(html: str, url: str = "") -> list:
+    """Return the text and absolute link of the Steam and GOG rows of an IsThereAnyDeal game page."""
+    rows = []
+    for row in parse_html(html).select(".row"):
+        text = row.get_text("\n")
+        if text.startswith("Steam\n") or text.startswith("GOG\n"):
+            link = row.get("href")
+            rows.append({"text": text, "link": urljoin(url, link) if link else link})
+    return rows
+
+
+def parse_psn_page(html: str, url: str = "") -> Optional[dict]:
+    """Return the texts of the price elements of the PSN price card, None if there is no price card."""
+    card = parse_html(html).select_one(".psw-c-bg-card-1")
+    if not card:
+        return None
+    return {"new_prices": [element.get_text() for element in card.select("span.psw-t-title-m")],
+            "base_prices": [element.get_text() for element in card.select("span.psw-t-title-s")]}
+
+
+def parse_site_page(html: str, url: str, new_price_selector: str, base_price_selector: str,
+                    price_card_selector: str = "") -> Optional[dict]:
+    """
+    Return the texts of the new and base price elements of a page, inside the price card when a
+    price card selector is given. The base price is the new price without a discount, and None is
+    returned when there is no new price element.
+    """
+    parent = parse_html(html)
+    if price_card_selector:
+        parent = parent.select_one(price_card_selector)
+
+    new_price = parent.select_one(new_price_selector) if parent else None
+    if not new_price:
+        return None
+    base_price = parent.select_one(base_price_selector) or new_price
+    return {"new_price": new_price.get_text(), "base_price": base_price.get_text()}
@@ -0,0 +1,183 @@
+# On-disk cache of the last fetched prices, so the price windows can be filled instantly on open
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import app_data
+import price_metrics
+
+# ...
+
+PC_CACHE_PATH = app_data.DATA_DIR / "pc_price_cache.json"
+CONSOLE_CACHE_PATH = app_data.DATA_DIR / "console_price_cache.json"
+
+# Seconds a cached store price is considered fresh. Prices that have not changed in a while get a
+# longer freshness budget, up to PRICE_CACHE_MAX_TTL
+PRICE_CACHE_TTL = 6 * 60 * 60
+PRICE_CACHE_MAX_TTL = 24 * 60 * 60
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+class PriceCache:
+    """
+    Prices shown in a price window, keyed by game and store. Each store entry keeps the time it
+    was fetched, so only the expired entries need to be fetched again.
+
+    The file has the format {game_name: {store: {"current", "base", "link", "fetched_at", ...}}},
+    where store is a key of the game data dict shown in the UI ("steam", "gog", "psn", ...). Each
+    store entry also keeps when it was first fetched, when its price last changed and how many
+    times it changed. Non-store values of the game data (e.g. "is_there_any_deal_link") are kept
+    as they are.
+    """
+
+    def __init__(self, path: Path, ttl: float = PRICE_CACHE_TTL, max_ttl: float = PRICE_CACHE_MAX_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_ttl = max(ttl, max_ttl)
+        self.games = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Load the cache file, starting empty if it does not exist or is corrupted."""
+        try:
+            with open(self.path, "r") as json_file:
+                self.games = json.load(json_file)
+        except (FileNotFoundError, ValueError):
+            self.games = {}
+
+    def replace_games(self, games: dict):
+        """Replace the cached prices, e.g. with the prices of the price server."""
+        with self._lock:
+            self.games = games
+
+    def save(self):
+        """Write the cache to disk."""
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = self.path.with_suffix(".tmp")
+                with open(temp_path, "w") as json_file:
+                    json.dump(self.games, json_file, indent=4)
+                temp_path.replace(self.path)
+            except OSError as e:
+                print(f"Error saving price cache {self.path}: {e}")
+
+    def get_game_data(self, game_name: str) -> Optional[dict]:
+        """Return the cached game data in the format shown in the UI, or None if not cached."""
+        return self.games.get(game_name)
+
+    def update_game_data(self, game_name: str, game_data: dict, fetched_at: float = None,
+                         stores: Optional[set] = None):
+        """
+        Store freshly fetched game data. Only the stores in `stores` are updated, when given. Store
+        entries with an "error" key keep their previous cached value, so a failed fetch does not
+        overwrite a good price.
+        """
+        fetched_at = fetched_at or time.time()
+
+        with self._lock:
+            cached_data = self.games.setdefault(game_name, {})
+            for key, value in game_data.items():
+                if not isinstance(value, dict):
+                    cached_data[key] = value
+                    continue
+                if stores is not None and key not in stores:
+                    continue
+                if "error" in value and key in cached_data:
+                    continue
+
+                previous_entry = cached_data.get(key) or {}
+                price_changed = (not previous_entry
+                                 or previous_entry.get("current") != value.get("current")
+                                 or previous_entry.get("base") != value.get("base"))
+
+                cached_data[key] = dict(
+                    value,
+                    fetched_at=fetched_at,
+                    first_fetched_at=previous_entry.get("first_fetched_at", fetched_at),
+                    changed_at=fetched_at if price_changed else previous_entry.get("changed_at", fetched_at),
+                    changes=previous_entry.get("changes", 0) + (1 if price_changed and previous_entry else 0)
+                )
+
+    def get_freshness_budget(self, store_entry: dict) -> float:
+        """
+        Seconds a store entry stays fresh: the TTL, stretched to half the time the price has been
+        stable, up to the max TTL.
+        """
+        stable_for = store_entry.get("fetched_at", 0) - store_entry.get("changed_at", store_entry.get("fetched_at", 0))
+        return min(max(self.ttl, stable_for / 2), self.max_ttl)
+
+    def is_store_expired(self, store_entry: dict, now: float = None) -> bool:
+        """Check if a cached store entry is past its freshness budget or failed."""
+        now = now or time.time()
+        return ("error" in store_entry
+                or now - store_entry.get("fetched_at", 0) > self.get_freshness_budget(store_entry))
+
+    def get_expired_stores(self, game_name: str, now: float = None) -> Optional[list]:
+        """Return the expired stores of a game, or None if the game is not cached at all."""
+        now = now or time.time()
+        cached_data = self.games.get(game_name)
+        store_entries = {key: value for key, value in (cached_data or {}).items() if isinstance(value, dict)}
+        if not store_entries:
+            return None
+
+        return [store for store, entry in store_entries.items() if self.is_store_expired(entry, now)]
+
+    def get_change_rate(self, game_name: str, now: float = None) -> float:
+        """Return the highest number of price changes per day among the stores of a game."""
+        now = now or time.time()
+        change_rates = [0.0]
+        for value in self.games.get(game_name, {}).values():
+            if isinstance(value, dict):
+                observed_days = max(1.0, (now - value.get("first_fetched_at", now)) / DAY_SECONDS)
+                change_rates.append(value.get("changes", 0) / observed_days)
+        return max(change_rates)
+
+    def is_expired(self, game_name: str, now: float = None) -> bool:
+        """Check if a game is not cached or any of its store prices is past its freshness budget."""
+        expired_stores = self.get_expired_stores(game_name, now)
+        return expired_stores is None or bool(expired_stores)
+
+    def get_expired_games(self, game_names: list, by_priority: bool = False) -> list:
+        """
+        Return the games that must be fetched again, keeping the given order. With by_priority,
+        games not cached yet come first, then the games whose prices change most often.
+        """
+        now = time.time()
+        expired_games = []
+        for game_name in game_names:
+            expired = self.is_expired(game_name, now)
+            price_metrics.count_cache_lookup(self.path.stem, hit=not expired)
+            if expired:
+                expired_games.append(game_name)
+
+        if by_priority:
+            expired_games.sort(key=lambda game_name: (game_name in self.games,
+                                                      -self.get_change_rate(game_name, now)))
+        return expired_games
+
+    def get_games_by_priority(self, game_names: list) -> list:
+        """
+        Return the games ordered by how much they need to be fetched again, for a quick refresh:
+        games not cached yet, then the expired games, then the fresh games fetched the longest ago.
+        Games whose prices change most often come first within each group.
+        """
+        now = time.time()
+
+        def get_priority(game_name):
+            fetched_at = [value.get("fetched_at", 0) for value in self.games.get(game_name, {}).values()
+                          if isinstance(value, dict)]
+            return (game_name in self.games, not self.is_expired(game_name, now),
+                    -self.get_change_rate(game_name, now), min(fetched_at, default=0))
+
+        return sorted(game_names, key=get_priority)
+
+    def remove_missing_games(self, game_names: list):
+        """Drop the cached games that are no longer in the games to check."""
+        with self._lock:
+            for game_name in set(self.games) - set(game_names):
+                del self.games[game_name]
@@ -0,0 +1,119 @@
+# Client of the local price server (price_server.py). It only uses the standard library, so it
+# can be imported by the UIs and by scripts without loading selenium
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import app_data
+
+# ...
+
+PRICE_SERVER_HOST = "127.0.0.1"
+PRICE_SERVER_PORT = 8765
+PRICE_SERVER_URL = f"http://{PRICE_SERVER_HOST}:{PRICE_SERVER_PORT}"
+
+THIS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+PRICE_SERVER_SCRIPT = os.path.join(THIS_FOLDER, "price_server.py")
+
+# Seconds to wait for a server started by ensure_server_running
+SERVER_START_TIMEOUT = 10
+
+# File in the user data folder with the token of the running server, sent with every POST so
+# only the local user can start refreshes or stop the server, not any web page in a browser
+PRICE_SERVER_TOKEN_NAME = "price_server.token"
+PRICE_SERVER_TOKEN_HEADER = "X-Price-Server-Token"
+
+
+def get_token_path():
+    return app_data.DATA_DIR / PRICE_SERVER_TOKEN_NAME
+
+
+def read_token() -> str:
+    """Return the token of the running server, an empty string if there is none."""
+    try:
+        return get_token_path().read_text().strip()
+    except OSError:
+        return ""
+
+
+def request_json(path: str, data: dict = None, timeout: float = 5):
+    """Send a GET (or a POST, if data is given) to the price server and return the JSON response."""
+    body = json.dumps(data).encode("utf-8") if data is not None else None
+    headers = {"Content-Type": "application/json"}
+    if body is not None:
+        headers[PRICE_SERVER_TOKEN_HEADER] = read_token()
+    request = urllib.request.Request(f"{PRICE_SERVER_URL}{path}", data=body, headers=headers)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def is_server_running(timeout: float = 0.3) -> bool:
+    """Check if the price server answers on localhost."""
+    try:
+        return request_json("/status", timeout=timeout).get("ok", False)
+    except Exception:
+        return False
+
+
+def ensure_server_running() -> bool:
+    """
+    Start the price server in the background if it is not running yet. Returns whether it is
+    running. Frozen executables can't start the script, so they only use an already running server.
+    """
+    if is_server_running():
+        return True
+    if getattr(sys, 'frozen', False) or not os.path.exists(PRICE_SERVER_SCRIPT):
+        return False
+
+    popen_kwargs = {"stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+    if sys.platform == "win32":
+        popen_kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        popen_kwargs["start_new_session"] = True
+
+    try:
+        subprocess.Popen([sys.executable, PRICE_SERVER_SCRIPT], **popen_kwargs)
+    except OSError as e:
+        print(f"Error starting the price server: {e}")
+        return False
+
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if is_server_running():
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def get_prices(kind: str) -> dict:
+    """Return the cached prices of the server, {game_name: game_data}, for "pc" or "console"."""
+    return request_json(f"/prices?kind={kind}")
+
+
+def start_refresh(kind: str, only_expired: bool = False, time_budget: float = None, game_names: list = None) -> dict:
+    """
+    Ask the server to refresh the "pc" or "console" prices, only of game_names when given. The
+    response has "started": False if a refresh of kind is already running, nothing is started then.
+    With a time_budget, in seconds, the games that most need it are fetched first until it runs out.
+    """
+    return request_json("/refresh", {"kind": kind, "only_expired": only_expired, "time_budget": time_budget,
+                                     "game_names": game_names})
+
+
+def open_event_stream(timeout: float = None):
+    """
+    Subscribe to the server events. Open the stream before starting a refresh so no event is
+    missed, then read it with read_events.
+    """
+    return urllib.request.urlopen(f"{PRICE_SERVER_URL}/events", timeout=timeout)
+
+
+def read_events(stream):
+    """Yield the events of an event stream as dicts, e.g. {"type": "price", "kind": "pc", ...}."""
+    for line in stream:
+        line = line.decode("utf-8").strip()
+        if line.startswith("data:"):
+            yield json.loads(line[len("data:"):])
@@ -0,0 +1,140 @@
+# SQLite history of every price quote fetched by the price workers
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import app_data
+
+# ...
+
+HISTORY_DB_PATH = app_data.DATA_DIR / "price_history.db"
+
+# Number of quotes buffered before they are written in a single transaction
+HISTORY_BATCH_SIZE = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quotes (
+    id INTEGER PRIMARY KEY,
+    game TEXT NOT NULL,
+    store TEXT NOT NULL,
+    current REAL NOT NULL,
+    base REAL NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_quotes_game_store_time ON quotes (game, store, fetched_at);
+"""
+
+
+class PriceHistory:
+    """
+    Price quotes stored in an SQLite database in WAL mode. Quotes are buffered and written in
+    batched transactions, and the (game, store, fetched_at) index keeps the per-game queries
+    independent of the size of the table.
+    """
+
+    def __init__(self, path: Path = HISTORY_DB_PATH, batch_size: int = HISTORY_BATCH_SIZE):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self._pending_quotes = []
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # the workers write from their own threads, access is serialized with the lock
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def add_quote(self, game: str, store: str, current: float, base: float, fetched_at: float = None):
+        """Buffer a quote, writing the buffer when it reaches the batch size."""
+        with self._lock:
+            self._pending_quotes.append((game, store, current, base, fetched_at or time.time()))
+            if len(self._pending_quotes) >= self.batch_size:
+                self._write_pending_quotes()
+
+    def record_game_data(self, game_name: str, game_data: dict, fetched_at: float = None):
+        """
+        Buffer the store prices of a game data dict as shown in the UI ({"steam": {...}, ...}).
+        Stores without a link and failed fetches, with an error or a page without a price
+        ("no_price"), are skipped. 0.0 prices of free games and 100% discounts are recorded.
+        """
+        fetched_at = fetched_at or time.time()
+        for store, store_data in game_data.items():
+            if not isinstance(store_data, dict) or not store_data.get("link"):
+                continue
+            if "error" in store_data or store_data.get("no_price"):
+                continue
+            current = store_data.get("current") or 0.0
+            self.add_quote(game_name, store, current, store_data.get("base") or current, fetched_at)
+
+    def flush(self):
+        """Write every buffered quote."""
+        with self._lock:
+            self._write_pending_quotes()
+
+    def _write_pending_quotes(self):
+        if not self._pending_quotes:
+            return
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO quotes (game, store, current, base, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                self._pending_quotes
+            )
+        self._pending_quotes = []
+
+    def close(self):
+        """Write the buffered quotes and close the database."""
+        self.flush()
+        self.connection.close()
+
+    def _query_one(self, query: str, params: tuple) -> Optional[tuple]:
+        with self._lock:
+            return self.connection.execute(query, params).fetchone()
+
+    def get_latest_quote(self, game: str, store: str) -> Optional[tuple]:
+        """Return the (current, base, fetched_at) of the last quote of a game on a store."""
+        return self._query_one(
+            "SELECT current, base, fetched_at FROM quotes WHERE game = ? AND store = ? "
+            "ORDER BY fetched_at DESC LIMIT 1",
+            (game, store)
+        )
+
+    def get_historical_low(self, game: str, store: str) -> Optional[tuple]:
+        """Return the (current, fetched_at) of the lowest price seen for a game on a store."""
+        return self._query_one(
+            "SELECT current, fetched_at FROM quotes WHERE game = ? AND store = ? "
+            "ORDER BY current ASC, fetched_at DESC LIMIT 1",
+            (game, store)
+        )
+
+    def get_price_at(self, game: str, store: str, timestamp: float) -> Optional[tuple]:
+        """Return the (current, base, fetched_at) of the last quote at or before a timestamp."""
+        return self._query_one(
+            "SELECT current, base, fetched_at FROM quotes WHERE game = ? AND store = ? "
+            "AND fetched_at <= ? ORDER BY fetched_at DESC LIMIT 1",
+            (game, store, timestamp)
+        )
+
+    def get_last_change(self, game: str, store: str) -> Optional[tuple]:
+        """
+        Return the (current, fetched_at) of the first quote with the current price, i.e. when the
+        price last changed. Returns the first quote ever if the price never changed.
+        """
+        latest_quote = self.get_latest_quote(game, store)
+        if not latest_quote:
+            return None
+
+        previous_price = self._query_one(
+            "SELECT fetched_at FROM quotes WHERE game = ? AND store = ? AND current != ? "
+            "ORDER BY fetched_at DESC LIMIT 1",
+            (game, store, latest_quote[0])
+        )
+        since = previous_price[0] if previous_price else float("-inf")
+
+        return self._query_one(
+            "SELECT current, fetched_at FROM quotes WHERE game = ? AND store = ? AND fetched_at > ? "
+            "ORDER BY fetched_at ASC LIMIT 1",
+            (game, store, since)
+        )
@@ -0,0 +1,288 @@
+# Prometheus-style metrics of the refresh pipeline: fetches and failures per store, WebDriverWait
+# timeouts, retries and circuit breakers, cache hits and misses, run durations and live Chrome
+# drivers. They are served in the Prometheus text format on localhost, so any standard scraper can
+# read them:
+#
+#   FETCH_METRICS_PORT=9465 python main_ui.py
+#   curl http://127.0.0.1:9465/metrics
+#
+# The per-store metrics are built from the fetch_timing spans, so starting the metrics server
+# also starts measuring the spans. It only uses the standard library.
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import fetch_timing
+
+# ...
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9465
+
+# Environment variable with the port to serve the metrics on, the server is off when it's not set
+METRICS_PORT_ENV = "FETCH_METRICS_PORT"
+
+# Same for the price server, which runs in its own process and so needs its own port
+SERVER_METRICS_PORT_ENV = "FETCH_SERVER_METRICS_PORT"
+
+METRIC_PREFIX = "fetch_games_prices"
+
+# Upper bounds, in seconds, of the duration histogram buckets
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1800)
+
+# Span stages whose errors count as failures: a whole store fetch, a whole game or an HTTP request
+FAILURE_STAGES = ["fetch", "game", "http_request"]
+
+# Span stages that block in a WebDriverWait
+WAIT_STAGES = ["wait_page", "age_gate", "link"]
+
+
+def format_labels(labelnames: tuple, labelvalues: tuple, extra: str = "") -> str:
+    labels = [f'{name}="{escape_label(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base of the metric types, a value per combination of label values."""
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = f"{METRIC_PREFIX}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get_key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.get_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self.get_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.get_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 buckets: tuple = DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self.get_key(labels)
+        with self._lock:
+            bucket_counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    bucket_counts[index] += 1
+            self._values[key] = (bucket_counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            values = {key: (list(bucket_counts), total) for key, (bucket_counts, total) in self._values.items()}
+        for key, (bucket_counts, total) in sorted(values.items()):
+            for upper_bound, count in zip(self.buckets, bucket_counts):
+                bucket_label = f'le="{format_value(float(upper_bound))}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, bucket_label)} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {bucket_counts[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics served by the metrics server."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+FETCHES = REGISTRY.register(Counter(
+    "fetches_total", "Store price fetches, by store and outcome.", ("store", "outcome")))
+FAILURES = REGISTRY.register(Counter(
+    "failures_total", "Failed fetches, games and HTTP requests, by error type.", ("store", "stage", "type")))
+WAIT_TIMEOUTS = REGISTRY.register(Counter(
+    "wait_timeouts_total", "WebDriverWait timeouts, by store and stage.", ("store", "stage")))
+FETCH_DURATION = REGISTRY.register(Histogram(
+    "fetch_duration_seconds", "Duration of a store price fetch.", ("store",)))
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "stage_duration_seconds", "Duration of each fetch stage.", ("store", "stage")))
+LINK_FETCHES = REGISTRY.register(Counter(
+    "store_link_fetches_total", "Store links resolved from IsThereAnyDeal, by store and outcome.",
+    ("store", "outcome")))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "cache_lookups_total", "Cache lookups, by cache and result (hit or miss).", ("cache", "result")))
+RUN_DURATION = REGISTRY.register(Histogram(
+    "run_duration_seconds", "Duration of a whole refresh run.", ("kind", "worker")))
+LIVE_DRIVERS = REGISTRY.register(Gauge(
+    "chrome_drivers", "Chrome drivers currently running."))
+CIRCUIT_OPEN = REGISTRY.register(Gauge(
+    "circuit_open", "1 while the circuit breaker of a store is open.", ("store",)))
+STORE_SKIPS = REGISTRY.register(Counter(
+    "store_skips_total", "Fetches skipped because the circuit breaker of the store was open.", ("store",)))
+RETRIES = REGISTRY.register(Counter(
+    "retries_total", "Fetches retried after a transient error.", ("store",)))
+
+
+def count_cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class MetricsSink:
+    """fetch_timing sink that turns the spans into the per-store metrics."""
+
+    def emit(self, span: fetch_timing.Span):
+        store = span.tags.get("store", "")
+        outcome = span.outcome
+        if outcome == "error: StoreSkipped":
+            # the circuit breaker of the store is open, counted in STORE_SKIPS
+            outcome = "skipped"
+
+        if span.stage == "driver_start" and outcome == "ok":
+            LIVE_DRIVERS.inc()
+        elif span.stage == "driver_quit":
+            LIVE_DRIVERS.dec()
+        elif span.stage == "fetch":
+            # a batched request of the fetch engine covers several store links
+            FETCHES.inc(span.tags.get("links", 1), store=store, outcome=outcome.split(":")[0])
+            FETCH_DURATION.observe(span.duration, store=store)
+        elif span.stage == "link":
+            LINK_FETCHES.inc(store=store, outcome=outcome.split(":")[0])
+
+        STAGE_DURATION.observe(span.duration, store=store, stage=span.stage)
+
+        if outcome.startswith("error"):
+            error_type = outcome.partition(": ")[2] or "Exception"
+            if span.stage in FAILURE_STAGES:
+                FAILURES.inc(store=store, stage=span.stage, type=error_type)
+            if span.stage in WAIT_STAGES and error_type == "TimeoutException":
+                WAIT_TIMEOUTS.inc(store=store, stage=span.stage)
+
+    def close(self):
+        pass
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve the metrics on http://host:port/metrics from a background thread. Only one server is
+    started per process; returns None if the port is already in use.
+    """
+    global _metrics_server
+    with _metrics_server_lock:
+        if _metrics_server:
+            return _metrics_server
+
+        try:
+            server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        except OSError as e:
+            print(f"Error starting the metrics server on port {port}: {e}")
+            return None
+
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        fetch_timing.add_sink(MetricsSink())
+        _metrics_server = server
+        return server
+
+
+def get_metrics_port_from_env(env_name: str = METRICS_PORT_ENV) -> Optional[int]:
+    """Return the port set in the environment variable, or None if it's not set or invalid."""
+    try:
+        return int(os.environ[env_name])
+    except (KeyError, ValueError):
+        return None
+
+
+def start_metrics_server_from_env() -> Optional[ThreadingHTTPServer]:
+    """Start the metrics server if FETCH_METRICS_PORT is set."""
+    port = get_metrics_port_from_env()
+    return start_metrics_server(port) if port else None
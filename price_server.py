@@ -0,0 +1,360 @@
+# Local price server. A long-lived process that owns the fetchers, a pool of warm Chrome drivers
+# and the price caches, and serves prices to every window (or a cron job) over localhost HTTP.
+#
+# Endpoints:
+#   GET  /status                     server state
+#   GET  /prices?kind=pc|console     cached prices, {game_name: game_data}
+#   GET  /events                     server-sent events with the prices of the running refreshes
+#   POST /refresh                    {"kind": "pc"|"console", "only_expired": bool, "time_budget": seconds,
+#                                     "game_names": [...]}
+#   POST /shutdown                   stop the server
+#
+# The POST requests must be JSON, with the token the server writes to the user data folder on start
+# (see price_client.read_token), and can't come from a web page of another origin.
+#
+# While it runs, the server is the only writer of the price cache files, the price windows read
+# the prices with GET /prices and keep their own copy in memory only.
+import argparse
+import hmac
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import app_data
+import current_prices
+import current_prices_consoles
+import fetch_budget
+import price_cache
+import price_client
+import price_history
+import price_metrics
+import refresh_scheduler
+
+# ...
+
+# Seconds between keep-alive comments on the event streams
+EVENT_KEEPALIVE_INTERVAL = 15
+
+# The server stops itself, closing Chrome, after this many idle seconds (0 keeps it running)
+IDLE_TIMEOUT = 30 * 60
+
+
+class PriceService:
+    """Fetchers, warm drivers and caches shared by every client of the server."""
+
+    def __init__(self, max_drivers: int = current_prices.MAX_DRIVERS):
+        self.driver_pool = current_prices.ChromeDriverPool(max_drivers)
+        self.caches = {
+            "pc": price_cache.PriceCache(price_cache.PC_CACHE_PATH),
+            "console": price_cache.PriceCache(price_cache.CONSOLE_CACHE_PATH),
+        }
+        self.price_history = price_history.PriceHistory()
+        self.running_refreshes = set()
+        self.subscribers = []
+        self.last_activity = time.monotonic()
+        self._lock = threading.Lock()
+
+    def touch(self):
+        """Register client activity, for the idle timeout."""
+        self.last_activity = time.monotonic()
+
+    def is_idle(self, idle_timeout: float) -> bool:
+        with self._lock:
+            busy = bool(self.running_refreshes) or bool(self.subscribers)
+        return not busy and time.monotonic() - self.last_activity > idle_timeout
+
+    def subscribe(self) -> queue.Queue:
+        events = queue.Queue()
+        with self._lock:
+            self.subscribers.append(events)
+        return events
+
+    def unsubscribe(self, events: queue.Queue):
+        with self._lock:
+            if events in self.subscribers:
+                self.subscribers.remove(events)
+        self.touch()
+
+    def publish(self, event: dict):
+        """Send an event to every subscriber."""
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for events in subscribers:
+            events.put(event)
+
+    def get_status(self) -> dict:
+        with self._lock:
+            return {
+                "ok": True,
+                "running_refreshes": sorted(self.running_refreshes),
+                "subscribers": len(self.subscribers),
+            }
+
+    def get_prices(self, kind: str) -> dict:
+        return dict(self.caches[kind].games)
+
+    def start_refresh(self, kind: str, only_expired: bool = False, time_budget: float = None,
+                      game_names: list = None) -> bool:
+        """Start a refresh in the background. Returns False if one is already running for kind."""
+        with self._lock:
+            if kind in self.running_refreshes:
+                return False
+            self.running_refreshes.add(kind)
+
+        threading.Thread(target=self.run_refresh, args=(kind, only_expired, time_budget, game_names),
+                         daemon=True).start()
+        return True
+
+    def run_refresh(self, kind: str, only_expired: bool, time_budget: float = None, game_names: list = None):
+        """
+        Refresh the prices of kind, only of game_names, in their order, when given. With a
+        time_budget, in seconds, the games that most need it are fetched first, and the games not
+        started when it runs out keep their cached prices.
+        """
+        with fetch_budget.deadline(time_budget):
+            self.run_refresh_games(kind, only_expired, bool(time_budget), game_names)
+
+    def run_refresh_games(self, kind: str, only_expired: bool, by_priority: bool, game_names: list = None):
+        run_start = time.perf_counter()
+        try:
+            cache = self.caches[kind]
+            if kind == "pc":
+                games_to_check = current_prices.update_games_to_check()
+            else:
+                games_to_check = current_prices_consoles.update_games_to_check()
+
+            cache.remove_missing_games(list(games_to_check))
+            if game_names is not None:
+                games_to_check = {game_name: games_to_check[game_name] for game_name in game_names
+                                  if game_name in games_to_check}
+            elif only_expired:
+                game_names = cache.get_expired_games(list(games_to_check), by_priority=True)
+                games_to_check = {game_name: games_to_check[game_name] for game_name in game_names}
+            elif by_priority:
+                game_names = cache.get_games_by_priority(list(games_to_check))
+                games_to_check = {game_name: games_to_check[game_name] for game_name in game_names}
+
+            total_games = len(games_to_check)
+            fetched_games = 0
+
+            def on_game_data(kind, game_name, game_data):
+                nonlocal fetched_games
+                fetched_games += 1
+                cache.update_game_data(game_name, game_data)
+                self.price_history.record_game_data(game_name, game_data)
+                self.publish({"type": "progress", "kind": kind,
+                              "message": f"Fetched prices for {game_name} ({fetched_games}/{total_games})..."})
+                self.publish({"type": "price", "kind": kind, "game_name": game_name, "game_data": game_data})
+
+            def on_error(kind, game_name, error):
+                self.publish({"type": "error", "kind": kind,
+                              "message": f"Error fetching prices for {game_name}: {error}"})
+
+            # the drivers are shared with the other refreshes of the server
+            scheduler = refresh_scheduler.RefreshScheduler(self.driver_pool)
+            if kind == "pc":
+                scheduler.add_pc_games(games_to_check)
+            else:
+                scheduler.add_console_games(games_to_check)
+            # the games not started before the deadline keep their cached prices
+            scheduler.run(on_game_data, on_error)
+
+            cache.save()
+            price_metrics.RUN_DURATION.observe(time.perf_counter() - run_start, kind=kind, worker="server")
+            self.publish({"type": "finished", "kind": kind})
+        except Exception as e:
+            self.publish({"type": "error", "kind": kind, "message": f"Critical error: {str(e)}"})
+            self.publish({"type": "finished", "kind": kind})
+        finally:
+            self.price_history.flush()
+            with self._lock:
+                self.running_refreshes.discard(kind)
+            self.touch()
+
+    def close(self):
+        self.driver_pool.close()
+        for cache in self.caches.values():
+            cache.save()
+        self.price_history.close()
+
+
+class PriceRequestHandler(BaseHTTPRequestHandler):
+    """HTTP interface of the PriceService set on the server."""
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def service(self) -> PriceService:
+        return self.server.service
+
+    def send_json(self, data, status: int = 200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def get_kind(self, kind: str):
+        if kind not in ("pc", "console"):
+            self.send_json({"error": f"Unknown kind: {kind}"}, 400)
+            return None
+        return kind
+
+    def do_GET(self):
+        self.service.touch()
+        url = urlsplit(self.path)
+
+        if url.path == "/status":
+            self.send_json(self.service.get_status())
+        elif url.path == "/prices":
+            kind = self.get_kind(parse_qs(url.query).get("kind", ["pc"])[0])
+            if kind:
+                self.send_json(self.service.get_prices(kind))
+        elif url.path == "/events":
+            self.stream_events()
+        else:
+            self.send_json({"error": "Not found"}, 404)
+
+    def is_post_allowed(self) -> bool:
+        """
+        Check that a POST is a JSON request of a local client: a web page can only send a form
+        content type without a preflight, it always sends its Origin, and it can't read the token.
+        """
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            return False
+
+        origin = self.headers.get("Origin")
+        if origin and origin not in self.server.allowed_origins:
+            return False
+
+        token = self.headers.get(price_client.PRICE_SERVER_TOKEN_HEADER, "")
+        return hmac.compare_digest(token.encode("utf-8"), self.server.token.encode("utf-8"))
+
+    def do_POST(self):
+        if not self.is_post_allowed():
+            self.send_json({"error": "Forbidden"}, 403)
+            return
+
+        self.service.touch()
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self.send_json({"error": "Invalid JSON"}, 400)
+            return
+
+        if url.path == "/refresh":
+            kind = self.get_kind(data.get("kind", "pc"))
+            game_names = data.get("game_names")
+            if game_names is not None and not (isinstance(game_names, list)
+                                               and all(isinstance(name, str) for name in game_names)):
+                self.send_json({"error": "game_names must be a list of game names"}, 400)
+            elif kind:
+                started = self.service.start_refresh(kind, bool(data.get("only_expired")), data.get("time_budget"),
+                                                     game_names)
+                self.send_json({"started": started, "running": True})
+        elif url.path == "/shutdown":
+            self.send_json({"ok": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self.send_json({"error": "Not found"}, 404)
+
+    def stream_events(self):
+        """Send the published events as server-sent events until the client disconnects."""
+        events = self.service.subscribe()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.flush()
+
+            while True:
+                try:
+                    event = events.get(timeout=EVENT_KEEPALIVE_INTERVAL)
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.service.unsubscribe(events)
+
+
+def write_token() -> str:
+    """Write a new random token to the token file, readable by the user only, and return it."""
+    token = secrets.token_urlsafe(32)
+    token_path = app_data.get_data_dir() / price_client.PRICE_SERVER_TOKEN_NAME
+    token_fd = os.open(token_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+    with os.fdopen(token_fd, "w") as token_file:
+        token_file.write(token)
+    return token
+
+
+def remove_token(token: str):
+    """Remove the token file, unless another server has written its own token since."""
+    if price_client.read_token() == token:
+        price_client.get_token_path().unlink(missing_ok=True)
+
+
+def run_server(host: str = price_client.PRICE_SERVER_HOST, port: int = price_client.PRICE_SERVER_PORT,
+               max_drivers: int = current_prices.MAX_DRIVERS, idle_timeout: float = IDLE_TIMEOUT,
+               metrics_port: int = None):
+    """
+    Serve prices until shut down, interrupted or idle for idle_timeout seconds. The refresh metrics
+    are served on metrics_port, when given.
+    """
+    if metrics_port:
+        price_metrics.start_metrics_server(metrics_port)
+
+    server = ThreadingHTTPServer((host, port), PriceRequestHandler)
+    server.daemon_threads = True
+    server.allowed_origins = {f"http://{host}:{port}", f"http://localhost:{port}", f"http://127.0.0.1:{port}"}
+    # written once the port is ours, so a server that failed to start doesn't replace the token
+    server.token = write_token()
+    server.service = PriceService(max_drivers)
+
+    def stop_when_idle():
+        while True:
+            time.sleep(min(60, idle_timeout))
+            if server.service.is_idle(idle_timeout):
+                server.shutdown()
+                return
+
+    if idle_timeout:
+        threading.Thread(target=stop_when_idle, daemon=True).start()
+
+    print(f"Price server listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.close()
+        remove_token(server.token)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local server that keeps the price fetchers warm.")
+    parser.add_argument("--host", default=price_client.PRICE_SERVER_HOST)
+    parser.add_argument("--port", type=int, default=price_client.PRICE_SERVER_PORT)
+    parser.add_argument("--max-drivers", type=int, default=current_prices.MAX_DRIVERS)
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT,
+                        help="seconds without clients before the server stops, 0 to run forever")
+    parser.add_argument("--metrics-port", type=int,
+                        default=price_metrics.get_metrics_port_from_env(price_metrics.SERVER_METRICS_PORT_ENV),
+                        help="serve Prometheus metrics on this port (default: $FETCH_SERVER_METRICS_PORT, off)")
+    args = parser.parse_args()
+
+    run_server(args.host, args.port, args.max_drivers, args.idle_timeout, args.metrics_port)
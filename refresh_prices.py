@@ -0,0 +1,197 @@
+# Headless command line refresh of the game prices, e.g. for a cron job:
+#
+#   python refresh_prices.py --games all --format csv --output prices.csv
+#
+# --deadline stops starting new games once the run has taken that many seconds, and --quick also
+# fetches the games that most need it first (not cached, expired, prices that change often).
+#
+# It does not import PyQt5, so it runs on servers without a display. Each record has a status: ok,
+# no_price (no current price, e.g. free or coming soon games) or error. The exit code is the number
+# of store prices that failed with an error (capped at 125), 0 when no fetch failed.
+import argparse
+import csv
+import json
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+import current_prices
+import current_prices_consoles
+import fetch_budget
+import fetch_engine
+import fetch_timing
+import price_cache
+import price_history
+import price_metrics
+import refresh_scheduler
+
+# ...
+
+OUTPUT_FORMATS = ["ndjson", "csv", "json"]
+CSV_FIELDS = ["kind", "game", "store", "current", "base", "link", "status", "error"]
+
+MAX_EXIT_CODE = 125
+
+# (kind, price cache path, function that reads the games to check) of the games to refresh
+GAME_KINDS = [
+    ("pc", price_cache.PC_CACHE_PATH, current_prices.update_games_to_check),
+    ("console", price_cache.CONSOLE_CACHE_PATH, current_prices_consoles.update_games_to_check),
+]
+
+
+class ResultWriter:
+    """Writes one record per game and store in NDJSON, CSV or JSON, counting the failures."""
+
+    def __init__(self, output_file, output_format: str):
+        self.output_file = output_file
+        self.output_format = output_format
+        self.records = []
+        self.failures = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+        if output_format == "csv":
+            self.csv_writer = csv.DictWriter(output_file, fieldnames=CSV_FIELDS)
+            self.csv_writer.writeheader()
+
+    def write_game_data(self, kind: str, game_name: str, game_data: dict):
+        """Write the store prices of a game data dict as shown in the UI."""
+        with self._lock:
+            for store, store_data in game_data.items():
+                if not isinstance(store_data, dict) or not (store_data.get("link") or store_data.get("error")):
+                    continue
+
+                record = {
+                    "kind": kind,
+                    "game": game_name,
+                    "store": store,
+                    "current": store_data.get("current", 0.0),
+                    "base": store_data.get("base", 0.0),
+                    "link": store_data.get("link"),
+                    "status": "ok",
+                    "error": store_data.get("error") or "",
+                }
+                if record["error"]:
+                    record["status"] = "error"
+                    self.failures += 1
+                elif not record["current"]:
+                    # free, coming soon or not sold in the region, the fetch itself worked
+                    record["status"] = "no_price"
+                self.write_record(record)
+
+    def write_error(self, kind: str, game_name: str, error: str):
+        """Write a record for a game that failed before any store was fetched."""
+        with self._lock:
+            self.failures += 1
+            self.write_record({"kind": kind, "game": game_name, "store": "", "current": 0.0,
+                               "base": 0.0, "link": "", "status": "error", "error": error})
+
+    def skip_game(self):
+        """Count a game not fetched because the run ran out of time, it's not a failure."""
+        with self._lock:
+            self.skipped += 1
+
+    def write_record(self, record: dict):
+        if self.output_format == "ndjson":
+            self.output_file.write(json.dumps(record) + "\n")
+            self.output_file.flush()
+        elif self.output_format == "csv":
+            self.csv_writer.writerow(record)
+            self.output_file.flush()
+        else:
+            self.records.append(record)
+
+    def close(self):
+        if self.output_format == "json":
+            json.dump(self.records, self.output_file, indent=4)
+            self.output_file.write("\n")
+        self.output_file.flush()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Refresh the game prices without the UI.")
+    parser.add_argument("--games", choices=["pc", "console", "all"], default="all",
+                        help="which games to refresh (default: all)")
+    parser.add_argument("--backend", choices=["http", "browser"], default=current_prices.PRICE_BACKEND,
+                        help="how the PC prices are fetched (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=current_prices.MAX_DRIVERS,
+                        help="Chrome drivers, and in-flight requests per store host (default: %(default)s)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="ndjson",
+                        help="output format (default: ndjson)")
+    parser.add_argument("--output", "-o", default="-", help="output file, - for stdout (default)")
+    parser.add_argument("--no-save", action="store_true",
+                        help="don't update the price cache and price history")
+    parser.add_argument("--timing-log", help="append the timing spans of every fetch stage to this file")
+    parser.add_argument("--deadline", type=float, metavar="SECONDS",
+                        help="don't start new games after this many seconds, they keep their cached prices")
+    parser.add_argument("--quick", type=float, metavar="SECONDS",
+                        help="like --deadline, fetching the games that most need it first")
+    args = parser.parse_args(argv)
+    time_budget = args.quick or args.deadline
+
+    if args.timing_log:
+        fetch_timing.add_sink(fetch_timing.LogFileSink(args.timing_log))
+
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    writer = ResultWriter(output_file, args.format)
+    history = None if args.no_save else price_history.PriceHistory()
+
+    run_start = time.perf_counter()
+    # PC and console games are fetched in one run, sharing the drivers
+    scheduler = refresh_scheduler.RefreshScheduler(
+        max_drivers=args.concurrency,
+        host_limits={host: args.concurrency for host in fetch_engine.HOST_LIMITS}
+    )
+    caches = {}
+
+    for kind, cache_path, load_games_to_check in GAME_KINDS:
+        if args.games not in (kind, "all"):
+            continue
+
+        # the games files print a warning when they don't exist yet, keep it out of the records
+        with redirect_stdout(sys.stderr):
+            games_to_check = load_games_to_check()
+        caches[kind] = price_cache.PriceCache(cache_path)
+        if args.quick:
+            game_names = caches[kind].get_games_by_priority(list(games_to_check))
+            games_to_check = {game_name: games_to_check[game_name] for game_name in game_names}
+
+        if kind == "pc":
+            scheduler.add_pc_games(games_to_check, args.backend)
+        else:
+            scheduler.add_console_games(games_to_check)
+
+    def on_game_data(kind, game_name, game_data):
+        writer.write_game_data(kind, game_name, game_data)
+        if not args.no_save:
+            caches[kind].update_game_data(game_name, game_data)
+        if history:
+            history.record_game_data(game_name, game_data)
+
+    def on_skip(kind, game_name):
+        writer.skip_game()
+
+    try:
+        # the fetch functions print their progress and errors, keep them out of the records
+        with fetch_budget.deadline(time_budget), redirect_stdout(sys.stderr):
+            scheduler.run(on_game_data, writer.write_error, on_skip)
+        if not args.no_save:
+            for cache in caches.values():
+                cache.save()
+        price_metrics.RUN_DURATION.observe(time.perf_counter() - run_start, kind=args.games, worker="cli")
+    finally:
+        writer.close()
+        if history:
+            history.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    print(f"{writer.failures} store price(s) failed", file=sys.stderr)
+    if writer.skipped:
+        print(f"{writer.skipped} game(s) skipped, out of time", file=sys.stderr)
+    return min(writer.failures, MAX_EXIT_CODE)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
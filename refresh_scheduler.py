@@ -0,0 +1,162 @@
+# One scheduler for the PC and console refreshes. The games of a refresh, of either kind, are split
+# in two: the PC games read over HTTP go to the asyncio fetch engine (fetch_engine.py), and the
+# games that need Chrome share one pool of drivers. Both halves run at the same time, so a combined
+# refresh keeps the connections and every driver busy until the last game is done:
+#
+#   scheduler = refresh_scheduler.RefreshScheduler(max_drivers=4)
+#   scheduler.add_pc_games(pc_games_to_check)
+#   scheduler.add_console_games(console_games_to_check)
+#   scheduler.run(on_game_data, on_error, on_skip)
+#
+# Every game runs in a copy of the calling context, so the run deadline (see fetch_budget.py) and
+# the timing tags reach the fetches. The games not started before the deadline go to on_skip and
+# keep their cached prices. The callbacks are called one at a time, from the scheduler threads.
+#
+# A game gives its driver back to the pool as soon as its pages are loaded: the pages still being
+# parsed by the parse workers (see page_parsers.py) are waited for after that, so the driver loads
+# the next game in the meantime.
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
+
+import current_prices
+import current_prices_consoles
+import fetch_budget
+import fetch_engine
+import page_parsers
+
+# ...
+
+
+class RefreshJob:
+    """
+    A game fetched with a Chrome driver, fetch(driver) returns its game data. With a finish
+    function, the game data is finish(fetch(driver)), called once the driver is back in the pool.
+    """
+
+    def __init__(self, kind: str, game_name: str, fetch: Callable, finish: Callable = None):
+        self.kind = kind
+        self.game_name = game_name
+        self.fetch = fetch
+        self.finish = finish
+
+
+class RefreshScheduler:
+    """
+    Runs the jobs of a refresh. The drivers come from driver_pool when one is given, e.g. the pool
+    the price server keeps between refreshes, or from a pool of up to max_drivers started for the
+    run. host_limits are the in-flight requests per host of the fetch engine.
+    """
+
+    def __init__(self, driver_pool: current_prices.ChromeDriverPool = None,
+                 max_drivers: int = current_prices.MAX_DRIVERS, host_limits: dict = None):
+        self.driver_pool = driver_pool
+        self.max_drivers = driver_pool.size if driver_pool else max(1, max_drivers)
+        self.host_limits = host_limits
+        self.http_games = {}  # PC games for the fetch engine
+        self.jobs = []
+        self._callback_lock = threading.Lock()
+
+    def add_job(self, kind: str, game_name: str, fetch: Callable, finish: Callable = None):
+        """Add a game fetched with fetch(driver), which returns its game data (see RefreshJob)."""
+        self.jobs.append(RefreshJob(kind, game_name, fetch, finish))
+
+    def add_pc_games(self, games_to_check: dict, backend: str = None):
+        backend = backend or current_prices.PRICE_BACKEND
+        for game_name, game_data in games_to_check.items():
+            if not current_prices.needs_browser(game_name, backend, game_data):
+                self.http_games[game_name] = game_data
+                continue
+
+            def fetch(driver, game_name=game_name, game_data=game_data):
+                return current_prices.get_game_prices(game_name, driver, backend, game_data=game_data,
+                                                      wait_parse=False)
+
+            def finish(prices):
+                return current_prices.build_game_data(current_prices.finish_game_prices(prices))
+
+            self.add_job("pc", game_name, fetch, finish)
+
+    def add_console_games(self, games_to_check: dict):
+        for game_name, sites in games_to_check.items():
+            def fetch(driver, game_name=game_name, sites=sites):
+                return current_prices_consoles.get_game_prices(game_name, driver, sites, wait_parse=False)
+
+            self.add_job("console", game_name, fetch, current_prices_consoles.finish_game_prices)
+
+    def get_driver_count(self) -> int:
+        """Number of drivers the run uses."""
+        return min(self.max_drivers, len(self.jobs))
+
+    def run(self, on_game_data: Callable, on_error: Callable, on_skip: Callable = None):
+        """
+        Fetch every game added, calling on_game_data(kind, game_name, game_data) as each game is
+        done, on_error(kind, game_name, message) when a game fails and on_skip(kind, game_name) for
+        the games not started before the deadline. Returns when every game is done.
+        """
+        def call_back(callback, *args):
+            if callback:
+                with self._callback_lock:
+                    callback(*args)
+
+        http_errors = []
+
+        def run_http_games():
+            try:
+                fetch_engine.run_fetch_games_prices(
+                    self.http_games,
+                    lambda game_name, prices: call_back(on_game_data, "pc", game_name,
+                                                        current_prices.build_game_data(prices)),
+                    self.host_limits
+                )
+            except Exception as e:
+                http_errors.append(e)
+
+        http_thread = None
+        if self.http_games:
+            http_thread = threading.Thread(target=contextvars.copy_context().run, args=(run_http_games,))
+            http_thread.start()
+
+        try:
+            self.run_jobs(call_back, on_game_data, on_error, on_skip)
+        finally:
+            if http_thread:
+                http_thread.join()
+
+        if http_errors:
+            raise http_errors[0]
+
+    def run_jobs(self, call_back: Callable, on_game_data: Callable, on_error: Callable, on_skip: Callable):
+        if not self.jobs:
+            return
+
+        pool_size = self.get_driver_count()
+        driver_pool = self.driver_pool or current_prices.ChromeDriverPool(pool_size)
+
+        def run_job(job: RefreshJob):
+            with driver_pool.driver() as driver:
+                game_data = job.fetch(driver)
+            return job.finish(game_data) if job.finish else game_data
+
+        # the games waiting for their pages to be parsed don't hold a driver, more threads keep
+        # every driver busy in the meantime
+        max_workers = pool_size + (page_parsers.PARSE_WORKERS if page_parsers.is_pipelined() else 0)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # each game runs in a copy of this context, to share the run deadline
+                futures = {executor.submit(contextvars.copy_context().run, run_job, job): job for job in self.jobs}
+                for future in as_completed(futures):
+                    job = futures[future]
+                    try:
+                        game_data = future.result()
+                    except fetch_budget.BudgetExceeded:
+                        call_back(on_skip, job.kind, job.game_name)
+                    except Exception as e:
+                        call_back(on_error, job.kind, job.game_name, str(e))
+                    else:
+                        call_back(on_game_data, job.kind, job.game_name, game_data)
+        finally:
+            if not self.driver_pool:
+                driver_pool.close()
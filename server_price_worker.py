@@ -0,0 +1,60 @@
+from PyQt5 import QtCore
+
+import price_client
+
+
+class ServerPriceWorker(QtCore.QThread):
+    """
+    Worker thread that gets the prices from the local price server instead of fetching them. It
+    has the same signals as PriceWorker and ConsolePriceWorker, so the price windows can use
+    either one.
+    """
+    price_updated = QtCore.pyqtSignal(str, dict)  # game_name, price_data
+    progress_updated = QtCore.pyqtSignal(str)  # status message
+    finished_all = QtCore.pyqtSignal()  # all prices fetched
+    error_occurred = QtCore.pyqtSignal(str)  # error message
+
+    def __init__(self, kind: str, only_expired: bool = False, time_budget: float = None):
+        super().__init__()
+        self.kind = kind
+        self.only_expired = only_expired
+        self.time_budget = time_budget
+        self.game_names = None
+
+    def set_games(self, games_dict: dict):
+        """Set the games the server refreshes, in the order they are fetched."""
+        self.game_names = list(games_dict)
+
+    def run(self):
+        """Main worker thread function."""
+        try:
+            self.progress_updated.emit("Waiting for the price server...")
+
+            with price_client.open_event_stream() as stream:
+                # subscribe before starting, so no event of the refresh is missed
+                response = price_client.start_refresh(self.kind, self.only_expired, self.time_budget,
+                                                      self.game_names)
+                if not response.get("started"):
+                    # the events would be the prices of other games
+                    self.error_occurred.emit(f"The price server is already refreshing the {self.kind} prices, "
+                                             "try again when it finishes")
+                    return
+
+                for event in price_client.read_events(stream):
+                    if event.get("kind") != self.kind:
+                        continue
+
+                    if event["type"] == "price":
+                        self.price_updated.emit(event["game_name"], event["game_data"])
+                    elif event["type"] == "progress":
+                        self.progress_updated.emit(event["message"])
+                    elif event["type"] == "error":
+                        self.error_occurred.emit(event["message"])
+                    elif event["type"] == "finished":
+                        break
+
+            self.progress_updated.emit("All prices updated!")
+            self.finished_all.emit()
+
+        except Exception as e:
+            self.error_occurred.emit(f"Price server error: {str(e)}")
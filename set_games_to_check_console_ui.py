@@ -2,15 +2,12 @@ import os
 import platform
 import subprocess
 import sys
-from pathlib import Path
 import json
 from PyQt5 import QtWidgets, QtGui, QtCore
 
-# User data folder path
-DATA_DIR = Path.home() / ".current_prices_data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
+import app_data
 
-JSON_PATH = DATA_DIR / "console_games_to_check.json"
+JSON_PATH = app_data.CONSOLE_GAMES_PATH
 
 if getattr(sys, 'frozen', False):
     THIS_FOLDER = os.path.dirname(sys.executable)
@@ -277,8 +274,7 @@ class ConsoleGameManagerUI(QtWidgets.QWidget):
 
     def open_data_folder(self):
         """Open the folder containing the JSON data file."""
-        folder = Path.home() / ".current_prices_data"
-        folder.mkdir(parents=True, exist_ok=True)
+        folder = app_data.get_data_dir()
         system = platform.system()
         if system == "Darwin":
             subprocess.run(["open", folder])
@@ -296,6 +292,7 @@ class ConsoleGameManagerUI(QtWidgets.QWidget):
             sites = item.data(0, QtCore.Qt.UserRole) or {}
             games_data[game_name] = sites
         try:
+            app_data.get_data_dir()
             with open(JSON_PATH, 'w', encoding='utf-8') as f:
                 json.dump(games_data, f, indent=4, ensure_ascii=False)
             QtWidgets.QMessageBox.information(self, "Success", "Games saved successfully!")
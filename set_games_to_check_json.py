@@ -2,23 +2,19 @@ import os
 import platform
 import subprocess
 import sys
-from pathlib import Path
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5 import QtWidgets, QtGui, QtCore
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 
+import app_data
+import fetch_timing
+import itad_api
+import link_resolver
+import price_metrics
 
 
-# User data folder path
-DATA_DIR = Path.home() / ".current_prices_data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
-
-# Get the actual directory of the Python executable or script
-JSON_PATH = DATA_DIR / "games_to_check.json"
+JSON_PATH = app_data.PC_GAMES_PATH
 
 
 
@@ -50,65 +46,110 @@ class StoreLinkWorker(QtCore.QThread):
     def run(self):
         """Main worker thread function."""
         try:
-            self.progress_updated.emit("Starting Chrome driver...")
-            service = Service()
-            options = webdriver.ChromeOptions()
-            options.add_argument("--headless=new")
-            driver = webdriver.Chrome(service=service, options=options)
-
+            run_start = time.perf_counter()
             total_games = len(self.games_to_check)
-            processed = 0
+            pending_games = []
 
-            for game_name, game_data in self.games_to_check.items():
-                processed += 1
+            for processed, (game_name, game_data) in enumerate(self.games_to_check.items(), start=1):
+                # Get the IsThereAnyDeal URL
+                itad_url = game_data if isinstance(game_data, str) else game_data.get("isthereanydeal_link", "")
 
-                try:
-                    # Get the IsThereAnyDeal URL
-                    itad_url = game_data if isinstance(game_data, str) else game_data.get("isthereanydeal_link", "")
-                    
-                    if not itad_url:
-                        self.error_occurred.emit(f"No IsThereAnyDeal link for {game_name}")
-                        continue
+                if not itad_url:
+                    self.error_occurred.emit(f"No IsThereAnyDeal link for {game_name}")
+                    continue
 
-                    # Check what links are already saved
-                    existing_steam = game_data.get("steam_link") if isinstance(game_data, dict) else None
-                    existing_gog = game_data.get("gog_link") if isinstance(game_data, dict) else None
+                # Check what links are already saved
+                existing_steam = game_data.get("steam_link") if isinstance(game_data, dict) else None
+                existing_gog = game_data.get("gog_link") if isinstance(game_data, dict) else None
 
-                    # Check if both links are already resolved (either fetched or marked as non-existent)
-                    steam_resolved = existing_steam and existing_steam != "link_not_fetched"
-                    gog_resolved = existing_gog and existing_gog != "link_not_fetched"
-                    
-                    if steam_resolved and gog_resolved:
-                        self.progress_updated.emit(f"Skipping {game_name} ({processed}/{total_games}) - both links already resolved")
-                        continue
+                # Check if both links are already resolved (either fetched or marked as non-existent)
+                steam_resolved = existing_steam and existing_steam != "link_not_fetched"
+                gog_resolved = existing_gog and existing_gog != "link_not_fetched"
+
+                if steam_resolved and gog_resolved:
+                    self.progress_updated.emit(f"Skipping {game_name} ({processed}/{total_games}) - both links already resolved")
+                    continue
 
-                    self.progress_updated.emit(f"Fetching store links for {game_name} ({processed}/{total_games})...")
+                pending_games.append((game_name, itad_url, existing_steam, existing_gog))
+
+            # the store links are resolved over HTTP in the pool while the next IsThereAnyDeal pages are read
+            with ThreadPoolExecutor(max_workers=link_resolver.RESOLVE_WORKERS) as executor:
+                for game_name, itad_url, existing_steam, existing_gog, steam_href, gog_href in self.iter_store_hrefs(pending_games):
+                    executor.submit(self.update_game_links, game_name, itad_url, existing_steam, existing_gog,
+                                    steam_href, gog_href)
+
+            price_metrics.RUN_DURATION.observe(time.perf_counter() - run_start, kind="links", worker="ui")
+            self.progress_updated.emit("All store links updated!")
+            self.finished_all.emit()
+
+        except Exception as e:
+            self.error_occurred.emit(f"Critical error: {str(e)}")
+
+    def iter_store_hrefs(self, pending_games: list):
+        """
+        Yield the pending games with the IsThereAnyDeal links of their Steam and GOG shops (None
+        when the game is not sold there), from the IsThereAnyDeal API when it has a key, from the
+        IsThereAnyDeal pages in Chrome otherwise.
+        """
+        if not pending_games:
+            return
+
+        if itad_api.is_available():
+            self.progress_updated.emit(f"Fetching the IsThereAnyDeal shops of {len(pending_games)} games...")
+            itad_prices = itad_api.get_itad_prices_batch([itad_url for _, itad_url, _, _ in pending_games])
+            for game_name, itad_url, existing_steam, existing_gog in pending_games:
+                prices = itad_prices.get(itad_url, {})
+                if prices.get("error"):
+                    self.error_occurred.emit(f"Error fetching links for {game_name}: {prices['error']}")
+                    continue
+                yield game_name, itad_url, existing_steam, existing_gog, prices.get("Steam_link"), prices.get("GOG_link")
+            return
+
+        self.progress_updated.emit("Starting Chrome driver...")
+        # imported here so the editor opens without loading selenium
+        from selenium import webdriver
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
+        service = Service()
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless=new")
+        with fetch_timing.span("driver_start"):
+            driver = webdriver.Chrome(service=service, options=options)
+
+        try:
+            for processed, (game_name, itad_url, existing_steam, existing_gog) in enumerate(pending_games, start=1):
+                try:
+                    self.progress_updated.emit(f"Fetching store links for {game_name} ({processed}/{len(pending_games)})...")
 
                     # Navigate to IsThereAnyDeal page to see what's available
-                    driver.get(itad_url)
-                    WebDriverWait(driver, 60).until(
-                        EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".cell"))
-                    )
+                    with fetch_timing.tagged(game=game_name, store="IsThereAnyDeal"):
+                        with fetch_timing.span("driver_get"):
+                            driver.get(itad_url)
+                        with fetch_timing.span("wait_page"):
+                            WebDriverWait(driver, 60).until(
+                                EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".cell"))
+                            )
 
                     # Get fresh elements each time to avoid stale reference
                     elements = driver.find_elements(By.CSS_SELECTOR, ".row")
-                    
-                    links_dict = {"isthereanydeal_link": itad_url}
-                    
+
                     # Store element data before interacting with them
                     steam_href = None
                     gog_href = None
-                    
+
                     for element in elements:
                         try:
                             text = element.text
                             if not text:
                                 continue
-                            
+
                             href = element.get_attribute("href")
                             if not href:
                                 continue
-                            
+
                             if text.startswith("Steam\n"):
                                 steam_href = href
                                 self.progress_updated.emit(f"Found Steam link for {game_name}")
@@ -117,88 +158,70 @@ class StoreLinkWorker(QtCore.QThread):
                                 self.progress_updated.emit(f"Found GOG link for {game_name}")
                         except:
                             continue
-                    
-                    # Handle Steam link
-                    if steam_href:
-                        if existing_steam and existing_steam not in ["non_existent", "link_not_fetched"]:
-                            links_dict["steam_link"] = existing_steam
-                            self.progress_updated.emit(f"Using existing Steam link for {game_name}")
-                        else:
-                            steam_link = self.get_steam_link(driver, steam_href)
-                            if steam_link:
-                                links_dict["steam_link"] = steam_link
-                                self.progress_updated.emit(f"Steam link fetched for {game_name}")
-                            else:
-                                links_dict["steam_link"] = "link_not_fetched"
-                                self.progress_updated.emit(f"Failed to fetch Steam link for {game_name}")
-                    else:
-                        links_dict["steam_link"] = "non_existent"
-                    
-                    # Handle GOG link
-                    if gog_href:
-                        if existing_gog and existing_gog not in ["non_existent", "link_not_fetched"]:
-                            links_dict["gog_link"] = existing_gog
-                            self.progress_updated.emit(f"Using existing GOG link for {game_name}")
-                        else:
-                            gog_link = self.get_gog_link(driver, gog_href)
-                            if gog_link:
-                                links_dict["gog_link"] = gog_link
-                                self.progress_updated.emit(f"GOG link fetched for {game_name}")
-                            else:
-                                links_dict["gog_link"] = "link_not_fetched"
-                                self.progress_updated.emit(f"Failed to fetch GOG link for {game_name}")
-                    else:
-                        links_dict["gog_link"] = "non_existent"
-
-                    # Always emit to save the current iteration
-                    self.link_updated.emit(game_name, links_dict)
 
                 except Exception as e:
                     self.error_occurred.emit(f"Error fetching links for {game_name}: {str(e)}")
+                    continue
 
+                yield game_name, itad_url, existing_steam, existing_gog, steam_href, gog_href
+        finally:
             self.progress_updated.emit("Closing Chrome driver...")
-            driver.quit()
-            self.progress_updated.emit("All store links updated!")
-            self.finished_all.emit()
+            with fetch_timing.span("driver_quit"):
+                driver.quit()
 
-        except Exception as e:
-            self.error_occurred.emit(f"Critical error: {str(e)}")
-
-    def get_steam_link(self, driver: webdriver.Chrome, itad_link: str) -> str:
-        """Navigate to Steam through IsThereAnyDeal and get the actual store link."""
+    def update_game_links(self, game_name: str, itad_url: str, existing_steam: str, existing_gog: str,
+                          steam_href: str, gog_href: str):
+        """Resolve the Steam and GOG links of a game and emit them, run in the resolver pool."""
         try:
-            driver.get(itad_link)
-            # Try multiple selectors and wait longer
-            try:
-                WebDriverWait(driver, 20).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, ".apphub_AppName"))
-                )
-            except:
-                # Try alternative selector
-                try:
-                    WebDriverWait(driver, 20).until(
-                        EC.presence_of_element_located((By.CSS_SELECTOR, ".game_area_purchase_game"))
-                    )
-                except:
-                    # Last resort - check if we're on Steam domain
-                    if "steampowered.com" in driver.current_url:
-                        return driver.current_url
-                    return None
-            return driver.current_url
+            links_dict = {"isthereanydeal_link": itad_url}
+
+            # Handle Steam link
+            if steam_href:
+                if existing_steam and existing_steam not in ["non_existent", "link_not_fetched"]:
+                    links_dict["steam_link"] = existing_steam
+                    self.progress_updated.emit(f"Using existing Steam link for {game_name}")
+                else:
+                    with fetch_timing.tagged(game=game_name, store="Steam"):
+                        steam_link = self.get_steam_link(steam_href)
+                    if steam_link:
+                        links_dict["steam_link"] = steam_link
+                        self.progress_updated.emit(f"Steam link fetched for {game_name}")
+                    else:
+                        links_dict["steam_link"] = "link_not_fetched"
+                        self.progress_updated.emit(f"Failed to fetch Steam link for {game_name}")
+            else:
+                links_dict["steam_link"] = "non_existent"
+
+            # Handle GOG link
+            if gog_href:
+                if existing_gog and existing_gog not in ["non_existent", "link_not_fetched"]:
+                    links_dict["gog_link"] = existing_gog
+                    self.progress_updated.emit(f"Using existing GOG link for {game_name}")
+                else:
+                    with fetch_timing.tagged(game=game_name, store="GOG"):
+                        gog_link = self.get_gog_link(gog_href)
+                    if gog_link:
+                        links_dict["gog_link"] = gog_link
+                        self.progress_updated.emit(f"GOG link fetched for {game_name}")
+                    else:
+                        links_dict["gog_link"] = "link_not_fetched"
+                        self.progress_updated.emit(f"Failed to fetch GOG link for {game_name}")
+            else:
+                links_dict["gog_link"] = "non_existent"
+
+            # Always emit to save the current game
+            self.link_updated.emit(game_name, links_dict)
+
         except Exception as e:
-            print(f"Steam link error: {str(e)}")
-            return None
+            self.error_occurred.emit(f"Error fetching links for {game_name}: {str(e)}")
 
-    def get_gog_link(self, driver: webdriver.Chrome, itad_link: str) -> str:
-        """Navigate to GOG through IsThereAnyDeal and get the actual store link."""
-        try:
-            driver.get(itad_link)
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".product-actions-price__final-amount"))
-            )
-            return driver.current_url
-        except:
-            return None
+    def get_steam_link(self, itad_link: str) -> str:
+        """Follow the IsThereAnyDeal redirect to Steam and return the store link."""
+        return link_resolver.resolve_store_link(itad_link, "Steam")
+
+    def get_gog_link(self, itad_link: str) -> str:
+        """Follow the IsThereAnyDeal redirect to GOG and return the store link."""
+        return link_resolver.resolve_store_link(itad_link, "GOG")
 
 
 class CustomTreeWidget(QtWidgets.QTreeWidget):
@@ -472,8 +495,7 @@ class GameManagerUI(QtWidgets.QWidget):
             QtWidgets.QMessageBox.information(self, "Success", f"Game '{game_name}' removed successfully.")
 
     def open_data_folder(self):
-        folder = Path.home() / ".current_prices_data"
-        folder.mkdir(parents=True, exist_ok=True)  # Garante que existe
+        folder = app_data.get_data_dir()
 
         system = platform.system()
 
@@ -504,6 +526,7 @@ class GameManagerUI(QtWidgets.QWidget):
                 games_data[game_name] = {"isthereanydeal_link": game_url}
         
         try:
+            app_data.get_data_dir()
             with open(JSON_PATH, 'w', encoding='utf-8') as f:
                 json.dump(games_data, f, indent=4, ensure_ascii=False)
             
@@ -621,6 +644,7 @@ class GameManagerUI(QtWidgets.QWidget):
                 games_data[game_name] = {"isthereanydeal_link": game_url}
         
         try:
+            app_data.get_data_dir()
             with open(JSON_PATH, 'w', encoding='utf-8') as f:
                 json.dump(games_data, f, indent=4, ensure_ascii=False)
             print(f"JSON saved successfully with {len(games_data)} games")
@@ -684,6 +708,7 @@ class GameManagerUI(QtWidgets.QWidget):
 if __name__ == "__main__":
     import sys
     
+    price_metrics.start_metrics_server_from_env()
     app = QtWidgets.QApplication(sys.argv)
     window = GameManagerUI()
     window.show()
@@ -0,0 +1,105 @@
+# Store adapters: one object per store that knows how to fetch and read its prices. The PC stores
+# are registered by current_prices.py and the console stores by current_prices_consoles.py, and the
+# fetchers and the refresh scheduler (refresh_scheduler.py) loop over the registered adapters
+# instead of naming each store. A new store only needs an adapter:
+#
+#   class EpicAdapter(store_adapters.StoreAdapter):
+#       store, name, kind, link_key = "epic", "Epic", "pc", "epic_link"
+#
+#       def fetch(self, link, driver=None):
+#           ...
+#
+#       def read(self, link, driver):
+#           ...
+#
+#   store_adapters.register(EpicAdapter())
+from abc import ABC, abstractmethod
+from typing import Optional
+from urllib.parse import urlsplit
+
+import page_parsers
+
+# ...
+
+_adapters = {}
+
+
+class StoreAdapter(ABC):
+    """
+    Base of the store adapters. fetch returns the raw prices of a store page, as (current, base)
+    "12,34" strings, and parse turns them into floats. Subclasses implement fetch and read.
+    """
+    # key of the store in the game data shown in the UI, e.g. "steam"
+    store = ""
+    # name of the store in the circuit breakers, the timing tags and the PC prices dicts, e.g. "Steam"
+    name = ""
+    # "pc" or "console"
+    kind = ""
+    # key of the store link in the games to check file, e.g. "steam_link"
+    link_key = ""
+    # True if the prices can be fetched without a Chrome driver
+    http = False
+    # CSS selector on the store page once its prices can be read, empty if the adapter can't read
+    # a page loaded for it in a tab (see browser_tabs.py)
+    ready_selector = ""
+
+    def get_canonical_id(self, link: str) -> Optional[str]:
+        """Return the id of the product a link points to, the same for every form of its link."""
+        path = urlsplit(link or "").path.rstrip("/")
+        return path.rsplit("/", 1)[-1].lower() or None
+
+    @abstractmethod
+    def fetch(self, link: str, driver=None) -> tuple[str, str]:
+        """
+        Fetch the (current, base) prices of one store page. driver is None for the HTTP adapters.
+        The prices of a page read with a driver may be a Future of the parse worker (see page_parsers.py).
+        """
+
+    @abstractmethod
+    def read(self, link: str, driver) -> tuple[str, str]:
+        """Read the (current, base) prices of the store page of link, already loaded in driver."""
+
+    def fetch_batch(self, links: list, driver=None) -> dict:
+        """
+        Fetch the prices of many store pages one after the other, with driver for the adapters
+        that are not http. Returns {link: (current, base)}, with the error instead of the prices
+        for the links that failed. Links to the same product are only fetched once.
+        """
+        prices_by_id = {}
+        prices = {}
+        for link in links:
+            product_id = self.get_canonical_id(link) or link
+            if product_id not in prices_by_id:
+                try:
+                    prices_by_id[product_id] = page_parsers.wait_prices(self.fetch(link, driver))
+                except Exception as e:
+                    prices_by_id[product_id] = e
+            prices[link] = prices_by_id[product_id]
+        return prices
+
+    def parse(self, prices: tuple) -> tuple[float, float]:
+        """Convert the (current, base) prices returned by fetch to floats."""
+        return tuple(convert_to_float(price) for price in prices)
+
+
+def convert_to_float(price_str: str) -> float:
+    """Convert a "12,34" price string to float."""
+    try:
+        return float(price_str.replace(",", ".")) if price_str else 0.0
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+def register(adapter: StoreAdapter) -> StoreAdapter:
+    """Add an adapter to the registry, replacing the adapter of the same store if there is one."""
+    _adapters[adapter.store] = adapter
+    return adapter
+
+
+def get_adapter(store: str) -> Optional[StoreAdapter]:
+    return _adapters.get(store)
+
+
+def get_adapters(kind: str = None) -> list:
+    """Return the registered adapters of a kind ("pc" or "console"), all of them by default."""
+    return [adapter for adapter in _adapters.values() if kind is None or adapter.kind == kind]
@@ -0,0 +1,346 @@
+# HTTP/JSON price backends that fetch store prices without a browser
+import json
+import re
+import threading
+import urllib.parse
+import urllib.request
+from typing import Optional
+
+import app_data
+import fetch_budget
+import fetch_timing
+import price_metrics
+
+# ...
+
+# Base URL of the Steam store, change it to point the backend to a local stand-in server
+STEAM_STORE_URL = "https://store.steampowered.com"
+STEAM_COUNTRY_CODE = "br"
+STEAM_LANGUAGE = "brazilian"
+
+# Cookies sent with every Steam request so the age check page is never hit
+STEAM_AGE_COOKIES = {
+    "birthtime": "631152001",  # 1990-01-01
+    "lastagecheckage": "1-0-1990",
+    "wants_mature_content": "1",
+}
+
+# Number of appids sent in each batched app-details request
+STEAM_BATCH_SIZE = 50
+
+# Base URL of the GOG API, change it to point the backend to a local stand-in server
+GOG_API_URL = "https://api.gog.com"
+GOG_COUNTRY_CODE = "BR"
+GOG_CURRENCY = "BRL"
+GOG_BATCH_SIZE = 50
+
+# Product ids resolved from the GOG links are saved here so each link is only resolved once
+GOG_PRODUCT_IDS_PATH = app_data.DATA_DIR / "gog_product_ids.json"
+
+REQUEST_TIMEOUT = 10
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36"
+
+
+class PriceFetchError(Exception):
+    """A store link whose prices can't be requested, e.g. a Steam link without an appid."""
+
+
+def http_get_json(url: str, params: Optional[dict] = None, cookies: Optional[dict] = None,
+                  timeout: float = REQUEST_TIMEOUT):
+    """Send a GET request and return the decoded JSON body."""
+    if params:
+        url = f"{url}?{urllib.parse.urlencode(params)}"
+
+    headers = {"User-Agent": USER_AGENT, "Accept": "application/json"}
+    if cookies:
+        headers["Cookie"] = "; ".join(f"{key}={value}" for key, value in cookies.items())
+
+    request = urllib.request.Request(url, headers=headers)
+    with fetch_timing.span("http_request", host=urllib.parse.urlsplit(url).hostname):
+        with urllib.request.urlopen(request, timeout=fetch_budget.get_timeout(timeout)) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+
+def http_post_json(url: str, data, params: Optional[dict] = None, timeout: float = REQUEST_TIMEOUT):
+    """Send a POST request with a JSON body and return the decoded JSON response."""
+    if params:
+        url = f"{url}?{urllib.parse.urlencode(params)}"
+
+    headers = {"User-Agent": USER_AGENT, "Accept": "application/json", "Content-Type": "application/json"}
+    request = urllib.request.Request(url, data=json.dumps(data).encode("utf-8"), headers=headers, method="POST")
+    with fetch_timing.span("http_request", host=urllib.parse.urlsplit(url).hostname):
+        with urllib.request.urlopen(request, timeout=fetch_budget.get_timeout(timeout)) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+
+def http_get_text(url: str, timeout: float = REQUEST_TIMEOUT) -> str:
+    """Send a GET request and return the body as text."""
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    with fetch_timing.span("http_request", host=urllib.parse.urlsplit(url).hostname):
+        with urllib.request.urlopen(request, timeout=fetch_budget.get_timeout(timeout)) as response:
+            return response.read().decode("utf-8", errors="replace")
+
+
+def is_valid_store_link(store_link: str) -> bool:
+    """Check if a saved store link points to an actual store page."""
+    return bool(store_link) and store_link not in ["non_existent", "link_not_fetched"]
+
+
+def format_price_cents(cents: Optional[int]) -> str:
+    """Convert a price in cents to the "12,34" format used by the scrapers."""
+    if not cents:
+        return "0,0"
+    return f"{cents // 100},{cents % 100:02d}"
+
+
+def get_steam_appid(steam_link: str) -> Optional[str]:
+    """Return the appid from a Steam store link, e.g. https://store.steampowered.com/app/1282100/."""
+    match = re.search(r"/app/(\d+)", steam_link or "")
+    return match.group(1) if match else None
+
+
+def parse_steam_price_overview(app_details: dict) -> tuple[str, str]:
+    """
+    Returns the current and base price from an app-details entry. Games without a price
+    (free, coming soon or not sold in the region) return "0,0".
+    """
+    if not app_details or not app_details.get("success"):
+        return "0,0", "0,0"
+
+    data = app_details.get("data")
+    # Steam returns an empty list instead of a dict when the filtered fields are missing
+    price_overview = data.get("price_overview") if isinstance(data, dict) else None
+    if not price_overview:
+        return "0,0", "0,0"
+
+    current_price = format_price_cents(price_overview.get("final"))
+    base_price = format_price_cents(price_overview.get("initial") or price_overview.get("final"))
+
+    return current_price, base_price
+
+
+def get_steam_prices_http(steam_link: str, store_url: str = None) -> tuple[str, str]:
+    """
+    Get Steam prices from the store app-details JSON, without loading the store page. Raises
+    PriceFetchError for a link without an appid, and the error of a failed request.
+    """
+    store_url = store_url or STEAM_STORE_URL
+    appid = get_steam_appid(steam_link)
+    if not appid:
+        raise PriceFetchError(f"No Steam appid in {steam_link}")
+
+    app_details = http_get_json(
+        f"{store_url}/api/appdetails",
+        params={"appids": appid, "cc": STEAM_COUNTRY_CODE, "l": STEAM_LANGUAGE,
+                "filters": "price_overview"},
+        cookies=STEAM_AGE_COOKIES
+    )
+    return parse_steam_price_overview(app_details.get(appid))
+
+
+def get_steam_prices_batch(steam_links: list, store_url: str = None,
+                           batch_size: int = None) -> dict:
+    """
+    Get the Steam prices of many games, requesting the app-details of `batch_size` appids at a
+    time. Returns a dict of {steam_link: (current_price, base_price)}, with the error instead of
+    the prices for the links without an appid and the links of a failed request.
+    """
+    store_url = store_url or STEAM_STORE_URL
+    batch_size = batch_size or STEAM_BATCH_SIZE
+    prices = {}
+    links_by_appid = {}
+
+    for steam_link in steam_links:
+        appid = get_steam_appid(steam_link)
+        if appid:
+            links_by_appid.setdefault(appid, []).append(steam_link)
+        else:
+            prices[steam_link] = PriceFetchError(f"No Steam appid in {steam_link}")
+
+    appids = list(links_by_appid)
+    for start in range(0, len(appids), batch_size):
+        chunk = appids[start:start + batch_size]
+
+        try:
+            # Steam only accepts several appids at once when filtering by price_overview
+            app_details = http_get_json(
+                f"{store_url}/api/appdetails",
+                params={"appids": ",".join(chunk), "cc": STEAM_COUNTRY_CODE, "l": STEAM_LANGUAGE,
+                        "filters": "price_overview"},
+                cookies=STEAM_AGE_COOKIES
+            )
+        except Exception as e:
+            print(f"Error fetching Steam prices: {e}")
+            for appid in chunk:
+                for steam_link in links_by_appid[appid]:
+                    prices[steam_link] = e
+            continue
+
+        for appid in chunk:
+            appid_prices = parse_steam_price_overview(app_details.get(appid))
+            for steam_link in links_by_appid[appid]:
+                prices[steam_link] = appid_prices
+
+    return prices
+
+
+_gog_product_ids = None
+_gog_product_ids_lock = threading.Lock()
+
+
+def load_gog_product_ids() -> dict:
+    """Load the {gog_link: product_id} cache from disk."""
+    global _gog_product_ids
+    with _gog_product_ids_lock:
+        if _gog_product_ids is None:
+            try:
+                with open(GOG_PRODUCT_IDS_PATH, "r") as json_file:
+                    _gog_product_ids = json.load(json_file)
+            except (FileNotFoundError, ValueError):
+                _gog_product_ids = {}
+        return _gog_product_ids
+
+
+def save_gog_product_id(gog_link: str, product_id: str):
+    """Add a resolved product id to the cache and write it to disk."""
+    product_ids = load_gog_product_ids()
+    with _gog_product_ids_lock:
+        product_ids[gog_link] = product_id
+        try:
+            GOG_PRODUCT_IDS_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with open(GOG_PRODUCT_IDS_PATH, "w") as json_file:
+                json.dump(product_ids, json_file, indent=4)
+        except OSError as e:
+            print(f"Error saving GOG product ids: {e}")
+
+
+def parse_gog_product_id(page_html: str) -> Optional[str]:
+    """Find the product id in the html of a GOG game page."""
+    patterns = [
+        r'card-product="(\d+)"',
+        r'"productId"\s*:\s*"?(\d+)',
+        r'data-product-id="(\d+)"',
+    ]
+    for pattern in patterns:
+        match = re.search(pattern, page_html)
+        if match:
+            return match.group(1)
+    return None
+
+
+def get_gog_product_id(gog_link: str) -> Optional[str]:
+    """
+    Return the product id of a GOG game link, loading the game page only the first time. Returns
+    None if the page has no product id, and raises the error of a failed request.
+    """
+    product_id = load_gog_product_ids().get(gog_link)
+    price_metrics.count_cache_lookup("gog_product_ids", hit=bool(product_id))
+    if product_id:
+        return product_id
+
+    product_id = parse_gog_product_id(http_get_text(gog_link))
+    if product_id:
+        save_gog_product_id(gog_link, product_id)
+    return product_id
+
+
+def parse_gog_amount(amount) -> int:
+    """Convert a GOG amount like "7999 BRL" (in cents) to an int."""
+    match = re.match(r"\s*(\d+)", str(amount or ""))
+    return int(match.group(1)) if match else 0
+
+
+def parse_gog_prices(prices: list) -> tuple[str, str]:
+    """Returns the final and base price from the price list of a GOG product."""
+    if not prices:
+        return "0,0", "0,0"
+
+    price = next((entry for entry in prices
+                  if entry.get("currency", {}).get("code") == GOG_CURRENCY), prices[0])
+
+    final_amount = parse_gog_amount(price.get("finalPrice"))
+    base_amount = parse_gog_amount(price.get("basePrice")) or final_amount
+
+    return format_price_cents(final_amount), format_price_cents(base_amount)
+
+
+def get_gog_prices_by_product_id(product_ids: list, api_url: str = None) -> dict:
+    """Request the prices of several GOG products at once. Returns {product_id: (current, base)}."""
+    api_url = api_url or GOG_API_URL
+    response = http_get_json(
+        f"{api_url}/products/prices",
+        params={"ids": ",".join(product_ids), "countryCode": GOG_COUNTRY_CODE, "currency": GOG_CURRENCY}
+    )
+    return parse_gog_prices_response(response)
+
+
+def parse_gog_prices_response(response: dict) -> dict:
+    """Returns the {product_id: (current, base)} prices of a GOG products/prices response."""
+    prices = {}
+    for item in response.get("_embedded", {}).get("items", []):
+        embedded = item.get("_embedded", {})
+        product_id = str(embedded.get("product", {}).get("id", ""))
+        if product_id:
+            prices[product_id] = parse_gog_prices(embedded.get("prices", []))
+
+    return prices
+
+
+def get_gog_prices_http(gog_link: str, api_url: str = None) -> tuple[str, str]:
+    """
+    Get GOG prices from the GOG price API, without loading the store page. Raises PriceFetchError
+    when the product id of the link can't be found, and the error of a failed request.
+    """
+    api_url = api_url or GOG_API_URL
+    prices = get_gog_prices_batch([gog_link], api_url)[gog_link]
+    if isinstance(prices, Exception):
+        raise prices
+    return prices
+
+
+def get_gog_prices_batch(gog_links: list, api_url: str = None,
+                         batch_size: int = None) -> dict:
+    """
+    Get the GOG prices of many games, requesting the prices of `batch_size` products at a time.
+    Returns a dict of {gog_link: (current_price, base_price)}, with the error instead of the
+    prices for the links whose product id can't be found and the links of a failed request.
+    """
+    api_url = api_url or GOG_API_URL
+    batch_size = batch_size or GOG_BATCH_SIZE
+    prices = {}
+    links_by_product_id = {}
+
+    for gog_link in gog_links:
+        try:
+            product_id = get_gog_product_id(gog_link)
+        except Exception as e:
+            print(f"Error resolving GOG product id for {gog_link}: {e}")
+            prices[gog_link] = e
+            continue
+
+        if product_id:
+            links_by_product_id.setdefault(product_id, []).append(gog_link)
+        else:
+            prices[gog_link] = PriceFetchError(f"No GOG product id found in {gog_link}")
+
+    product_ids = list(links_by_product_id)
+    for start in range(0, len(product_ids), batch_size):
+        chunk = product_ids[start:start + batch_size]
+
+        try:
+            chunk_prices = get_gog_prices_by_product_id(chunk, api_url)
+        except Exception as e:
+            print(f"Error fetching GOG prices: {e}")
+            chunk_prices = {product_id: e for product_id in chunk}
+
+        for product_id in chunk:
+            for gog_link in links_by_product_id[product_id]:
+                prices[gog_link] = chunk_prices.get(product_id, ("0,0", "0,0"))
+
+    return prices
+
+
+if __name__ == "__main__":
+    # Example usage, Evil West on Steam and GOG
+    print("Evil West Steam Prices:", get_steam_prices_http("https://store.steampowered.com/app/1259420/Evil_West/"))
+    print("Evil West GOG Prices:", get_gog_prices_http("https://www.gog.com/en/game/evil_west"))
@@ -0,0 +1,207 @@
+# Per-store circuit breakers and retries with jittered exponential backoff.
+#
+# When a store changes its markup or rate-limits us, every game burns the full WebDriverWait
+# timeout of the store. The breaker of a store opens after FAILURE_THRESHOLD consecutive failed
+# fetches, and the next fetches of the store raise StoreSkipped right away instead of waiting.
+# After OPEN_SECONDS a single trial fetch is let through: it closes the breaker if it succeeds and
+# opens it again if it fails.
+#
+#   prices = store_breaker.call("Steam", get_steam_prices_direct, driver, steam_link)
+#
+# A page that loads but has no price (free, coming soon or not sold yet) is a successful fetch of
+# "0,0" prices, the fetchers don't raise for it. Transient errors (dropped connections, HTTP 429
+# and 5xx) are retried up to RETRY_ATTEMPTS times first. Wait timeouts are not retried, they
+# already took the whole wait. Fetches that fail after their time budget ran out (see
+# fetch_budget.py) don't count against the store, and a trial fetch that ends that way opens the
+# breaker again for another cool-down.
+import asyncio
+import random
+import threading
+import time
+import urllib.error
+from typing import Callable
+
+import fetch_budget
+import fetch_timing
+import price_metrics
+
+# ...
+
+# Consecutive failed fetches that open the breaker of a store
+FAILURE_THRESHOLD = 3
+
+# Seconds a store is skipped once its breaker opens, before a trial fetch is let through
+OPEN_SECONDS = 5 * 60
+
+# Attempts of a fetch that fails with a transient error, including the first one
+RETRY_ATTEMPTS = 3
+
+# The delay before retry n is random between 0 and RETRY_BASE_DELAY * 2 ** n, up to RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 20.0
+
+# HTTP statuses worth retrying: rate limited or the server is having a bad time
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, urllib.error.URLError)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class StoreSkipped(Exception):
+    """Raised instead of fetching from a store whose breaker is open."""
+
+    def __init__(self, store: str):
+        super().__init__(f"{store} skipped after {FAILURE_THRESHOLD} failed fetches in a row")
+        self.store = store
+
+
+class CircuitBreaker:
+    """Counts the consecutive failed fetches of a store, and tells when the store must be skipped."""
+
+    def __init__(self, store: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 open_seconds: float = OPEN_SECONDS):
+        self.store = store
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Check if a fetch can go through. Only one trial fetch goes through once the breaker cools down."""
+        return self.start_request()[0]
+
+    def start_request(self) -> tuple[bool, bool]:
+        """Return (allowed, is_trial) for a new fetch, see allow_request."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True, False
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                return True, True
+            return False, False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = CLOSED
+        price_metrics.CIRCUIT_OPEN.set(0, store=self.store)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"{self.store} failed {self.failures} time(s) in a row, skipping it for "
+                          f"{self.open_seconds:.0f} seconds")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                is_open = True
+            else:
+                is_open = False
+        if is_open:
+            price_metrics.CIRCUIT_OPEN.set(1, store=self.store)
+
+    def end_trial(self):
+        """
+        Open the breaker again if a trial fetch ended without a success or a failure (its budget
+        ran out, or it was interrupted), so the next trial waits for a new cool-down.
+        """
+        with self._lock:
+            if self.state != HALF_OPEN:
+                return
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(store: str) -> CircuitBreaker:
+    """Return the breaker of a store, shared by every thread of the process."""
+    with _breakers_lock:
+        if store not in _breakers:
+            _breakers[store] = CircuitBreaker(store)
+        return _breakers[store]
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Check if a failed fetch is worth retrying."""
+    status = getattr(error, "status", None) or getattr(error, "code", None)
+    if isinstance(status, int):
+        return status in RETRY_STATUSES
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def get_backoff_delay(attempt: int) -> float:
+    """Seconds to wait before retry `attempt` (0 for the first retry), with full jitter."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def check_breaker(store: str) -> tuple[CircuitBreaker, bool]:
+    """Return the breaker of a store and whether the fetch is its trial, raising StoreSkipped if it is open."""
+    breaker = get_breaker(store)
+    allowed, is_trial = breaker.start_request()
+    if not allowed:
+        price_metrics.STORE_SKIPS.inc(store=store)
+        raise StoreSkipped(store)
+    return breaker, is_trial
+
+
+def call(store: str, fetch: Callable, *args, attempts: int = RETRY_ATTEMPTS, **kwargs):
+    """
+    Call fetch(*args, **kwargs) through the breaker of a store, retrying transient errors. Raises
+    StoreSkipped if the breaker is open, or the error of the last attempt.
+    """
+    breaker, is_trial = check_breaker(store)
+    try:
+        for attempt in range(attempts):
+            try:
+                result = fetch(*args, **kwargs)
+            except Exception as e:
+                if fetch_budget.is_expired():
+                    # out of time, not the store's fault: neutral for a closed breaker, and a
+                    # trial fetch is ended in the finally below
+                    raise
+                if attempt + 1 < attempts and is_transient_error(e):
+                    price_metrics.RETRIES.inc(store=store)
+                    fetch_budget.sleep(get_backoff_delay(attempt), "retry_backoff")
+                    continue
+                breaker.record_failure()
+                raise
+            breaker.record_success()
+            return result
+    finally:
+        if is_trial:
+            breaker.end_trial()
+
+
+async def call_async(store: str, fetch: Callable, *args, attempts: int = RETRY_ATTEMPTS, **kwargs):
+    """Async version of call, for coroutine functions."""
+    breaker, is_trial = check_breaker(store)
+    try:
+        for attempt in range(attempts):
+            try:
+                result = await fetch(*args, **kwargs)
+            except Exception as e:
+                if fetch_budget.is_expired():
+                    # out of time, not the store's fault: neutral for a closed breaker, and a
+                    # trial fetch is ended in the finally below
+                    raise
+                if attempt + 1 < attempts and is_transient_error(e):
+                    price_metrics.RETRIES.inc(store=store)
+                    with fetch_timing.span("sleep", reason="retry_backoff"):
+                        await asyncio.sleep(fetch_budget.clip(get_backoff_delay(attempt)))
+                    continue
+                breaker.record_failure()
+                raise
+            breaker.record_success()
+            return result
+    finally:
+        if is_trial:
+            breaker.end_trial()
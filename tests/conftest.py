@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+sys.path.insert(0, str(REPO_DIR / "benchmarks"))
+
+import fixture_server  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def store_server():
+    """The fixture store server of the benchmarks, without added latency."""
+    with fixture_server.FixtureStoreServer(latency=0) as server:
+        yield server
@@ -0,0 +1,30 @@
+import os
+import time
+
+import pytest
+
+# chrome_profile imports the Selenium webdriver
+pytest.importorskip("selenium")
+
+import chrome_profile  # noqa: E402
+
+
+def test_claim_slot_writes_the_process_id(tmp_path):
+    lock_path = tmp_path / chrome_profile.SLOT_LOCK_NAME
+
+    assert chrome_profile.claim_slot(lock_path)
+    assert chrome_profile.read_lock_pid(lock_path) == os.getpid()
+    assert not chrome_profile.claim_slot(lock_path)
+
+
+def test_claim_slot_takes_over_an_empty_lock_once_stale(tmp_path):
+    lock_path = tmp_path / chrome_profile.SLOT_LOCK_NAME
+    lock_path.touch()
+
+    # a lock still being written
+    assert not chrome_profile.claim_slot(lock_path)
+
+    stale_time = time.time() - chrome_profile.EMPTY_LOCK_SECONDS - 1
+    os.utime(lock_path, (stale_time, stale_time))
+    assert chrome_profile.claim_slot(lock_path)
+    assert chrome_profile.read_lock_pid(lock_path) == os.getpid()
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+import fetch_engine
+import fetch_timing
+import fixture_server
+import itad_api
+import price_metrics
+import store_api
+import store_breaker
+
+
+@pytest.fixture
+def stores(store_server, tmp_path, monkeypatch):
+    """Point the HTTP backends to the fixture server, with an empty GOG product id cache and new breakers."""
+    monkeypatch.setattr(store_api, "STEAM_STORE_URL", f"{store_server.url}/steam")
+    monkeypatch.setattr(store_api, "GOG_API_URL", f"{store_server.url}/gog-api")
+    monkeypatch.setattr(store_api, "GOG_PRODUCT_IDS_PATH", tmp_path / "gog_product_ids.json")
+    monkeypatch.setattr(store_api, "_gog_product_ids", None)
+    monkeypatch.setattr(itad_api, "ITAD_API_KEY", "")
+    monkeypatch.setattr(store_breaker, "_breakers", {})
+    return store_server
+
+
+@pytest.fixture
+def spans():
+    sink = fetch_timing.RingBufferSink()
+    fetch_timing.add_sink(sink)
+    yield sink
+    fetch_timing.remove_sink(sink)
+
+
+def get_fetch_count(store: str, outcome: str = "ok") -> float:
+    return price_metrics.FETCHES._values.get(price_metrics.FETCHES.get_key({"store": store, "outcome": outcome}), 0)
+
+
+def test_batches_are_timed_as_store_fetches(stores, spans, monkeypatch):
+    monkeypatch.setattr(store_api, "STEAM_BATCH_SIZE", 2)
+    catalogue = fixture_server.build_catalogue(5)
+    games_to_check = fixture_server.get_pc_games_to_check(catalogue, stores.url)
+    metrics_sink = price_metrics.MetricsSink()
+    fetches_before = {store: get_fetch_count(store) for store in ["Steam", "GOG"]}
+
+    fetch_engine.run_fetch_games_prices(games_to_check, lambda game_name, prices: None)
+    fetch_spans = [span for span in spans.get_spans() if span.stage == "fetch"]
+    for span in fetch_spans:
+        metrics_sink.emit(span)
+
+    steam_spans = [span for span in fetch_spans if span.tags.get("store") == "Steam"]
+    gog_spans = [span for span in fetch_spans if span.tags.get("store") == "GOG"]
+    # 5 appids in chunks of 2, and a single GOG chunk
+    assert sorted(span.tags["links"] for span in steam_spans) == [1, 2, 2]
+    assert [span.tags["links"] for span in gog_spans] == [5]
+    assert all(span.outcome == "ok" for span in fetch_spans)
+    # a fetch per store link, like the browser and sync HTTP backends
+    assert get_fetch_count("Steam") - fetches_before["Steam"] == 5
+    assert get_fetch_count("GOG") - fetches_before["GOG"] == 5
+
+
+def test_failed_batch_fetch_span(stores, spans, monkeypatch):
+    games_to_check = fixture_server.get_pc_games_to_check(fixture_server.build_catalogue(2), stores.url)
+    monkeypatch.setattr(store_api, "STEAM_STORE_URL", f"{stores.url}/missing")
+
+    games_prices = {}
+    fetch_engine.run_fetch_games_prices(games_to_check, games_prices.__setitem__)
+
+    steam_spans = [span for span in spans.get_spans() if span.stage == "fetch" and span.tags.get("store") == "Steam"]
+    assert [span.outcome for span in steam_spans] == ["error: HttpStatusError"]
+    assert all("Steam_error" in prices and "GOG_error" not in prices for prices in games_prices.values())
+
+
+def run_client(request):
+    """Run request(client) with a new AsyncHttpClient, closing it after."""
+    async def run():
+        client = fetch_engine.AsyncHttpClient()
+        try:
+            return await request(client)
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+def test_client_reads_chunked_responses(store_server):
+    text = run_client(lambda client: client.get_text(f"{store_server.url}/http/chunked", {"chunks": "a,bcd,efghij"}))
+
+    assert text == "abcdefghij"
+
+
+def test_client_decompresses_gzip_responses(store_server):
+    assert run_client(lambda client: client.get_json(f"{store_server.url}/http/gzip")) == {"ok": True}
+
+
+def test_client_follows_relative_redirects(store_server):
+    async def request(client):
+        return await client.request("GET", f"{store_server.url}/http/redirect/3/")
+
+    response = run_client(request)
+    assert response.status == 200
+    assert response.url == f"{store_server.url}/http/redirect/0/"
+    assert response.json() == {"ok": True}
+
+
+def test_client_stops_after_max_redirects(store_server):
+    url = f"{store_server.url}/http/redirect/{fetch_engine.MAX_REDIRECTS + 1}/"
+
+    with pytest.raises(fetch_engine.HttpStatusError) as error:
+        run_client(lambda client: client.get_json(url))
+    assert error.value.status == 302
+
+
+def test_client_raises_for_non_2xx_statuses(store_server):
+    async def request(client):
+        return await client.request("GET", f"{store_server.url}/http/status/404")
+
+    assert run_client(request).status == 404
+    with pytest.raises(fetch_engine.HttpStatusError) as error:
+        run_client(lambda client: client.get_json(f"{store_server.url}/http/status/503"))
+    assert error.value.status == 503
+
+
+def test_client_reuses_connections(store_server):
+    url = f"{store_server.url}/http/connection"
+
+    async def request(client):
+        first = await client.get_json(url)
+        second = await client.get_json(url)
+        closed = await client.get_json(url, {"close": 1})
+        after_close = await client.get_json(url)
+        return first["port"], second["port"], closed["port"], after_close["port"]
+
+    first, second, closed, after_close = run_client(request)
+    assert first == second == closed
+    # the server closed the connection, so the next request opens a new one
+    assert after_close != closed
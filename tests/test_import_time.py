@@ -0,0 +1,33 @@
+import pytest
+
+import import_time
+
+# Modules main_ui imports at start-up, they run without PyQt5 or selenium installed
+START_UP_MODULES = ["price_client", "price_metrics", "app_data"]
+
+# Command line entry points, they need the scraping stack but not the UI
+CLI_MODULES = ["refresh_prices", "price_server"]
+
+
+def test_main_ui_import_is_within_budget():
+    pytest.importorskip("PyQt5")
+    timings = import_time.measure_import("main_ui")
+
+    assert timings["main_ui"] <= import_time.DEFAULT_BUDGET
+    assert import_time.find_loaded(timings, import_time.DEFAULT_FORBIDDEN) == []
+
+
+@pytest.mark.parametrize("module", START_UP_MODULES)
+def test_start_up_import_is_within_budget(module):
+    timings = import_time.measure_import(module)
+
+    assert timings[module] <= import_time.DEFAULT_BUDGET
+    assert import_time.find_loaded(timings, import_time.DEFAULT_FORBIDDEN + ["PyQt5"]) == []
+
+
+@pytest.mark.parametrize("module", CLI_MODULES)
+def test_cli_import_does_not_load_ui(module):
+    pytest.importorskip("selenium")
+    timings = import_time.measure_import(module)
+
+    assert import_time.find_loaded(timings, ["PyQt5"]) == []
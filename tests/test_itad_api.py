@@ -0,0 +1,119 @@
+import pytest
+
+import fixture_server
+import itad_api
+
+
+@pytest.fixture
+def itad(store_server, tmp_path, monkeypatch):
+    """Point itad_api to the IsThereAnyDeal stand-in of the fixture server, with an empty id cache."""
+    monkeypatch.setattr(itad_api, "ITAD_API_URL", f"{store_server.url}/itad-api")
+    monkeypatch.setattr(itad_api, "ITAD_API_KEY", "fixture")
+    monkeypatch.setattr(itad_api, "ITAD_GAME_IDS_PATH", tmp_path / "itad_game_ids.json")
+    monkeypatch.setattr(itad_api, "_itad_game_ids", None)
+    return store_server
+
+
+def get_itad_link(server, index: int) -> str:
+    return fixture_server.FixtureGame(index).get_links(server.url)["isthereanydeal_link"]
+
+
+def test_get_itad_slug():
+    assert itad_api.get_itad_slug("https://isthereanydeal.com/game/evil-west/info/") == "evil-west"
+    assert itad_api.get_itad_slug("https://isthereanydeal.com/game/evil-west?shop=61") == "evil-west"
+    assert itad_api.get_itad_slug("https://store.steampowered.com/app/1259420/") is None
+
+
+def test_parse_lookup_response():
+    response = {"found": True, "game": {"id": "018d937f-1", "slug": "evil-west", "title": "Evil West"}}
+    assert itad_api.parse_lookup_response(response, "evil-west") == "018d937f-1"
+
+    with pytest.raises(itad_api.GameLookupError):
+        itad_api.parse_lookup_response({"found": False}, "evil-west")
+    with pytest.raises(itad_api.GameLookupError, match="another game"):
+        itad_api.parse_lookup_response(response, "evil-west-2")
+
+
+def test_parse_prices_response():
+    response = [{
+        "id": "018d937f-1",
+        "deals": [
+            {"shop": {"id": 61}, "price": {"amountInt": 3999}, "regular": {"amountInt": 7999},
+             "url": "https://store.steampowered.com/app/1259420/"},
+            {"shop": {"id": 61}, "price": {"amountInt": 1}, "regular": {"amountInt": 1}, "url": "older"},
+            {"shop": {"id": 35}, "price": {"amount": 45.5}, "url": "https://www.gog.com/en/game/evil_west"},
+            {"shop": {"id": 16}, "price": {"amountInt": 100}, "url": "https://www.epicgames.com/"},
+        ],
+    }]
+    assert itad_api.parse_prices_response(response) == {"018d937f-1": {
+        "Steam_current": "39,99", "Steam_base": "79,99", "Steam_link": "https://store.steampowered.com/app/1259420/",
+        "GOG_current": "45,50", "GOG_base": "45,50", "GOG_link": "https://www.gog.com/en/game/evil_west",
+    }}
+
+
+def test_lookup_caches_the_game_id(itad):
+    slug = fixture_server.FixtureGame(1).slug
+    game_id = itad_api.get_game_id(slug)
+    assert game_id == fixture_server.FixtureGame(1).itad_id
+
+    requests_before = itad.request_count
+    assert itad_api.get_game_id(slug) == game_id
+    assert itad.request_count == requests_before
+    assert slug in itad_api.ITAD_GAME_IDS_PATH.read_text()
+
+
+def test_get_itad_prices_http(itad):
+    game = fixture_server.FixtureGame(1)
+    links = game.get_links(itad.url)
+    prices = itad_api.get_itad_prices_http(links["isthereanydeal_link"])
+
+    current, base = (itad_api.store_api.format_price_cents(cents) for cents in (game.current_cents, game.base_cents))
+    assert prices == {"Steam_current": current, "Steam_base": base, "Steam_link": links["steam_link"],
+                      "GOG_current": current, "GOG_base": base, "GOG_link": links["gog_link"]}
+
+
+def test_batch_requests_the_prices_in_chunks(itad):
+    itad_links = [get_itad_link(itad, index) for index in range(5)]
+    requests_before = itad.request_count
+    prices = itad_api.get_itad_prices_batch(itad_links, batch_size=2)
+
+    # one lookup per game, and the prices of 2 games per request
+    assert itad.request_count - requests_before == 5 + 3
+    assert set(prices) == set(itad_links)
+    for index, itad_link in enumerate(itad_links):
+        game = fixture_server.FixtureGame(index)
+        if game.coming_soon:
+            assert prices[itad_link] == {}
+        else:
+            assert prices[itad_link]["Steam_current"] == itad_api.store_api.format_price_cents(game.current_cents)
+
+
+def test_lookup_mismatch_is_an_error_and_not_cached(itad):
+    # the title "fixture game 0002" is found, but its slug is fixture_game_0002
+    itad_link = f"{itad.url}/itad/game/fixture-game-0002/info/"
+    prices = itad_api.get_itad_prices_http(itad_link)
+
+    assert "another game" in prices["error"]
+    assert "fixture-game-0002" not in itad_api.load_itad_game_ids()
+
+
+def test_unknown_game_is_an_error(itad):
+    itad_link = f"{itad.url}/itad/game/unknown_game/info/"
+    assert "No IsThereAnyDeal game found" in itad_api.get_itad_prices_http(itad_link)["error"]
+
+
+def test_failed_requests(itad, monkeypatch):
+    itad_link = get_itad_link(itad, 1)
+    monkeypatch.setattr(itad_api, "ITAD_API_URL", f"{itad.url}/missing-api")
+
+    assert "error" in itad_api.get_itad_prices_batch([itad_link])[itad_link]
+    with pytest.raises(Exception):
+        itad_api.get_itad_prices_http(itad_link)
+
+
+def test_failed_prices_request_marks_the_chunk(itad, monkeypatch):
+    itad_links = [get_itad_link(itad, index) for index in range(3)]
+    monkeypatch.setattr(itad_api, "get_prices_by_game_id", lambda game_ids, api_url: 1 / 0)
+
+    prices = itad_api.get_itad_prices_batch(itad_links)
+    assert all("division by zero" in prices[itad_link]["error"] for itad_link in itad_links)
@@ -0,0 +1,17 @@
+import pytest
+
+import link_resolver
+
+
+@pytest.mark.parametrize("url, store, expected", [
+    ("https://store.steampowered.com/app/1259420/Evil_West/", "Steam", True),
+    ("https://STORE.steampowered.com/app/1259420/", "Steam", True),
+    ("https://www.gog.com/en/game/evil_west", "GOG", True),
+    ("https://gog.com/en/game/evil_west", "GOG", False),
+    ("https://evil.store.steampowered.com/app/1259420/", "Steam", False),
+    ("https://login.www.gog.com/en/game/evil_west", "GOG", False),
+    ("https://store.steampowered.com.example.com/app/1259420/", "Steam", False),
+    ("https://www.gog.com/en/game/evil_west", "Steam", False),
+])
+def test_is_store_url(url, store, expected):
+    assert link_resolver.is_store_url(url, store) is expected
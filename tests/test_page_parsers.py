@@ -0,0 +1,180 @@
+from concurrent.futures import Future
+
+import pytest
+
+import fixture_server
+import page_parsers
+from fixture_server import FixtureGame, format_brl, format_gog
+
+BASE_URL = "http://127.0.0.1:8766"
+
+# discounted with a demo, full price, coming soon, discounted
+GAME_INDEXES = [0, 1, 3, 4]
+
+
+def render_steam_page(game: FixtureGame) -> str:
+    return fixture_server.render_fixture("steam_app.html", base_url=BASE_URL, title=game.name, appid=game.appid,
+                                         slug=game.slug, purchase_area=fixture_server.render_steam_purchase_area(game))
+
+
+@pytest.mark.parametrize("index", GAME_INDEXES)
+def test_parse_steam_page(index):
+    game = FixtureGame(index)
+    prices = page_parsers.parse_steam_page(render_steam_page(game), game.get_links(BASE_URL)["steam_link"])
+
+    assert prices["coming_soon"] == game.coming_soon
+    if game.coming_soon:
+        assert prices == {"coming_soon": True, "found": False, "current": "", "base": ""}
+    else:
+        # the demo above and the soundtrack below the game are skipped
+        assert prices == {"coming_soon": False, "found": True, "current": format_brl(game.current_cents),
+                          "base": format_brl(game.base_cents)}
+
+
+def test_parse_steam_age_check_page():
+    game = FixtureGame(0)
+    page = fixture_server.render_fixture("steam_agecheck.html", base_url=BASE_URL, appid=game.appid, slug=game.slug)
+    assert page_parsers.parse_steam_page(page)["found"] is False
+
+
+@pytest.mark.parametrize("index", GAME_INDEXES)
+def test_parse_gog_page(index):
+    game = FixtureGame(index)
+    page = fixture_server.render_fixture("gog_game.html", base_url=BASE_URL, title=game.name, slug=game.slug,
+                                         product_id=game.product_id,
+                                         age_gate=fixture_server.render_gog_age_gate(game),
+                                         price_area=fixture_server.render_gog_price_area(game))
+    prices = page_parsers.parse_gog_page(page)
+
+    assert prices["found"] is True
+    if game.coming_soon:
+        # the price elements are there, empty
+        assert prices["current"] == prices["base"] == ""
+    else:
+        assert prices["current"] == format_gog(game.current_cents)
+        assert prices["base"] == format_gog(game.base_cents)
+
+
+@pytest.mark.parametrize("index", GAME_INDEXES)
+def test_parse_itad_rows(index):
+    game = FixtureGame(index)
+    links = game.get_links(BASE_URL)
+    itad_link = links["isthereanydeal_link"]
+    page = fixture_server.render_fixture("itad_game.html", base_url=BASE_URL, title=game.name,
+                                         rows=fixture_server.render_itad_rows(game, BASE_URL))
+    rows = page_parsers.parse_itad_rows(page, itad_link)
+
+    if game.coming_soon:
+        assert rows == []
+        return
+
+    assert [row["link"] for row in rows] == [links["steam_link"], links["gog_link"]]
+    assert rows[0]["text"].startswith("Steam\n")
+    assert rows[1]["text"].startswith("GOG\n")
+    assert format_brl(game.current_cents) in rows[0]["text"].split("\n")
+
+
+def test_parse_itad_rows_makes_relative_links_absolute():
+    page = '<a class="row" href="/out/steam"><div class="cell">Steam</div><div class="cell">R$ 9,99</div></a>'
+    rows = page_parsers.parse_itad_rows(page, "https://isthereanydeal.com/game/evil-west/info/")
+    assert rows == [{"text": "Steam\nR$ 9,99", "link": "https://isthereanydeal.com/out/steam"}]
+
+
+@pytest.mark.parametrize("index", GAME_INDEXES)
+def test_parse_psn_page(index):
+    game = FixtureGame(index)
+    page = fixture_server.render_fixture("psn_product.html", base_url=BASE_URL, title=game.name,
+                                         price_area=fixture_server.render_psn_price_area(game))
+    prices = page_parsers.parse_psn_page(page)
+
+    assert prices["new_prices"] == [format_brl(game.console_current_cents)]
+    assert prices["base_prices"] == ([format_brl(game.console_base_cents)] if game.discounted else [])
+
+
+def test_parse_psn_page_without_price_card():
+    assert page_parsers.parse_psn_page("<html><body><span class='psw-t-title-m'>R$ 1,00</span></body></html>") is None
+
+
+@pytest.mark.parametrize("index", GAME_INDEXES)
+def test_parse_site_page_xbox(index):
+    game = FixtureGame(index)
+    page = fixture_server.render_fixture("xbox_game.html", base_url=BASE_URL, title=game.name,
+                                         aria_label=f"Comprar {game.name}",
+                                         price_area=fixture_server.render_xbox_price_area(game))
+    prices = page_parsers.parse_site_page(page, "", ".Price-module__boldText___1i2Li",
+                                          ".Price-module__brandOriginalPrice___ayJAn")
+
+    base_cents = game.console_base_cents if game.discounted else game.console_current_cents
+    assert prices == {"new_price": format_brl(game.console_current_cents), "base_price": format_brl(base_cents)}
+
+
+@pytest.mark.parametrize("index", GAME_INDEXES)
+def test_parse_site_page_nintendo(index):
+    game = FixtureGame(index)
+    page = fixture_server.render_fixture("nintendo_product.html", base_url=BASE_URL, title=game.name,
+                                         price_area=fixture_server.render_nintendo_price_area(game))
+    # the Nintendo page shows the regular price first and the sale price next to it
+    prices = page_parsers.parse_site_page(page, "", ".W990N", ".o2BsP")
+
+    current_cents = game.console_current_cents if game.discounted else game.console_base_cents
+    assert prices == {"new_price": format_brl(game.console_base_cents), "base_price": format_brl(current_cents)}
+
+
+def test_parse_site_page_inside_the_price_card():
+    page = ('<div class="related"><span class="price">R$ 1,00</span></div>'
+            '<div class="card"><span class="price">R$ 2,00</span><span class="old">R$ 3,00</span></div>')
+    assert page_parsers.parse_site_page(page, "", "span.price", "span.old", ".card") == {
+        "new_price": "R$ 2,00", "base_price": "R$ 3,00"}
+    assert page_parsers.parse_site_page(page, "", "span.price", "span.old", ".missing") is None
+
+
+class FakeDriver:
+    """The driver attributes read_page_prices uses, for a page already loaded."""
+
+    def __init__(self, html, url, script_result=None):
+        self.page_source = html
+        self.current_url = url
+        self.script_result = script_result
+
+    def execute_script(self, script, *args):
+        return self.script_result
+
+
+def get_page_prices(page_prices, parse_span=None):
+    if not page_prices["found"]:
+        raise LookupError("No price on the page")
+    return page_prices["current"], page_prices["base"]
+
+
+def test_read_page_prices_parses_in_a_worker(monkeypatch):
+    monkeypatch.setattr(page_parsers, "PAGE_PARSER", "page_source")
+    game = FixtureGame(0)
+    driver = FakeDriver(render_steam_page(game), game.get_links(BASE_URL)["steam_link"])
+
+    prices = page_parsers.read_page_prices(driver, "", page_parsers.parse_steam_page, get_page_prices)
+
+    assert isinstance(prices, Future)
+    swapped_prices = page_parsers.map_prices(prices, lambda prices: (prices[1], prices[0]))
+    assert page_parsers.wait_prices(prices) == (format_brl(game.current_cents), format_brl(game.base_cents))
+    assert page_parsers.wait_prices(swapped_prices) == (format_brl(game.base_cents), format_brl(game.current_cents))
+
+
+def test_read_page_prices_parse_errors_are_raised_by_the_future(monkeypatch):
+    monkeypatch.setattr(page_parsers, "PAGE_PARSER", "page_source")
+    driver = FakeDriver("<html></html>", BASE_URL)
+
+    prices = page_parsers.read_page_prices(driver, "", page_parsers.parse_steam_page, get_page_prices)
+    mapped_prices = page_parsers.map_prices(prices, lambda prices: prices)
+
+    with pytest.raises(LookupError):
+        page_parsers.wait_prices(mapped_prices)
+
+
+def test_read_page_prices_with_script(monkeypatch):
+    monkeypatch.setattr(page_parsers, "PAGE_PARSER", "script")
+    driver = FakeDriver("", BASE_URL, {"found": True, "current": "R$ 1,00", "base": "R$ 2,00"})
+
+    prices = page_parsers.read_page_prices(driver, "return 1", page_parsers.parse_steam_page, get_page_prices)
+
+    assert prices == ("R$ 1,00", "R$ 2,00")
+    assert page_parsers.map_prices(prices, lambda prices: prices[0]) == "R$ 1,00"
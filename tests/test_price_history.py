@@ -0,0 +1,23 @@
+import price_history
+
+
+def test_record_game_data_skips_only_failed_fetches(tmp_path):
+    history = price_history.PriceHistory(tmp_path / "price_history.db")
+    history.record_game_data("Evil West", {
+        "steam": {"current": 19.99, "base": 99.99, "link": "https://store.steampowered.com/app/1259420/"},
+        "gog": {"current": 0.0, "base": 29.99, "link": "https://www.gog.com/en/game/evil_west"},
+        "psn": {"current": 0.0, "base": 0.0, "link": "https://store.playstation.com/en-us/concept/1"},
+        "xbox": {"current": 0.0, "base": 0.0, "link": "https://www.xbox.com/games/store/evil-west/1",
+                 "error": "timeout"},
+        "nintendo": {"current": 0.0, "base": 0.0, "link": "https://www.nintendo.com/evil-west/", "no_price": True},
+        "is_there_any_deal_link": "https://isthereanydeal.com/game/evil-west/info/",
+    }, fetched_at=1000.0)
+    history.flush()
+
+    assert history.get_latest_quote("Evil West", "steam") == (19.99, 99.99, 1000.0)
+    # a 100% discount and a free game
+    assert history.get_latest_quote("Evil West", "gog") == (0.0, 29.99, 1000.0)
+    assert history.get_latest_quote("Evil West", "psn") == (0.0, 0.0, 1000.0)
+    assert history.get_latest_quote("Evil West", "xbox") is None
+    assert history.get_latest_quote("Evil West", "nintendo") is None
+    history.close()
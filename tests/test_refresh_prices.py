@@ -0,0 +1,30 @@
+import csv
+import io
+
+import pytest
+
+# refresh_prices imports the Selenium fetchers
+pytest.importorskip("selenium")
+
+import refresh_prices  # noqa: E402
+
+
+def test_write_game_data_statuses():
+    output = io.StringIO()
+    writer = refresh_prices.ResultWriter(output, "csv")
+    writer.write_game_data("pc", "Evil West", {
+        "Steam": {"current": 19.99, "base": 99.99, "link": "https://store.steampowered.com/app/1259420/"},
+        "GOG": {"current": 0.0, "base": 0.0, "link": "https://www.gog.com/en/game/evil_west"},
+        "Epic": {"current": 0.0, "base": 0.0, "link": "https://store.epicgames.com/p/evil-west", "error": "timeout"},
+        "Nuuvem": {"current": 0.0, "base": 0.0, "link": ""},
+    })
+    writer.write_error("pc", "Broken Game", "no store links")
+
+    records = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert [(record["store"], record["status"], record["error"]) for record in records] == [
+        ("Steam", "ok", ""),
+        ("GOG", "no_price", ""),
+        ("Epic", "error", "timeout"),
+        ("", "error", "no store links"),
+    ]
+    assert writer.failures == 2
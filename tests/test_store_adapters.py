@@ -0,0 +1,53 @@
+from concurrent.futures import Future
+
+import pytest
+
+import store_adapters
+
+
+class PageAdapter(store_adapters.StoreAdapter):
+    store, name, kind, link_key = "page", "Page", "pc", "page_link"
+
+    def __init__(self):
+        self.fetched = []
+
+    def fetch(self, link, driver=None):
+        self.fetched.append((link, driver))
+        if link.endswith("/broken"):
+            raise ValueError("no price")
+        prices = Future()
+        prices.set_result(("9,99", "19,99"))
+        return prices
+
+    def read(self, link, driver):
+        return self.fetch(link, driver)
+
+
+def test_adapter_needs_fetch_and_read():
+    class FetchOnlyAdapter(store_adapters.StoreAdapter):
+        def fetch(self, link, driver=None):
+            return "0,0", "0,0"
+
+    with pytest.raises(TypeError):
+        FetchOnlyAdapter()
+
+
+def test_fetch_batch_loops_over_fetch():
+    adapter = PageAdapter()
+    driver = object()
+    links = ["https://store.test/game/a", "https://store.test/game/A/", "https://store.test/game/broken"]
+
+    prices = adapter.fetch_batch(links, driver)
+
+    assert prices[links[0]] == ("9,99", "19,99")
+    assert prices[links[1]] == ("9,99", "19,99")
+    assert isinstance(prices[links[2]], ValueError)
+    # the two links of product "a" are fetched once
+    assert adapter.fetched == [(links[0], driver), (links[2], driver)]
+
+
+def test_convert_to_float():
+    assert store_adapters.convert_to_float("12,34") == 12.34
+    assert store_adapters.convert_to_float("") == 0.0
+    assert store_adapters.convert_to_float("Free") == 0.0
+    assert store_adapters.convert_to_float(None) == 0.0
@@ -0,0 +1,216 @@
+import urllib.error
+
+import pytest
+
+import fixture_server
+import store_api
+from fixture_server import FixtureGame
+
+
+@pytest.fixture
+def steam(store_server, monkeypatch):
+    """Point store_api to the Steam stand-in of the fixture server."""
+    monkeypatch.setattr(store_api, "STEAM_STORE_URL", f"{store_server.url}/steam")
+    return store_server
+
+
+def get_steam_link(server, index: int) -> str:
+    return FixtureGame(index).get_links(server.url)["steam_link"]
+
+
+def get_expected_prices(index: int) -> tuple[str, str]:
+    game = FixtureGame(index)
+    if game.coming_soon:
+        return "0,0", "0,0"
+    return store_api.format_price_cents(game.current_cents), store_api.format_price_cents(game.base_cents)
+
+
+def test_format_price_cents():
+    assert store_api.format_price_cents(7999) == "79,99"
+    assert store_api.format_price_cents(905) == "9,05"
+    assert store_api.format_price_cents(0) == "0,0"
+    assert store_api.format_price_cents(None) == "0,0"
+
+
+def test_get_steam_appid():
+    assert store_api.get_steam_appid("https://store.steampowered.com/app/1259420/Evil_West/") == "1259420"
+    assert store_api.get_steam_appid("https://store.steampowered.com/bundle/1234/") is None
+    assert store_api.get_steam_appid(None) is None
+
+
+def test_parse_steam_price_overview():
+    app_details = {"success": True, "data": {"price_overview": {"initial": 7999, "final": 3999}}}
+    assert store_api.parse_steam_price_overview(app_details) == ("39,99", "79,99")
+
+    # no initial price when the game is not discounted
+    app_details = {"success": True, "data": {"price_overview": {"final": 7999}}}
+    assert store_api.parse_steam_price_overview(app_details) == ("79,99", "79,99")
+
+    assert store_api.parse_steam_price_overview({"success": True, "data": []}) == ("0,0", "0,0")
+    assert store_api.parse_steam_price_overview({"success": False}) == ("0,0", "0,0")
+    assert store_api.parse_steam_price_overview(None) == ("0,0", "0,0")
+
+
+@pytest.mark.parametrize("index", [0, 1])
+def test_get_steam_prices_http(steam, index):
+    # game 0 is discounted and age gated, game 1 is not discounted
+    assert store_api.get_steam_prices_http(get_steam_link(steam, index)) == get_expected_prices(index)
+
+
+def test_get_steam_prices_http_without_price_overview(steam):
+    # coming soon games have no price_overview
+    assert FixtureGame(3).coming_soon
+    assert store_api.get_steam_prices_http(get_steam_link(steam, 3)) == ("0,0", "0,0")
+
+
+def test_get_steam_prices_http_unsuccessful(steam):
+    assert store_api.get_steam_prices_http(f"{steam.url}/steam/app/5/unknown/") == ("0,0", "0,0")
+
+
+def test_get_steam_prices_http_without_appid(steam):
+    with pytest.raises(store_api.PriceFetchError):
+        store_api.get_steam_prices_http(f"{steam.url}/steam/bundle/1234/")
+
+
+def test_get_steam_prices_http_failed_request(steam):
+    with pytest.raises(urllib.error.HTTPError):
+        store_api.get_steam_prices_http(get_steam_link(steam, 1), store_url=f"{steam.url}/missing")
+
+
+def test_get_steam_prices_batch(steam):
+    links = [get_steam_link(steam, index) for index in range(5)]
+    # the same game saved twice is requested once
+    links.append(links[0].rstrip("/") + "/?snr=1")
+    requests_before = steam.request_count
+
+    prices = store_api.get_steam_prices_batch(links, batch_size=2)
+
+    # 5 appids in chunks of 2
+    assert steam.request_count - requests_before == 3
+    expected_prices = {link: get_expected_prices(index) for index, link in enumerate(links[:5])}
+    expected_prices[links[5]] = get_expected_prices(0)
+    assert prices == expected_prices
+
+
+def test_get_steam_prices_batch_partial_failures(steam, monkeypatch):
+    links = [get_steam_link(steam, index) for index in range(4)]
+    bundle_link = f"{steam.url}/steam/bundle/1234/"
+    failed_appid = FixtureGame(2).appid
+    http_get_json = store_api.http_get_json
+
+    def fail_one_chunk(url, params=None, **kwargs):
+        if failed_appid in params["appids"].split(","):
+            raise OSError("connection reset")
+        return http_get_json(url, params, **kwargs)
+
+    monkeypatch.setattr(store_api, "http_get_json", fail_one_chunk)
+    prices = store_api.get_steam_prices_batch(links + [bundle_link], batch_size=2)
+
+    assert prices[links[0]] == get_expected_prices(0)
+    assert prices[links[1]] == get_expected_prices(1)
+    # the chunk of games 2 and 3 failed, the other chunk is kept
+    assert isinstance(prices[links[2]], OSError)
+    assert prices[links[3]] is prices[links[2]]
+    assert isinstance(prices[bundle_link], store_api.PriceFetchError)
+
+
+@pytest.fixture
+def gog(store_server, tmp_path, monkeypatch):
+    """Point store_api to the GOG stand-in of the fixture server, with an empty product id cache."""
+    monkeypatch.setattr(store_api, "GOG_API_URL", f"{store_server.url}/gog-api")
+    monkeypatch.setattr(store_api, "GOG_PRODUCT_IDS_PATH", tmp_path / "gog_product_ids.json")
+    monkeypatch.setattr(store_api, "_gog_product_ids", None)
+    return store_server
+
+
+def get_gog_link(server, index: int) -> str:
+    return FixtureGame(index).get_links(server.url)["gog_link"]
+
+
+def test_parse_gog_product_id():
+    game = FixtureGame(0)
+    page = fixture_server.render_fixture("gog_game.html", base_url="", title=game.name, slug=game.slug,
+                                         product_id=game.product_id,
+                                         age_gate=fixture_server.render_gog_age_gate(game),
+                                         price_area=fixture_server.render_gog_price_area(game))
+    assert store_api.parse_gog_product_id(page) == game.product_id
+    assert store_api.parse_gog_product_id('<script>{"productId": 1207658924}</script>') == "1207658924"
+    assert store_api.parse_gog_product_id('<div data-product-id="42"></div>') == "42"
+    assert store_api.parse_gog_product_id("<html></html>") is None
+
+
+def test_get_gog_product_id_is_cached(gog):
+    link = get_gog_link(gog, 1)
+    requests_before = gog.request_count
+
+    assert store_api.get_gog_product_id(link) == FixtureGame(1).product_id
+    assert store_api.get_gog_product_id(link) == FixtureGame(1).product_id
+    assert gog.request_count - requests_before == 1
+
+    # the cache is saved for the next run
+    store_api._gog_product_ids = None
+    assert store_api.get_gog_product_id(link) == FixtureGame(1).product_id
+    assert gog.request_count - requests_before == 1
+
+
+def test_get_gog_product_id_without_id(gog):
+    link = get_steam_link(gog, 1)
+    assert store_api.get_gog_product_id(link) is None
+    assert link not in store_api.load_gog_product_ids()
+
+
+def test_parse_gog_prices_response():
+    response = {"_embedded": {"items": [
+        {"_embedded": {"product": {"id": 1}, "prices": [
+            {"currency": {"code": "USD"}, "basePrice": "1999 USD", "finalPrice": "999 USD"},
+            {"currency": {"code": "BRL"}, "basePrice": "7999 BRL", "finalPrice": "3999 BRL"},
+        ]}},
+        {"_embedded": {"product": {"id": 2}, "prices": [{"currency": {"code": "BRL"}, "finalPrice": "4550 BRL"}]}},
+        {"_embedded": {"product": {"id": 3}, "prices": []}},
+    ]}}
+    assert store_api.parse_gog_prices_response(response) == {
+        "1": ("39,99", "79,99"),
+        "2": ("45,50", "45,50"),
+        "3": ("0,0", "0,0"),
+    }
+    assert store_api.parse_gog_prices_response({}) == {}
+
+
+def test_get_gog_prices_http(gog):
+    assert store_api.get_gog_prices_http(get_gog_link(gog, 0)) == get_expected_prices(0)
+
+    with pytest.raises(store_api.PriceFetchError):
+        store_api.get_gog_prices_http(get_steam_link(gog, 1))
+
+
+def test_get_gog_prices_batch(gog):
+    links = [get_gog_link(gog, index) for index in range(5)]
+    requests_before = gog.request_count
+
+    prices = store_api.get_gog_prices_batch(links, batch_size=2)
+
+    # a game page per link for the product ids, then 5 products in chunks of 2
+    assert gog.request_count - requests_before == 5 + 3
+    assert prices == {link: get_expected_prices(index) for index, link in enumerate(links)}
+
+
+def test_get_gog_prices_batch_partial_failures(gog, monkeypatch):
+    links = [get_gog_link(gog, index) for index in range(4)]
+    missing_link = f"{gog.url}/gog/en/game/missing"
+    failed_product_id = FixtureGame(2).product_id
+    get_gog_prices_by_product_id = store_api.get_gog_prices_by_product_id
+
+    def fail_one_chunk(product_ids, api_url=None):
+        if failed_product_id in product_ids:
+            raise OSError("connection reset")
+        return get_gog_prices_by_product_id(product_ids, api_url)
+
+    monkeypatch.setattr(store_api, "get_gog_prices_by_product_id", fail_one_chunk)
+    prices = store_api.get_gog_prices_batch(links + [missing_link], batch_size=2)
+
+    assert prices[links[0]] == get_expected_prices(0)
+    assert prices[links[1]] == get_expected_prices(1)
+    assert isinstance(prices[links[2]], OSError)
+    assert isinstance(prices[links[3]], OSError)
+    # the game page of the missing link is not found
+    assert isinstance(prices[missing_link], urllib.error.HTTPError)
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+import store_breaker
+
+
+@pytest.fixture(autouse=True)
+def breakers(monkeypatch):
+    """Start every test with new breakers."""
+    monkeypatch.setattr(store_breaker, "_breakers", {})
+
+
+def fail():
+    raise ValueError("markup changed")
+
+
+def test_breaker_opens_after_consecutive_failures():
+    for _ in range(store_breaker.FAILURE_THRESHOLD):
+        with pytest.raises(ValueError):
+            store_breaker.call("Store", fail)
+
+    with pytest.raises(store_breaker.StoreSkipped):
+        store_breaker.call("Store", lambda: ("1,00", "1,00"))
+
+
+def test_no_price_is_a_success():
+    for _ in range(store_breaker.FAILURE_THRESHOLD - 1):
+        with pytest.raises(ValueError):
+            store_breaker.call("Store", fail)
+
+    # a page without a price resets the failures
+    assert store_breaker.call("Store", lambda: ("0,0", "0,0")) == ("0,0", "0,0")
+    with pytest.raises(ValueError):
+        store_breaker.call("Store", fail)
+    assert store_breaker.get_breaker("Store").state == store_breaker.CLOSED
+
+
+def test_only_one_trial_fetch(monkeypatch):
+    breaker = store_breaker.get_breaker("Store")
+    breaker.state = store_breaker.OPEN
+    breaker.opened_at = 0.0
+    monkeypatch.setattr(breaker, "open_seconds", 0)
+
+    results = []
+    trial_started = threading.Event()
+    finish_trial = threading.Event()
+
+    def trial_fetch():
+        trial_started.set()
+        finish_trial.wait(5)
+        return "1,00", "1,00"
+
+    trial = threading.Thread(target=lambda: results.append(store_breaker.call("Store", trial_fetch)))
+    trial.start()
+    trial_started.wait(5)
+
+    with pytest.raises(store_breaker.StoreSkipped):
+        store_breaker.call("Store", lambda: ("2,00", "2,00"))
+
+    finish_trial.set()
+    trial.join(5)
+    assert results == [("1,00", "1,00")]
+    assert breaker.state == store_breaker.CLOSED
+
+
+def test_interrupted_trial_opens_the_breaker_again(monkeypatch):
+    breaker = store_breaker.get_breaker("Store")
+    breaker.state = store_breaker.OPEN
+    breaker.opened_at = 0.0
+    monkeypatch.setattr(breaker, "open_seconds", 0)
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        store_breaker.call("Store", interrupted)
+    assert breaker.state == store_breaker.OPEN